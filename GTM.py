@@ -5,11 +5,11 @@ from src.FileLoader import FileLoader
 from src.Discovery import Discovery
 from src.utils import load_hyperparameters_from_csv
 
-def main(log_path: str, output_path: str, max_generations: int, time_limit: int, stagnation_limit: int):
+def main(log_path: str, output_path: str, max_generations: int, time_limit: int, stagnation_limit: int, n_workers: int, eventlog_cache: bool = True):
     print(f"Loading log from: {log_path}")
     # Load the event log
     try:
-        el = FileLoader.load_eventlog(log_path)
+        el = FileLoader.load_eventlog(log_path, cache=eventlog_cache)
         print("Event log loaded successfully.")
     except Exception as e:
         raise RuntimeError(f"Failed to load event log: {e}")
@@ -21,6 +21,7 @@ def main(log_path: str, output_path: str, max_generations: int, time_limit: int,
         hyperparameters['time_limit'] = time_limit
         hyperparameters['max_generations'] = max_generations
         hyperparameters['stagnation_limit'] = stagnation_limit
+        hyperparameters['n_workers'] = n_workers
         
     except Exception as e:
         raise RuntimeError(f"Failed to load hyperparameters: {e}")
@@ -57,7 +58,9 @@ if __name__ == "__main__":
     parser.add_argument("--max_generations", type=int, default=None, help="Maximum number of generations for the genetic algorithm")
     parser.add_argument("--time_limit", type=int, default=None, help="Time limit for the genetic algorithm in seconds")
     parser.add_argument("--stagnation_limit", type=int, default=None, help="Stagnation limit for the genetic algorithm")
+    parser.add_argument("--n_workers", type=int, default=None, help="Number of worker processes used to evaluate the population")
+    parser.add_argument("--no_eventlog_cache", action="store_true", help="Do not read or write the cache of the parsed event log (also set by EVENTLOG_CACHE=0)")
 
     args = parser.parse_args()
 
-    main(args.log_path, args.output_path, args.max_generations, args.time_limit, args.stagnation_limit)
\ No newline at end of file
+    main(args.log_path, args.output_path, args.max_generations, args.time_limit, args.stagnation_limit, args.n_workers, not args.no_eventlog_cache)
\ No newline at end of file
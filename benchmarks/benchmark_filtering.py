@@ -0,0 +1,52 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import random
+import time
+import pandas as pd
+from src.EventLog import EventLog
+from src.Filtering import Filtering
+
+
+DATASET_DIR = "./logs"
+OUTPUT_DIR = "./data/benchmarks/"
+REPETITIONS = 20
+FILTERS = {
+    "top_percentage_unique": lambda eventlog: Filtering.filter_eventlog_by_top_percentage_unique(eventlog, 0.2, True),
+    "top_n_unique": lambda eventlog: Filtering.filter_eventlog_by_top_n_unique(eventlog, 10, True),
+    "top_percentage": lambda eventlog: Filtering.filter_eventlog_by_top_percentage(eventlog, 0.5),
+    "random": lambda eventlog: Filtering.filter_eventlog_random(eventlog, 0.1, True, random.Random(0)),
+    "get_trace_by_id": lambda eventlog: eventlog.get_trace_by_id(eventlog.traces[-1].trace_id),
+}
+
+def measure(filter_name: str, eventlog: EventLog) -> tuple:
+    # The first call builds the index of the log, the following calls reuse it
+    start = time.perf_counter()
+    FILTERS[filter_name](eventlog)
+    first_call = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(REPETITIONS):
+        FILTERS[filter_name](eventlog)
+    return first_call, (time.perf_counter() - start) / REPETITIONS
+
+if __name__ == "__main__":
+    results = []
+    # The largest logs first
+    datasets = sorted(os.listdir(DATASET_DIR), key=lambda dataset: os.path.getsize(f"{DATASET_DIR}/{dataset}"), reverse=True)
+    for dataset in datasets:
+        for filter_name in FILTERS:
+            eventlog = EventLog.load_xes(f"{DATASET_DIR}/{dataset}")
+            eventlog.set_unique_activities(eventlog.unique_activities())
+            first_call, warm_call = measure(filter_name, eventlog)
+            results.append({
+                "dataset": dataset,
+                "filter": filter_name,
+                "traces": len(eventlog.traces),
+                "variants": eventlog.get_num_unique_traces(),
+                "first_call_s": round(first_call, 5),
+                "warm_call_s": round(warm_call, 5),
+            })
+            print(f"{dataset:<20} {filter_name:<25} {first_call:10.5f}s {warm_call:10.5f}s")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    pd.DataFrame(results).to_csv(os.path.join(OUTPUT_DIR, "filtering.csv"), index=False)
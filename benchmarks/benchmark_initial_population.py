@@ -0,0 +1,42 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import time
+import pandas as pd
+from src.Discovery import Discovery
+from src.EventLog import EventLog
+from src.utils import load_hyperparameters_from_csv
+
+
+DATASET_DIR = "./logs"
+OUTPUT_DIR = "./data/benchmarks/"
+WORKERS = [None, 2, 4]
+SEEDS = [0, 1, 2]
+
+def time_to_first_generation(path: str, n_workers: int, seed: int) -> float:
+    # The log is loaded for every run, so no run reuses the compiled log of another one
+    eventlog = EventLog.load_xes(path)
+    hyper_parameters = load_hyperparameters_from_csv('best_parameters.csv')
+    hyper_parameters['n_workers'] = n_workers
+    hyper_parameters['seed'] = seed
+    start = time.perf_counter()
+    Discovery.genetic_algorithm(eventlog, max_generations=1, **hyper_parameters)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    results = []
+    for dataset in sorted(os.listdir(DATASET_DIR)):
+        path = f"{DATASET_DIR}/{dataset}"
+        for n_workers in WORKERS:
+            for seed in SEEDS:
+                seconds = time_to_first_generation(path, n_workers, seed)
+                results.append({
+                    "dataset": dataset,
+                    "n_workers": n_workers,
+                    "seed": seed,
+                    "time_to_first_generation_s": round(seconds, 3),
+                })
+                print(f"{dataset:<20} workers={str(n_workers):<5} seed={seed} {seconds:8.3f}s")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    pd.DataFrame(results).to_csv(os.path.join(OUTPUT_DIR, "initial_population.csv"), index=False)
@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import resource
+import time
+import multiprocessing
+import pandas as pd
+from src.EventLog import EventLog
+
+
+DATASET_DIR = "./logs"
+OUTPUT_DIR = "./data/benchmarks/"
+LOADERS = {
+    "load_xes": lambda path: EventLog.load_xes(path),
+    "streaming": lambda path: EventLog.load_xes_streaming(path),
+    "streaming_activity_only": lambda path: EventLog.load_xes_streaming(path, activity_only=True),
+    "streaming_activity_only_no_timestamps": lambda path: EventLog.load_xes_streaming(path, activity_only=True, timestamps=False),
+}
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(loader: str, path: str, queue: multiprocessing.Queue):
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    eventlog = LOADERS[loader](path)
+    load_time = time.perf_counter() - start
+    queue.put((load_time, peak_rss_mb() - baseline, len(eventlog.traces)))
+
+def run_isolated(loader: str, path: str) -> tuple:
+    # Every measurement runs in a fresh interpreter so the peak RSS is not shared between loaders
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=measure, args=(loader, path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+if __name__ == "__main__":
+    results = []
+    for dataset in sorted(os.listdir(DATASET_DIR)):
+        path = f"{DATASET_DIR}/{dataset}"
+        for loader in LOADERS:
+            load_time, peak_rss, num_traces = run_isolated(loader, path)
+            results.append({
+                "dataset": dataset,
+                "loader": loader,
+                "traces": num_traces,
+                "load_time_s": round(load_time, 3),
+                "peak_rss_mb": round(peak_rss, 1),
+            })
+            print(f"{dataset:<20} {loader:<40} {load_time:8.3f}s {peak_rss:8.1f}MB")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    pd.DataFrame(results).to_csv(os.path.join(OUTPUT_DIR, "xes_loading.csv"), index=False)
@@ -0,0 +1,349 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Dict, List, Optional
+import random
+from src.ProcessTree import ProcessTree, Operator
+
+# Operator codes, the index of an operator in OPERATORS
+OPERATORS = (None, Operator.SEQUENCE, Operator.XOR, Operator.PARALLEL, Operator.LOOP, Operator.OR, Operator.INTERLEAVING)
+OPERATOR_CODES = {operator: code for code, operator in enumerate(OPERATORS)}
+LEAF, SEQUENCE, XOR, PARALLEL, LOOP, OR, INTERLEAVING = range(len(OPERATORS))
+
+# Label code of tau leaves and operator nodes
+NO_LABEL = -1
+
+MAX_SUBTREE_SIZE = 20
+
+
+class LabelTable:
+    """
+    Maps the activity labels of array trees to integer codes. Trees that are combined
+    (e.g. by a crossover) must share the same table.
+    """
+    def __init__(self):
+        self.labels: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, label: Optional[str]) -> int:
+        if label is None:
+            return NO_LABEL
+        code = self.codes.get(label)
+        if code is None:
+            code = len(self.labels)
+            self.codes[label] = code
+            self.labels.append(label)
+        return code
+
+    def decode(self, code: int) -> Optional[str]:
+        return self.labels[code] if code != NO_LABEL else None
+
+
+class ArrayTree:
+    """
+    A process tree stored as three parallel arrays in preorder: the operator code, the label code
+    and the size of the subtree rooted at every node. Node i spans the slice [i, i + sizes[i]),
+    so a subtree is sliced in O(1) and the tree is copied without walking it.
+
+    Used by the Mutator, which only converts from and to ProcessTree objects at the edges.
+    The methods mirror the ProcessTree API (same node order, same checks), so the genetic operators
+    make the same random choices on both representations.
+
+    anchors holds node indices that are kept up to date while the tree is edited outside of them.
+    """
+    def __init__(self, operators: array, labels: array, sizes: array, table: LabelTable):
+        self.operators = operators
+        self.labels = labels
+        self.sizes = sizes
+        self.table = table
+        self.anchors: List[int] = []
+
+    @staticmethod
+    def leaf(label: Optional[str], table: LabelTable) -> 'ArrayTree':
+        return ArrayTree(array('b', [LEAF]), array('i', [table.encode(label)]), array('i', [1]), table)
+
+    @staticmethod
+    def from_process_tree(tree: ProcessTree, table: LabelTable) -> 'ArrayTree':
+        operators, labels, sizes = [], [], []
+
+        def visit(node: ProcessTree):
+            idx = len(operators)
+            operators.append(OPERATOR_CODES[node.operator])
+            labels.append(table.encode(node.label))
+            sizes.append(1)
+            for child in node.children:
+                visit(child)
+            sizes[idx] = len(operators) - idx
+
+        visit(tree)
+        return ArrayTree(array('b', operators), array('i', labels), array('i', sizes), table)
+
+    def to_process_tree(self) -> ProcessTree:
+        root = None
+        stack = []  # (node, end of its subtree)
+        for i in range(len(self.operators)):
+            node = ProcessTree(operator=OPERATORS[self.operators[i]], label=self.table.decode(self.labels[i]))
+            while stack and stack[-1][1] <= i:
+                stack.pop()
+            if stack:
+                stack[-1][0].add_child(node)
+            else:
+                root = node
+            stack.append((node, i + self.sizes[i]))
+        return root
+
+    def __len__(self) -> int:
+        return len(self.operators)
+
+    def __str__(self) -> str:
+        return str(self.to_process_tree())
+
+    def copy(self) -> 'ArrayTree':
+        return ArrayTree(array('b', self.operators), array('i', self.labels), array('i', self.sizes), self.table)
+
+    def end(self, i: int) -> int:
+        return i + self.sizes[i]
+
+    def subtree(self, i: int) -> 'ArrayTree':
+        end = i + self.sizes[i]
+        return ArrayTree(self.operators[i:end], self.labels[i:end], self.sizes[i:end], self.table)
+
+    def parent(self, i: int) -> Optional[int]:
+        # The parent is the closest preceding node whose subtree contains i
+        for j in range(i - 1, -1, -1):
+            if j + self.sizes[j] > i:
+                return j
+        return None
+
+    def children(self, i: int) -> List[int]:
+        children = []
+        child, end = i + 1, i + self.sizes[i]
+        while child < end:
+            children.append(child)
+            child += self.sizes[child]
+        return children
+
+    def is_tau(self, i: int) -> bool:
+        return self.operators[i] == LEAF and self.labels[i] == NO_LABEL
+
+    def get_all_operator_nodes(self) -> List[int]:
+        return [i for i, operator in enumerate(self.operators) if operator != LEAF]
+
+    def get_all_leaf_nodes(self) -> List[int]:
+        # Like ProcessTree.get_all_leaf_nodes, a leaf root is listed twice
+        leaf_nodes = [0] if self.operators[0] == LEAF else []
+        leaf_nodes.extend(i for i, size in enumerate(self.sizes) if size == 1)
+        return leaf_nodes
+
+    def get_activity_nodes(self) -> List[int]:
+        """
+        Returns the leaf nodes with a label, as listed by get_all_leaf_nodes.
+        """
+        return [i for i in self.get_all_leaf_nodes() if self.labels[i] != NO_LABEL]
+
+    def get_all_activities(self) -> List[str]:
+        labels = self.table.labels
+        return [labels[label] for label in self.labels if label != NO_LABEL]
+
+    def get_missing_activities(self, activities: List[str]) -> List[str]:
+        return sorted(set(activities) - set(self.get_all_activities()))
+
+    def _splice(self, parent: Optional[int], start: int, stop: int, other: 'ArrayTree'):
+        """
+        Replaces the nodes [start, stop) with the nodes of other, where the replaced nodes are
+        complete subtrees below parent (an empty range inserts), and updates the subtree sizes.
+        """
+        delta = len(other) - (stop - start)
+        if parent is not None and delta:
+            # The subtrees containing the replaced range are the parent and its ancestors
+            sizes = self.sizes
+            for j in range(parent + 1):
+                if j + sizes[j] >= stop:
+                    sizes[j] += delta
+        self.operators[start:stop] = other.operators
+        self.labels[start:stop] = other.labels
+        self.sizes[start:stop] = other.sizes
+
+        if self.anchors:
+            self.anchors = [anchor + delta if anchor >= stop else anchor for anchor in self.anchors]
+
+    def remove(self, i: int) -> 'ArrayTree':
+        """
+        Removes the subtree rooted at i and returns it.
+        """
+        removed = self.subtree(i)
+        self._splice(self.parent(i), i, i + self.sizes[i], ArrayTree(array('b'), array('i'), array('i'), self.table))
+        return removed
+
+    def add_child(self, i: int, child: 'ArrayTree') -> int:
+        """
+        Appends a subtree as the last child of node i and returns the index of its root.
+        """
+        end = i + self.sizes[i]
+        self._splice(i, end, end, child)
+        return end
+
+    def replace(self, i: int, other: 'ArrayTree'):
+        self._splice(self.parent(i), i, i + self.sizes[i], other)
+
+    def set_children(self, i: int, children: List['ArrayTree']):
+        """
+        Replaces the children of node i with the given subtrees.
+        """
+        operators, labels, sizes = array('b'), array('i'), array('i')
+        for child in children:
+            operators.extend(child.operators)
+            labels.extend(child.labels)
+            sizes.extend(child.sizes)
+        self._splice(i, i + 1, i + self.sizes[i], ArrayTree(operators, labels, sizes, self.table))
+
+    def is_valid(self, i: int = 0) -> bool:
+        """
+        Checks the subtree rooted at i like ProcessTree.is_valid, in a single pass.
+        """
+        operators, labels, sizes = self.operators, self.labels, self.sizes
+        for j in range(i, i + sizes[i]):
+            operator = operators[j]
+            if operator == LEAF:
+                if sizes[j] != 1:
+                    return False
+                continue
+
+            if sizes[j] > MAX_SUBTREE_SIZE:
+                return False
+
+            # Children that are not tau leaves and children that are operators
+            child_count, operator_children_count = 0, 0
+            child, end = j + 1, j + sizes[j]
+            while child < end:
+                if operators[child] != LEAF:
+                    child_count += 1
+                    operator_children_count += 1
+                elif labels[child] != NO_LABEL:
+                    child_count += 1
+                child += sizes[child]
+
+            if operator in (SEQUENCE, XOR) and child_count < 1:
+                return False
+            if operator in (OR, LOOP, PARALLEL) and (child_count + operator_children_count < 2 or child_count == 0):
+                return False
+        return True
+
+    def repair(self, activities: List[str], rng: Optional[random.Random] = None) -> bool:
+        """
+        Makes the tree strictly valid in place, like remove_duplicate_activities, if_missing_insert_activities
+        and is_valid of ProcessTree in this order, in O(n) (plus O(k log k) for k edits): one preorder pass
+        indexes the parent and the number of children of every node and the occurrences of every activity,
+        the edits are collected on the original indices and applied to the arrays in a single pass.
+
+        Returns False if a duplicate activity can not be removed without breaking the tree (the removals made
+        until then are kept) or if the repaired tree is not valid.
+        """
+        operators, labels, sizes = self.operators, self.labels, self.sizes
+        parents, child_counts, occurrences = self._index_nodes()
+
+        # Remove the duplicated activities. Assuming that there can be at most one duplicate per activity.
+        removals = []
+        removable = True
+        for code, leaves in occurrences.items():
+            if len(leaves) < 2 or code == NO_LABEL:
+                continue
+            for leaf in leaves:
+                parent = parents[leaf]
+                operator = operators[parent]
+                if (operator in (SEQUENCE, XOR) and child_counts[parent] > 1) or (operator in (OR, LOOP, PARALLEL) and child_counts[parent] > 2):
+                    removals.append(leaf)
+                    child_counts[parent] -= 1
+                    break
+            else:
+                removable = False
+                break
+
+        # Insert the missing activities as last child of random operator nodes
+        insertions = {}
+        if removable:
+            table = self.table
+            operator_nodes = self.get_all_operator_nodes()
+            tree_activities = {table.labels[code] for code in occurrences if code != NO_LABEL}
+            for activity in sorted(set(activities) - tree_activities):
+                insertions.setdefault((rng or random).choice(operator_nodes), array('i')).append(table.encode(activity))
+
+        if removals or insertions:
+            self._apply_edits(removals, insertions)
+        return removable and self.is_valid()
+
+    def _index_nodes(self) -> tuple:
+        """
+        Returns the parent (None for the root) and the number of children of every node and the nodes of every
+        label in order of their first occurrence, in a single preorder pass.
+        """
+        operators, labels, sizes = self.operators, self.labels, self.sizes
+        n = len(operators)
+        parents = [None] * n
+        child_counts = [0] * n
+        occurrences = {}
+        ancestors = []
+        for i in range(n):
+            while ancestors and ancestors[-1] + sizes[ancestors[-1]] <= i:
+                ancestors.pop()
+            if ancestors:
+                parent = ancestors[-1]
+                parents[i] = parent
+                child_counts[parent] += 1
+            if operators[i] != LEAF:
+                ancestors.append(i)
+            occurrences.setdefault(labels[i], []).append(i)
+        return parents, child_counts, occurrences
+
+    def _apply_edits(self, removals: List[int], insertions: Dict[int, array]):
+        """
+        Removes the given leaves and appends the given labels as leaves to the given parents, all by their
+        indices before the edits.
+        """
+        n = len(self.operators)
+
+        # An edit changes the size of the subtrees containing the removed leaf or the parent
+        weights = [0] * n
+        for leaf in removals:
+            weights[leaf] -= 1
+        for parent, leaf_labels in insertions.items():
+            weights[parent] += len(leaf_labels)
+        prefix = [0, *accumulate(weights)]
+        sizes = self.sizes
+        new_sizes = array('i', [sizes[i] + prefix[i + sizes[i]] - prefix[i] for i in range(n)])
+
+        # The new leaves of a parent go before the node at the end of its subtree. At the same position, the leaves
+        # of an inner parent go before the ones of the outer parents, and a removed node goes after all of them.
+        inserted_at = {}
+        for parent in sorted(insertions, reverse=True):
+            inserted_at.setdefault(parent + sizes[parent], []).append(parent)
+        removed = set(removals)
+
+        # Copy the unchanged runs of nodes between the edited positions
+        operators, labels = self.operators, self.labels
+        new_operators, new_labels, edited_sizes = array('b'), array('i'), array('i')
+        start = 0
+        for position in sorted(removed.union(inserted_at)):
+            new_operators.extend(operators[start:position])
+            new_labels.extend(labels[start:position])
+            edited_sizes.extend(new_sizes[start:position])
+            for parent in inserted_at.get(position, ()):
+                leaf_labels = insertions[parent]
+                new_operators.extend(array('b', [LEAF] * len(leaf_labels)))
+                new_labels.extend(leaf_labels)
+                edited_sizes.extend(array('i', [1] * len(leaf_labels)))
+            start = position + 1 if position in removed else position
+        new_operators.extend(operators[start:])
+        new_labels.extend(labels[start:])
+        edited_sizes.extend(new_sizes[start:])
+        self.operators, self.labels, self.sizes = new_operators, new_labels, edited_sizes
+
+        if self.anchors:
+            # An anchor moves by the removed leaves before it and the leaves inserted up to it
+            removed_positions = sorted(removals)
+            inserted_positions = sorted(inserted_at)
+            inserted_counts = [0, *accumulate(sum(len(insertions[parent]) for parent in inserted_at[position]) for position in inserted_positions)]
+            self.anchors = [
+                anchor - bisect_left(removed_positions, anchor) + inserted_counts[bisect_right(inserted_positions, anchor)]
+                for anchor in self.anchors
+            ]
@@ -26,9 +26,20 @@ class Discovery:
         generator = kwargs.get("generator")
         percentage_of_log = kwargs.get("percentage_of_log", None)
         mutator = kwargs.get("mutator")
+        random_creation_generator = kwargs.get("random_creation_generator", None)
         objective = kwargs.get("objective")
         export_monitor_path = kwargs.get("export_monitor_path", None)
         export_decomposed_objective_function_path = kwargs.get("export_decomposed_objective_function_path", None)
+        n_workers = kwargs.get("n_workers", None)
+        islands = kwargs.get("islands", None)
+        migration_interval = kwargs.get("migration_interval", 10)
+        migration_size = kwargs.get("migration_size", 1)
+        migration_topology = kwargs.get("migration_topology", "ring")
+        seed = kwargs.get("seed", None)
+        
+        # The random trees of every generation are mined by the given generator instead of being random binary trees
+        if random_creation_generator is not None:
+            mutator.set_random_creation_generator(random_creation_generator)
         
         our_pt = ga.run(
             eventlog=event_log, 
@@ -42,7 +53,13 @@ class Discovery:
             stagnation_limit=stagnation_limit,
             time_limit=time_limit,
             export_monitor_path=export_monitor_path,
-            export_decomposed_objective_function_path=export_decomposed_objective_function_path
+            export_decomposed_objective_function_path=export_decomposed_objective_function_path,
+            n_workers=n_workers,
+            islands=islands,
+            migration_interval=migration_interval,
+            migration_size=migration_size,
+            migration_topology=migration_topology,
+            seed=seed,
         )
         pm4py_net, init, end = our_pt.to_pm4py_pn()
         
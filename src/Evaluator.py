@@ -30,9 +30,13 @@ class SingleEvaluator:
         self.pn = pn
         self.pt = pt
 
-        # convert the eventlog to pm4py format
+        # convert the petri net to pm4py format, the pm4py log is shared through the compiled log
         self.pm4py_pn, self.init_marking, self.final_marking = self.pn.to_pm4py()
-        self.event_log_pm4py = self.eventlog.to_pm4py()
+        self.compiled_log = self.eventlog.compile()
+        self.event_log_pm4py = self.compiled_log.to_pm4py()
+        # One objective for the FTR metrics, instead of one per call
+        self.ftr_objective = Objective(None)
+        self.ftr_objective.set_event_log(self.eventlog)
     
     def get_evaluation_metrics(self, objective_metric_weights: dict[str, float]):
         data = {
@@ -85,14 +89,10 @@ class SingleEvaluator:
         return f1_score
 
     def get_ftr_fitness(self):
-        objective = Objective(None)
-        objective.set_event_log(self.eventlog)
-        return objective.ftr_fitness(self.pn.to_fast_token_based_replay())
+        return self.ftr_objective.ftr_fitness(self.pn.to_fast_token_based_replay())
     
     def get_ftr_precision(self):
-        objective = Objective(None)
-        objective.set_event_log(self.eventlog)
-        return objective.ftr_precision(self.pn.to_fast_token_based_replay())
+        return self.ftr_objective.ftr_precision(self.pn.to_fast_token_based_replay())
 
 # This function discovers a process model from an event log 
 # and evaluates it against the event log (calculates the metrics)
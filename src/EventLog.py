@@ -2,6 +2,7 @@ import lxml.etree as ET
 from pm4py.objects.log.obj import EventLog as PM4PyEventLog, Trace as PM4PyTrace, Event as PM4PyEvent
 import src.FastTokenBasedReplay as FastTokenBasedReplay
 from datetime import datetime, timedelta
+import numpy as np
 
 class Event:
     """
@@ -64,6 +65,310 @@ class Trace:
             return False
         return self.events == other.events
     
+class VariantLog:
+    """
+    Class representing an event log compressed to its unique activity sequences (variants).
+
+    Attributes:
+    -----------
+    activities : list[str]
+        The activity names, the position of an activity in the list is its id.
+    variants : list[tuple[int]]
+        The unique variants as tuples of activity ids, in order of their first occurrence.
+    frequencies : list[int]
+        The number of traces of every variant.
+    trace_variants : list[int]
+        For every trace of the original event log, the index of its variant.
+    """
+    def __init__(self, activities: list, variants: list, frequencies: list, trace_variants: list):
+        self.activities = activities
+        self.variants = variants
+        self.frequencies = frequencies
+        self.trace_variants = trace_variants
+        self.activity_ids = {activity: idx for idx, activity in enumerate(activities)}
+
+    @staticmethod
+    def from_eventlog(eventlog: 'EventLog') -> 'VariantLog':
+        """
+        Compress an event log to its variants.
+        """
+        activity_sequences = [tuple(event.activity for event in trace.events) for trace in eventlog.traces]
+        activities = sorted({activity for sequence in activity_sequences for activity in sequence})
+        activity_ids = {activity: idx for idx, activity in enumerate(activities)}
+
+        variant_ids = {}
+        variants = []
+        frequencies = []
+        trace_variants = []
+        for sequence in activity_sequences:
+            variant_id = variant_ids.get(sequence)
+            if variant_id is None:
+                variant_id = len(variants)
+                variant_ids[sequence] = variant_id
+                variants.append(tuple(activity_ids[activity] for activity in sequence))
+                frequencies.append(0)
+            frequencies[variant_id] += 1
+            trace_variants.append(variant_id)
+
+        return VariantLog(activities, variants, frequencies, trace_variants)
+
+    def __repr__(self):
+        return f"VariantLog(variants={len(self.variants)}, traces={self.num_traces()})"
+
+    def __len__(self):
+        """
+        Return the number of variants.
+        """
+        return len(self.variants)
+
+    def num_traces(self) -> int:
+        """
+        Return the number of traces the variants stand for.
+        """
+        return sum(self.frequencies)
+
+    def decode(self, variant_idx: int) -> list:
+        """
+        Return the activity names of a variant.
+        """
+        return [self.activities[activity] for activity in self.variants[variant_idx]]
+
+    def first_trace_indices(self) -> list:
+        """
+        Return for every variant the index of its first trace in the original event log.
+        """
+        first_traces = [None] * len(self.variants)
+        for trace_idx, variant_idx in enumerate(self.trace_variants):
+            if first_traces[variant_idx] is None:
+                first_traces[variant_idx] = trace_idx
+        return first_traces
+
+    def to_fast_token_based_replay(self):
+        """
+        Converts the variants with their frequencies to a FastTokenBasedReplay.EventLog object.
+        Every variant is replayed once and weighted by its frequency.
+        """
+        event_log_c = FastTokenBasedReplay.EventLog()
+        event_log_c.set_activities(self.activities)
+        for variant, frequency in zip(self.variants, self.frequencies):
+            event_log_c.add_variant(list(variant), frequency)
+        return event_log_c
+
+
+class FollowsRelations:
+    """
+    Class representing the directly-follows and eventually-follows counts of an event log.
+
+    The counts are taken from the variant log and weighted by the variant frequencies. They are built
+    once per event log and length by EventLog.get_follows_relations() and must not be changed.
+
+    Attributes:
+    -----------
+    activities : list[str]
+        The activity names, the position of an activity in the list is its id (as in the variant log).
+    length : int
+        The maximum number of steps between two activities that are counted as eventually following.
+    directly_follows : np.ndarray
+        directly_follows[a, b] is the number of times activity b directly follows activity a.
+    eventually_follows : np.ndarray
+        eventually_follows[a, b] is the number of times activity b follows activity a within `length` steps.
+    """
+    def __init__(self, activities: list, length: int, directly_follows: np.ndarray, eventually_follows: np.ndarray):
+        self.activities = activities
+        self.length = length
+        self.directly_follows = directly_follows
+        self.eventually_follows = eventually_follows
+        self.activity_ids = {activity: idx for idx, activity in enumerate(activities)}
+
+    @staticmethod
+    def from_variant_log(variant_log: VariantLog, length: int = 1) -> 'FollowsRelations':
+        """
+        Count the relations of all variants at once: the variants are concatenated and for every step
+        up to `length` the pairs of events that lie in the same variant are counted with a single bincount.
+        """
+        num_activities = len(variant_log.activities)
+        lengths = np.array([len(variant) for variant in variant_log.variants], dtype=np.int64)
+        events = np.fromiter((activity for variant in variant_log.variants for activity in variant),
+                             dtype=np.int64, count=int(lengths.sum()))
+        variant_ids = np.repeat(np.arange(len(lengths)), lengths)
+        weights = np.repeat(np.asarray(variant_log.frequencies, dtype=np.int64), lengths)
+
+        counts = []
+        for step in range(1, max(length, 1) + 1):
+            same_variant = variant_ids[:-step] == variant_ids[step:]
+            pairs = events[:-step][same_variant] * num_activities + events[step:][same_variant]
+            step_counts = np.bincount(pairs, weights=weights[:-step][same_variant], minlength=num_activities ** 2)
+            counts.append(step_counts.astype(np.int64).reshape(num_activities, num_activities))
+
+        directly_follows = counts[0]
+        eventually_follows = directly_follows if length <= 1 else np.sum(counts, axis=0)
+        return FollowsRelations(variant_log.activities, length, directly_follows, eventually_follows)
+
+    def __repr__(self):
+        return f"FollowsRelations(activities={len(self.activities)}, length={self.length})"
+
+    def follows(self, activity_a: str, activity_b: str) -> bool:
+        """
+        Check if `activity_b` follows `activity_a` within `length` steps in any trace.
+        """
+        a = self.activity_ids.get(activity_a)
+        b = self.activity_ids.get(activity_b)
+        if a is None or b is None:
+            return False
+        return bool(self.eventually_follows[a, b])
+
+    def footprint(self, activities) -> dict:
+        """
+        Get the footprint of the given activities, see EventLog.get_footprint_matrix.
+        Activities that do not occur in the log are in the '#' relation with all activities.
+        """
+        follows = self.eventually_follows > 0
+        relations = np.full(follows.shape, '#', dtype=object)
+        relations[follows & follows.T] = '||'
+        relations[follows & ~follows.T] = '>'
+        relations[~follows & follows.T] = '<'
+        relations = relations.tolist()
+
+        activity_ids = [(activity, self.activity_ids.get(activity)) for activity in activities]
+        footprint_matrix = {}
+        for activity_a, a in activity_ids:
+            row = relations[a] if a is not None else None
+            for activity_b, b in activity_ids:
+                footprint_matrix[(activity_a, activity_b)] = row[b] if row is not None and b is not None else '#'
+        return footprint_matrix
+
+
+class LogIndex:
+    """
+    Class representing the inverted index of an event log: the traces of every variant, the variants
+    every activity occurs in and the position of every trace id.
+    It is built once per event log by EventLog.get_index() and must not be changed.
+
+    Attributes:
+    -----------
+    variant_log : VariantLog
+        The variant log the index is built on.
+    variant_traces : list[list[int]]
+        For every variant, the indices of its traces in the event log in ascending order.
+    variant_activities : list[tuple[str]]
+        For every variant, its distinct activities in the order of their first occurrence.
+    activity_variants : dict[str, list[int]]
+        For every activity, the variants it occurs in in ascending order.
+    trace_positions : dict[str, int]
+        For every trace id, the index of its first trace in the event log. It is built on first access,
+        so building the index does not need the traces themselves.
+    variants_by_frequency : list[int]
+        The variants sorted by frequency in descending order, variants with the same frequency in ascending order.
+    """
+    def __init__(self, eventlog: 'EventLog'):
+        variant_log = eventlog.to_variant_log()
+        self.variant_log = variant_log
+
+        self.variant_traces = [[] for _ in range(len(variant_log))]
+        for trace_idx, variant_idx in enumerate(variant_log.trace_variants):
+            self.variant_traces[variant_idx].append(trace_idx)
+
+        self.variant_activities = []
+        self.activity_variants = {}
+        for variant_idx, variant in enumerate(variant_log.variants):
+            activities = tuple(variant_log.activities[activity] for activity in dict.fromkeys(variant))
+            self.variant_activities.append(activities)
+            for activity in activities:
+                self.activity_variants.setdefault(activity, []).append(variant_idx)
+
+        self._traces = eventlog.traces
+        self._trace_positions = None
+
+        self.variants_by_frequency = sorted(range(len(variant_log)), key=lambda k: variant_log.frequencies[k], reverse=True)
+
+    def __repr__(self):
+        return f"LogIndex(variants={len(self.variant_traces)}, activities={len(self.activity_variants)})"
+
+    @property
+    def trace_positions(self) -> dict:
+        if self._trace_positions is None:
+            self._trace_positions = {}
+            for trace_idx, trace in enumerate(self._traces):
+                self._trace_positions.setdefault(trace.trace_id, trace_idx)
+        return self._trace_positions
+
+    def frequency(self, variant_idx: int) -> int:
+        """
+        Return the number of traces of a variant.
+        """
+        return self.variant_log.frequencies[variant_idx]
+
+    def first_trace(self, variant_idx: int) -> int:
+        """
+        Return the index of the first trace of a variant.
+        """
+        return self.variant_traces[variant_idx][0]
+
+    def activities_of_traces(self, trace_indices) -> set:
+        """
+        Return the set of activities of the given traces, built in the same order as EventLog.unique_activities()
+        builds it from these traces.
+        """
+        trace_variants = self.variant_log.trace_variants
+        activities = set()
+        for trace_idx in trace_indices:
+            activities.update(self.variant_activities[trace_variants[trace_idx]])
+        return activities
+
+
+class CompiledLog:
+    """
+    Class representing the read-only form of an event log that all evaluations on it share.
+
+    It holds the interned activity table, the variants with their frequencies and the
+    FastTokenBasedReplay log of the variants with its prefixes precomputed for the precision.
+    The PM4Py log is only converted when a PM4Py metric asks for it.
+    A compiled log is built once per event log by EventLog.compile() and must not be changed.
+
+    Attributes:
+    -----------
+    activities : tuple[str]
+        The activity names, the position of an activity in the tuple is its id.
+    activity_ids : dict[str, int]
+        The id of every activity.
+    variants : tuple[tuple[int]]
+        The unique variants as tuples of activity ids, in order of their first occurrence.
+    frequencies : tuple[int]
+        The number of traces of every variant.
+    """
+    def __init__(self, eventlog: 'EventLog'):
+        variant_log = eventlog.to_variant_log()
+        self.activities = tuple(variant_log.activities)
+        self.activity_ids = dict(variant_log.activity_ids)
+        self.variants = tuple(variant_log.variants)
+        self.frequencies = tuple(variant_log.frequencies)
+        self._eventlog = eventlog
+        self._ftr_eventlog = None
+        self._pm4py_eventlog = None
+
+    def __repr__(self):
+        return f"CompiledLog(activities={len(self.activities)}, variants={len(self.variants)})"
+
+    def to_fast_token_based_replay(self):
+        """
+        Get the FastTokenBasedReplay.EventLog of the variants with their frequencies.
+        It is built with its prefixes on the first call and shared afterwards.
+        """
+        if self._ftr_eventlog is None:
+            ftr_eventlog = self._eventlog.to_variant_log().to_fast_token_based_replay()
+            ftr_eventlog.precompute_prefixes()
+            self._ftr_eventlog = ftr_eventlog
+        return self._ftr_eventlog
+
+    def to_pm4py(self):
+        """
+        Get the PM4Py event log. It is converted on the first call and shared afterwards.
+        """
+        if self._pm4py_eventlog is None:
+            self._pm4py_eventlog = self._eventlog.to_pm4py()
+        return self._pm4py_eventlog
+
+
 class EventLog:
     """
     Class representing an event log.
@@ -76,6 +381,10 @@ class EventLog:
     def __init__(self):
         self.traces = []
         self._unique_activities = None
+        self._variant_log = None
+        self._follows_relations = {}
+        self._index = None
+        self._compiled_log = None
         self.name = None
     
     @staticmethod
@@ -128,6 +437,67 @@ class EventLog:
             eventlog.traces.append(current_trace)
         return eventlog
 
+    @staticmethod
+    def load_xes_streaming(xes_file: str, activity_only: bool = False, timestamps: bool = True):
+        """
+        Load an event log from an XES file without building the whole document in memory.
+        Each trace is parsed when its closing tag is read and cleared afterwards, so only
+        one trace element is kept alive at a time.
+
+        Parameters:
+        -----------
+        xes_file : str
+            The path to the XES file.
+        activity_only : bool
+            If True, only the trace ids and the activities (concept:name) of the events are kept,
+            all other attributes are skipped.
+        timestamps : bool
+            If activity_only is True, whether the timestamps (time:timestamp) of the events are kept.
+        """
+        eventlog = EventLog()
+        keep_timestamps = timestamps or not activity_only
+
+        for _, trace in ET.iterparse(xes_file, events=("end",), tag="{*}trace"):
+            trace_id = ""
+            trace_attributes = {}
+
+            # Parse trace attributes
+            for attr in trace.iterchildren("{*}string"):
+                if attr.attrib["key"] == "concept:name":
+                    trace_id = attr.attrib["value"]
+                elif not activity_only:
+                    trace_attributes[attr.attrib["key"]] = attr.attrib["value"]
+
+            current_trace = Trace(trace_id, trace_attributes)
+
+            # Iterate through the events in the trace
+            for event in trace.iterchildren("{*}event"):
+                event_attributes = {}
+                activity = ""
+                timestamp = ""
+
+                # Parse event attributes
+                for attr in event:
+                    key = attr.attrib["key"]
+                    if key == "concept:name":
+                        activity = attr.attrib["value"]
+                    elif key == "time:timestamp":
+                        if keep_timestamps:
+                            timestamp = attr.attrib["value"]
+                    elif not activity_only:
+                        event_attributes[key] = attr.attrib["value"]
+
+                current_trace.add_event(Event(activity, timestamp, event_attributes))
+
+            # Add the trace to the log
+            eventlog.traces.append(current_trace)
+
+            # Free the parsed trace and the already processed siblings
+            trace.clear()
+            while trace.getprevious() is not None:
+                del trace.getparent()[0]
+        return eventlog
+
     def from_trace_list(trace_list: list):
         """
         Create an event log from a list of traces.
@@ -270,12 +640,10 @@ class EventLog:
         Returns:
         --------
         Trace or None
-            The trace with the given trace ID, or None if not found.
+            The first trace with the given trace ID, or None if not found.
         """
-        for trace in self.traces:
-            if trace.trace_id == trace_id:
-                return trace
-        return None
+        trace_idx = self.get_index().trace_positions.get(trace_id)
+        return self.traces[trace_idx] if trace_idx is not None else None
 
     def to_pm4py(self):
         """
@@ -327,28 +695,9 @@ class EventLog:
         -------
         dict
             A dictionary where keys are tuples representing pairs of activities ('A', 'B')
-            and values are the relations ('>', '||', '#').
+            and values are the relations ('>', '<', '||', '#').
         """
-        # Step 1: Initialize a dictionary for direct succession relationships with eventual following
-        all_activities = self.unique_activities()
-        footprint_matrix = {}
-
-        # Step 2: Fill the footprint matrix based on eventual succession relationships
-        for activity_a in all_activities:
-            for activity_b in all_activities:
-                pair_key = (activity_a, activity_b)
-
-                if self.does_eventually_follows(activity_a, activity_b, length):
-                    if self.does_eventually_follows(activity_b, activity_a, length):
-                        footprint_matrix[pair_key] = '||'  # Parallel relation
-                    else:
-                        footprint_matrix[pair_key] = '>'  # A → B (causal relation)
-                elif self.does_eventually_follows(activity_b, activity_a, length):
-                    footprint_matrix[pair_key] = '<'  # B → A (reverse causal relation)
-                else:
-                    footprint_matrix[pair_key] = '#'  # No direct relation
-
-        return footprint_matrix
+        return self.get_follows_relations(length).footprint(self.unique_activities())
     
     def does_eventually_follows(self, activity_a: str, activity_b: str, length: int = 1) -> bool:
         """
@@ -370,14 +719,7 @@ class EventLog:
             True if `activity_a` is eventually followed by `activity_b` within `length` steps
             in any trace, False otherwise.
         """
-        for trace in self.traces:
-            for i, event in enumerate(trace.events):
-                if event.activity == activity_a:
-                    # Check if `activity_b` appears within the next `length` events
-                    for j in range(1, length + 1):
-                        if i + j < len(trace.events) and trace.events[i + j].activity == activity_b:
-                            return True
-        return False
+        return self.get_follows_relations(length).follows(activity_a, activity_b)
     
     def unique_activities(self):
         """
@@ -428,13 +770,52 @@ class EventLog:
 
         return event_log_c
     
+    def to_variant_log(self) -> VariantLog:
+        """
+        Get the variant log of the event log. It is built on the first call and reused
+        afterwards, so the traces must not be changed once it has been built.
+        """
+        if self._variant_log is None:
+            self._variant_log = VariantLog.from_eventlog(self)
+        return self._variant_log
+    
+    def get_index(self) -> LogIndex:
+        """
+        Get the inverted index of the event log. It is built on the first call and reused
+        afterwards, so the traces must not be changed once it has been built.
+        """
+        if self._index is None:
+            self._index = LogIndex(self)
+        return self._index
+    
+    def get_follows_relations(self, length: int = 1) -> FollowsRelations:
+        """
+        Get the directly-follows and eventually-follows counts of the event log. They are built on the
+        first call for a length and reused afterwards, so the traces must not be changed once they have been built.
+        """
+        relations = self._follows_relations.get(length)
+        if relations is None:
+            relations = FollowsRelations.from_variant_log(self.to_variant_log(), length)
+            self._follows_relations[length] = relations
+        return relations
+    
+    def compile(self) -> CompiledLog:
+        """
+        Get the compiled log shared by all evaluations on the event log. It is built on the
+        first call and reused afterwards, so the traces must not be changed once it has been built.
+        """
+        if self._compiled_log is None:
+            self._compiled_log = CompiledLog(self)
+        return self._compiled_log
+
+    def __getstate__(self):
+        # The compiled log holds FastTokenBasedReplay objects that cannot be pickled, it is rebuilt on demand
+        state = self.__dict__.copy()
+        state["_compiled_log"] = None
+        return state
+
     def get_num_unique_traces(self):
         """
         Get the number of unique traces in the event log.
         """
-        unique_traces = set()
-        for trace in self.traces:
-            # Create a tuple of event activities to represent the trace
-            trace_tuple = tuple(event.activity for event in trace.events)
-            unique_traces.add(trace_tuple)
-        return len(unique_traces)
\ No newline at end of file
+        return len(self.to_variant_log())
\ No newline at end of file
@@ -0,0 +1,293 @@
+from src.EventLog import EventLog, VariantLog, Trace, Event
+from collections.abc import Sequence
+import numpy as np
+import hashlib
+import os
+
+
+class EventLogCache:
+    """
+    A binary sidecar cache for event logs parsed from XES files.
+
+    The parsed log is stored in a cache directory as an uncompressed NumPy .npz archive holding
+    the activity dictionary, the int-encoded events, the trace offsets and the variants with their
+    counts. Activities, trace ids, timestamps and attributes are stored as indices into one string
+    table, which is a single UTF-8 buffer with the offsets of its strings.
+    The cache is keyed by the modification time, size and SHA-1 hash of the XES file: if the
+    modification time or size changed, the hash decides whether the cache is still valid.
+
+    A loaded log gets its variant log straight from the cache, while its traces are a CachedTraces
+    sequence that decodes a trace only when it is accessed.
+
+    A cache records which attributes it holds (its level), so it can serve every load that
+    needs the same or fewer attributes.
+
+    The cache files are not written next to the XES files, as the log directories are listed
+    by the experiment scripts. The directory can be set with the EVENTLOG_CACHE_DIR environment variable,
+    and setting EVENTLOG_CACHE=0 turns the cache off.
+    """
+    VERSION = 2
+    DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "gtm", "eventlogs")
+
+    # Attributes kept in a cache
+    ACTIVITIES = 0
+    TIMESTAMPS = 1
+    ALL_ATTRIBUTES = 2
+
+    @staticmethod
+    def enabled() -> bool:
+        """
+        Return False if the cache is turned off with the EVENTLOG_CACHE environment variable.
+        """
+        return os.environ.get("EVENTLOG_CACHE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+    @staticmethod
+    def sidecar_path(xes_file: str) -> str:
+        """
+        Return the path of the cache file belonging to an XES file.
+        """
+        directory = os.environ.get("EVENTLOG_CACHE_DIR", EventLogCache.DEFAULT_DIRECTORY)
+        path_hash = hashlib.sha1(os.path.abspath(xes_file).encode()).hexdigest()[:16]
+        return os.path.join(directory, f"{os.path.basename(xes_file)}.{path_hash}.npz")
+
+    @staticmethod
+    def level(activity_only: bool, timestamps: bool) -> int:
+        """
+        Return the cache level needed for a load with the given options.
+        """
+        if not activity_only:
+            return EventLogCache.ALL_ATTRIBUTES
+        return EventLogCache.TIMESTAMPS if timestamps else EventLogCache.ACTIVITIES
+
+    @staticmethod
+    def file_hash(xes_file: str) -> str:
+        sha1 = hashlib.sha1()
+        with open(xes_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+
+    @staticmethod
+    def load(xes_file: str, activity_only: bool = False, timestamps: bool = True):
+        """
+        Load an event log from the cache of an XES file.
+        Returns None if there is no valid cache that holds the requested attributes.
+        """
+        path = EventLogCache.sidecar_path(xes_file)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data["version"]) != EventLogCache.VERSION:
+                    return None
+                if int(data["level"]) < EventLogCache.level(activity_only, timestamps):
+                    return None
+
+                stat = os.stat(xes_file)
+                touched = int(data["mtime_ns"]) != stat.st_mtime_ns or int(data["size"]) != stat.st_size
+                if touched:
+                    # The file was touched or replaced, only its content tells if the cache is stale
+                    if str(data["sha1"]) != EventLogCache.file_hash(xes_file):
+                        return None
+
+                arrays = {key: data[key] for key in data.files}
+        except (OSError, ValueError, KeyError):
+            # A corrupt or unreadable cache is treated as missing
+            return None
+
+        if touched:
+            # The content did not change, remember the new modification time to skip hashing next time
+            arrays["mtime_ns"] = np.array(stat.st_mtime_ns, dtype=np.int64)
+            arrays["size"] = np.array(stat.st_size, dtype=np.int64)
+            EventLogCache._write(path, arrays)
+
+        return EventLogCache._decode(arrays, activity_only, timestamps)
+
+    @staticmethod
+    def store(xes_file: str, eventlog: EventLog, activity_only: bool = False, timestamps: bool = True):
+        """
+        Write the cache of an XES file for an event log loaded from it with the given options.
+        Failing to write the cache (e.g. to a read-only directory) is not an error.
+        """
+        arrays = EventLogCache._encode(eventlog)
+        stat = os.stat(xes_file)
+        arrays["version"] = np.array(EventLogCache.VERSION)
+        arrays["level"] = np.array(EventLogCache.level(activity_only, timestamps))
+        arrays["mtime_ns"] = np.array(stat.st_mtime_ns, dtype=np.int64)
+        arrays["size"] = np.array(stat.st_size, dtype=np.int64)
+        arrays["sha1"] = np.array(EventLogCache.file_hash(xes_file))
+
+        EventLogCache._write(EventLogCache.sidecar_path(xes_file), arrays)
+
+    @staticmethod
+    def _write(path: str, arrays: dict):
+        # Write to a temporary file first, so concurrent readers never see a partial cache
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _encode(eventlog: EventLog) -> dict:
+        variant_log = eventlog.to_variant_log()
+        activity_ids = variant_log.activity_ids
+
+        strings = {}
+        def intern(value: str) -> int:
+            idx = strings.get(value)
+            if idx is None:
+                idx = len(strings)
+                strings[value] = idx
+            return idx
+
+        activities = [intern(activity) for activity in variant_log.activities]
+        events = []
+        trace_offsets = [0]
+        trace_ids = []
+        trace_attribute_offsets = [0]
+        trace_attributes = []
+        timestamps = []
+        event_attribute_offsets = [0]
+        event_attributes = []
+        for trace in eventlog.traces:
+            trace_ids.append(intern(trace.trace_id))
+            for key, value in trace.attributes.items():
+                trace_attributes.append((intern(key), intern(value)))
+            trace_attribute_offsets.append(len(trace_attributes))
+
+            for event in trace.events:
+                events.append(activity_ids[event.activity])
+                timestamps.append(intern(event.timestamp))
+                for key, value in event.attributes.items():
+                    event_attributes.append((intern(key), intern(value)))
+                event_attribute_offsets.append(len(event_attributes))
+            trace_offsets.append(len(events))
+
+        encoded_strings = [value.encode() for value in strings]
+        string_offsets = np.zeros(len(encoded_strings) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded_strings], out=string_offsets[1:])
+
+        return {
+            "string_data": np.frombuffer(b"".join(encoded_strings), dtype=np.uint8),
+            "string_offsets": string_offsets,
+            "activities": np.array(activities, dtype=np.int32),
+            "events": np.array(events, dtype=np.int32),
+            "trace_offsets": np.array(trace_offsets, dtype=np.int64),
+            "trace_variants": np.array(variant_log.trace_variants, dtype=np.int32),
+            "variant_frequencies": np.array(variant_log.frequencies, dtype=np.int64),
+            "trace_ids": np.array(trace_ids, dtype=np.int32),
+            "trace_attribute_offsets": np.array(trace_attribute_offsets, dtype=np.int64),
+            "trace_attributes": np.array(trace_attributes, dtype=np.int32).reshape(-1, 2),
+            "timestamps": np.array(timestamps, dtype=np.int32),
+            "event_attribute_offsets": np.array(event_attribute_offsets, dtype=np.int64),
+            "event_attributes": np.array(event_attributes, dtype=np.int32).reshape(-1, 2),
+        }
+
+    @staticmethod
+    def _decode(arrays: dict, activity_only: bool, timestamps: bool) -> EventLog:
+        traces = CachedTraces(arrays, activity_only, timestamps)
+        activities = traces.activities
+        events = arrays["events"]
+        trace_offsets = arrays["trace_offsets"]
+
+        # The variants are part of the cache, so the variant log does not have to be recomputed.
+        # Variants are numbered in the order of their first trace, so their first traces are in ascending order.
+        trace_variants = arrays["trace_variants"]
+        _, first_traces = np.unique(trace_variants, return_index=True)
+        variants = [tuple(events[trace_offsets[idx]:trace_offsets[idx + 1]].tolist()) for idx in first_traces.tolist()]
+
+        # Adding the activities variant by variant inserts them in the same order as adding them trace by trace
+        unique_activities = set()
+        for variant in variants:
+            unique_activities.update(activities[activity] for activity in variant)
+
+        eventlog = EventLog()
+        eventlog.traces = traces
+        eventlog.set_unique_activities(unique_activities)
+        eventlog._variant_log = VariantLog(activities, variants, arrays["variant_frequencies"].tolist(), trace_variants.tolist())
+        return eventlog
+
+
+class CachedTraces(Sequence):
+    """
+    The traces of an event log loaded from its cache, as a read-only sequence.
+
+    A trace is decoded from the cached arrays when it is first accessed and kept afterwards, so
+    loading a log from its cache does not build an Event object for every event up front.
+    """
+    def __init__(self, arrays: dict, activity_only: bool, timestamps: bool):
+        self.string_data = arrays["string_data"].tobytes()
+        self.string_offsets = arrays["string_offsets"].tolist()
+        self.activities = [self._string(idx) for idx in arrays["activities"].tolist()]
+        self.activity_only = activity_only
+        self.keep_timestamps = timestamps or not activity_only
+        self._arrays = arrays
+        self._columns = None
+        self._traces = [None] * len(arrays["trace_ids"])
+
+    def __repr__(self):
+        return f"CachedTraces(traces={len(self)})"
+
+    def __len__(self):
+        return len(self._traces)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[trace_idx] for trace_idx in range(*idx.indices(len(self)))]
+        trace = self._traces[idx]
+        if trace is None:
+            trace = self._decode_trace(idx % len(self))
+            self._traces[idx] = trace
+        return trace
+
+    def _string(self, idx: int) -> str:
+        return self.string_data[self.string_offsets[idx]:self.string_offsets[idx + 1]].decode()
+
+    def _get_columns(self) -> dict:
+        # Everything is converted to lists once, as slicing lists is much faster than slicing arrays
+        # trace by trace, and every string is decoded once and shared by all its occurrences
+        if self._columns is None:
+            names = ["events", "trace_offsets", "trace_ids"]
+            if self.keep_timestamps:
+                names.append("timestamps")
+            if not self.activity_only:
+                names += ["trace_attribute_offsets", "trace_attributes", "event_attribute_offsets", "event_attributes"]
+            # The attributes are flattened to alternating keys and values
+            self._columns = {name: self._arrays[name].ravel().tolist() for name in names}
+            self._columns["strings"] = [self._string(idx) for idx in range(len(self.string_offsets) - 1)]
+            self._arrays = None
+        return self._columns
+
+    def _decode_trace(self, trace_idx: int) -> Trace:
+        columns = self._get_columns()
+        strings = columns["strings"]
+        start, end = columns["trace_offsets"][trace_idx], columns["trace_offsets"][trace_idx + 1]
+        trace = Trace(strings[columns["trace_ids"][trace_idx]], {})
+        if self.keep_timestamps:
+            timestamps = [strings[idx] for idx in columns["timestamps"][start:end]]
+        else:
+            timestamps = [""] * (end - start)
+        activities = [self.activities[activity] for activity in columns["events"][start:end]]
+
+        if self.activity_only:
+            trace.events = [Event(activity, timestamp, {}) for activity, timestamp in zip(activities, timestamps)]
+            return trace
+
+        offsets, attributes = columns["trace_attribute_offsets"], columns["trace_attributes"]
+        trace.attributes = _attribute_dict(strings, attributes[2 * offsets[trace_idx]:2 * offsets[trace_idx + 1]])
+        offsets, attributes = columns["event_attribute_offsets"], columns["event_attributes"]
+        for event_idx, activity, timestamp in zip(range(start, end), activities, timestamps):
+            event_attributes = _attribute_dict(strings, attributes[2 * offsets[event_idx]:2 * offsets[event_idx + 1]])
+            trace.events.append(Event(activity, timestamp, event_attributes))
+        return trace
+
+
+def _attribute_dict(strings: list, attributes: list) -> dict:
+    # The attributes alternate between the string ids of the keys and the values
+    return {strings[attributes[idx]]: strings[attributes[idx + 1]] for idx in range(0, len(attributes), 2)}
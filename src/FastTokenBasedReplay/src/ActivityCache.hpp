@@ -8,16 +8,22 @@
 
 class ActivityCache {
     public:
-        std::unordered_map<Marking, std::unordered_map<std::string, std::vector<std::string>>, MarkingHasher> cache;
+        // For every marking, the silent firing sequence that enables a transition (by id)
+        std::unordered_map<DenseMarking, std::unordered_map<uint32_t, std::vector<std::string>>, DenseMarkingHasher> cache;
     
-        void store(const Marking& marking, const std::string& transition, const std::vector<std::string>& silent_sequence) {
+        void store(const DenseMarking& marking, uint32_t transition, const std::vector<std::string>& silent_sequence) {
             cache[marking][transition] = silent_sequence;
         }
     
-        std::vector<std::string>* retrieve(const Marking& marking, const std::string& transition) {
-            if (cache.find(marking) != cache.end() && cache[marking].find(transition) != cache[marking].end()) {
-                return &cache[marking][transition];
+        std::vector<std::string>* retrieve(const DenseMarking& marking, uint32_t transition) {
+            auto marking_it = cache.find(marking);
+            if (marking_it == cache.end()) {
+                return nullptr;
             }
-            return {}; // Return empty vector if no cache entry exists
+            auto transition_it = marking_it->second.find(transition);
+            if (transition_it == marking_it->second.end()) {
+                return nullptr;
+            }
+            return &transition_it->second;
         }
-    };
\ No newline at end of file
+    };
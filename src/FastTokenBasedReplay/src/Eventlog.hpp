@@ -2,6 +2,11 @@
 
 #include <vector>
 #include <unordered_map>
+#include <set>
+#include <memory>
+#include <string>
+#include <stdexcept>
+#include <cstdint>
 
 class Event {
 public:
@@ -77,12 +82,53 @@ namespace std {
     };
 }
 
+// The activities that follow every prefix ("a,b,") of the traces of a log
+using PrefixMap = std::unordered_map<std::string, std::set<std::string>>;
+
 class EventLog {
 public:
     std::vector<Trace> traces;
+    std::vector<uint32_t> frequencies;    // Number of traces every trace stands for, empty if all traces occur once
+    std::vector<std::string> activities;  // Activity names of the int-encoded variants
+    std::shared_ptr<const PrefixMap> prefixes;  // Precomputed prefixes, null if they are computed on every replay
 
     void add_trace(const Trace& trace) {
+        prefixes.reset();
         traces.push_back(trace);
+        if (!frequencies.empty()) {
+            frequencies.push_back(1);
+        }
+    }
+
+    void set_activities(const std::vector<std::string>& activity_names) {
+        activities = activity_names;
+    }
+
+    // Add a unique variant, given as activity ids, that occurs `frequency` times in the log
+    void add_variant(const std::vector<uint32_t>& variant, uint32_t frequency) {
+        if (frequencies.empty()) {
+            frequencies.assign(traces.size(), 1);
+        }
+        prefixes.reset();
+        Trace trace("variant_" + std::to_string(traces.size() + 1), {});
+        trace.events.reserve(variant.size());
+        for (uint32_t activity : variant) {
+            if (activity >= activities.size()) {
+                throw std::runtime_error("Unknown activity id: " + std::to_string(activity));
+            }
+            trace.events.emplace_back(activities[activity], "", std::unordered_map<std::string, std::string>());
+        }
+        traces.push_back(std::move(trace));
+        frequencies.push_back(frequency);
+    }
+
+    // A log built from variants contains every trace only once
+    bool is_variant_log() const {
+        return !frequencies.empty();
+    }
+
+    uint32_t get_frequency(size_t trace_index) const {
+        return frequencies.empty() ? 1 : frequencies[trace_index];
     }
 
     std::string repr() const {
@@ -3,6 +3,9 @@
 #include <string>
 #include <unordered_map>
 #include <initializer_list>
+#include <vector>
+#include <cstdint>
+#include <algorithm>
 
 
 
@@ -62,12 +65,28 @@ class Marking {
     };
 
 
+// Mix the bits of a 64 bit value (splitmix64 finalizer)
+inline uint64_t mix_hash(uint64_t value) {
+    value += 0x9e3779b97f4a7c15ULL;
+    value = (value ^ (value >> 30)) * 0xbf58476d1ce4e5b9ULL;
+    value = (value ^ (value >> 27)) * 0x94d049bb133111ebULL;
+    return value ^ (value >> 31);
+}
+
+// Hash of a single (place, tokens) pair, a marking hashes to the sum over its places
+inline uint64_t place_tokens_hash(uint64_t place_hash, uint32_t tokens) {
+    if (tokens == 0) {
+        return 0;
+    }
+    return mix_hash(place_hash ^ mix_hash(tokens));
+}
+
 // Define MarkingHasher outside the HyperGraph class
 struct MarkingHasher {
     size_t operator()(const Marking& m) const {
-        size_t hash = 0;
+        uint64_t hash = 0;
         for (const auto& [place, tokens] : m.places) {
-            hash ^= std::hash<std::string>{}(place) ^ std::hash<uint32_t>{}(tokens);
+            hash += place_tokens_hash(std::hash<std::string>{}(place), tokens);
         }
         return hash;
     }
@@ -81,3 +100,66 @@ struct MarkingPairHasher {
         return hash1 ^ (hash2 << 1); // Combine hashes uniquely
     }
 };
+
+
+// Marking over the place ids of an indexed Petri net. The hash is updated incrementally
+// whenever the number of tokens in a place changes.
+class DenseMarking {
+    public:
+        std::vector<int> tokens;
+        uint64_t hash = 0;
+
+        DenseMarking() = default;
+
+        DenseMarking(size_t num_places) : tokens(num_places, 0) {}
+
+        DenseMarking(std::initializer_list<int> init) {
+            for (int count : init) {
+                set(tokens.size(), count);
+            }
+        }
+
+        int operator[](uint32_t place) const {
+            return tokens[place];
+        }
+
+        size_t size() const {
+            return tokens.size();
+        }
+
+        void set(uint32_t place, int count) {
+            if (place >= tokens.size()) {
+                tokens.resize(place + 1, 0);
+            }
+            hash -= place_tokens_hash(place, tokens[place]);
+            tokens[place] = count;
+            hash += place_tokens_hash(place, count);
+        }
+
+        void add(uint32_t place, int count) {
+            set(place, tokens[place] + count);
+        }
+
+        void clear() {
+            std::fill(tokens.begin(), tokens.end(), 0);
+            hash = 0;
+        }
+
+        int number_of_tokens() const {
+            int total = 0;
+            for (int count : tokens) {
+                total += count;
+            }
+            return total;
+        }
+
+        bool operator==(const DenseMarking& other) const {
+            return hash == other.hash && tokens == other.tokens;
+        }
+    };
+
+struct DenseMarkingHasher {
+    size_t operator()(const DenseMarking& m) const {
+        return m.hash;
+    }
+};
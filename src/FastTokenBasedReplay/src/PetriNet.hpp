@@ -11,6 +11,12 @@
 #include "Marking.hpp"
 #include "Place.hpp"
 #include <set>
+#include <algorithm>
+#include <memory>
+
+
+// For every place, the shortest sequence of silent transitions that moves a token to every other place it can reach
+using SilentFiringSequences = std::unordered_map<std::string, std::unordered_map<std::string, std::vector<std::string>>>;
 
 
 class Transition {
@@ -53,16 +59,40 @@ class PetriNet {
 
         Marking initial_marking;
         Marking final_marking;
+
+        // Indexed form of the net, built by freeze() once the net is constructed.
+        // Places and transitions get dense ids (the first occurrence of a name wins),
+        // the presets/postsets hold one (place id, weight) entry per arc in arc order.
+        bool frozen = false;
+        std::unordered_map<std::string, uint32_t> place_ids;
+        std::unordered_map<std::string, uint32_t> transition_ids;
+        std::vector<std::string> place_names;
+        std::vector<std::string> transition_names;
+        std::vector<bool> silent;
+        std::vector<std::vector<std::pair<uint32_t, int>>> presets;
+        std::vector<std::vector<std::pair<uint32_t, int>>> postsets;
+        std::vector<std::vector<uint32_t>> consumers;  // For every place, the transitions it has an arc to
+        DenseMarking tokens;                           // Number of tokens for every place id
+
+        // The silent firing sequences, computed by the first replay on the net and shared with its copies.
+        // They only depend on the structure, so changing the net discards them.
+        mutable std::shared_ptr<const SilentFiringSequences> silent_firing_sequences;
     
         void add_place(const Place& place) {
+            unfreeze();
+            silent_firing_sequences.reset();
             places.push_back(place);
         }
     
         void add_transition(const Transition& transition) {
+            unfreeze();
+            silent_firing_sequences.reset();
             transitions.push_back(transition);
         }
     
         void add_arc(const Arc& arc) {
+            unfreeze();
+            silent_firing_sequences.reset();
             arcs.push_back(arc);
         }
         
@@ -74,14 +104,76 @@ class PetriNet {
             final_marking = marking;
         }
 
-        // Find a place by name
-        Place* get_place(const std::string& name){
-            for (auto& place : places) {
-                if (place.name == name) {
-                    return &place;
+        // Build the indexed form of the net, the tokens of the places become the token vector
+        void freeze() {
+            if (frozen) {
+                return;
+            }
+
+            place_ids.clear();
+            transition_ids.clear();
+            place_names.clear();
+            transition_names.clear();
+            silent.clear();
+            tokens = DenseMarking();
+
+            for (const auto& place : places) {
+                if (place_ids.emplace(place.name, place_names.size()).second) {
+                    place_names.push_back(place.name);
+                    tokens.set(tokens.size(), place.tokens);
                 }
             }
-            return nullptr;
+            for (const auto& transition : transitions) {
+                if (transition_ids.emplace(transition.name, transition_names.size()).second) {
+                    transition_names.push_back(transition.name);
+                    silent.push_back(transition.is_silent());
+                }
+            }
+
+            presets.assign(transition_names.size(), {});
+            postsets.assign(transition_names.size(), {});
+            consumers.assign(place_names.size(), {});
+            for (const auto& arc : arcs) {
+                auto place_it = place_ids.find(arc.source);
+                auto transition_it = transition_ids.find(arc.target);
+                if (place_it != place_ids.end() && transition_it != transition_ids.end()) {
+                    presets[transition_it->second].push_back({place_it->second, arc.weight});
+                    consumers[place_it->second].push_back(transition_it->second);
+                    continue;
+                }
+                transition_it = transition_ids.find(arc.source);
+                place_it = place_ids.find(arc.target);
+                if (place_it != place_ids.end() && transition_it != transition_ids.end()) {
+                    postsets[transition_it->second].push_back({place_it->second, arc.weight});
+                }
+            }
+
+            frozen = true;
+        }
+
+        // Write the token vector back to the places before the structure of the net changes
+        void unfreeze() {
+            if (!frozen) {
+                return;
+            }
+            for (auto& place : places) {
+                place.tokens = tokens[place_ids.at(place.name)];
+            }
+            frozen = false;
+        }
+
+        // Find the id of a place by name, -1 if there is no such place
+        int32_t get_place_id(const std::string& name) {
+            freeze();
+            auto it = place_ids.find(name);
+            return it == place_ids.end() ? -1 : static_cast<int32_t>(it->second);
+        }
+
+        // Find the id of a transition by name, -1 if there is no such transition
+        int32_t get_transition_id(const std::string& name) {
+            freeze();
+            auto it = transition_ids.find(name);
+            return it == transition_ids.end() ? -1 : static_cast<int32_t>(it->second);
         }
     
         // Find a transition by name
@@ -93,43 +185,53 @@ class PetriNet {
             }
             return nullptr;
         }
-    
+
         // Check if a transition can fire based on token availability
-        bool can_fire(const Transition& transition) {
-            for (const auto& arc : arcs) {
-                if (arc.target == transition.name) {
-                    Place* place = get_place(arc.source);
-                    if (place && place->tokens < arc.weight) {
-                        return false;  // Not enough tokens in place
-                    }
+        bool can_fire(uint32_t transition) const {
+            for (const auto& [place, weight] : presets[transition]) {
+                if (tokens[place] < weight) {
+                    return false;  // Not enough tokens in place
                 }
             }
             return true;
         }
     
-        // Fire a transition, updating tokens in the places
-        void fire_transition(const Transition& transition, int* consumed, int* produced) {
-            for (auto& arc : arcs) {
-                if (arc.target == transition.name) {
-                    Place* place = get_place(arc.source);
-                    if (place) {
-                        place->remove_tokens(arc.weight);
-                        if (consumed) {
-                            *consumed += arc.weight;  // Dereferencing the pointer
-                        }
-                    }
+        bool can_fire(const Transition& transition) {
+            int32_t id = get_transition_id(transition.name);
+            return id < 0 || can_fire(static_cast<uint32_t>(id));
+        }
+
+        // Fire a transition, updating the token vector
+        void fire_transition(uint32_t transition, int* consumed, int* produced) {
+            for (const auto& [place, weight] : presets[transition]) {
+                if (tokens[place] - weight < 0) {
+                    throw std::runtime_error("Cannot remove " + std::to_string(weight) +
+                                             " tokens from place '" + place_names[place] + "' (tokens = " +
+                                             std::to_string(tokens[place]) + ")");
                 }
-                if (arc.source == transition.name) {
-                    Place* place = get_place(arc.target);
-                    if (place) {
-                        place->add_tokens(arc.weight);
-                        if (produced) {
-                            *produced += arc.weight;  // Dereferencing the pointer
-                        }
-                    }
+                tokens.add(place, -weight);
+                if (consumed) {
+                    *consumed += weight;
+                }
+            }
+            for (const auto& [place, weight] : postsets[transition]) {
+                tokens.add(place, weight);
+                if (produced) {
+                    *produced += weight;
                 }
             }
         }
+    
+        void fire_transition(const Transition& transition, int* consumed, int* produced) {
+            int32_t id = get_transition_id(transition.name);
+            if (id >= 0) {
+                fire_transition(static_cast<uint32_t>(id), consumed, produced);
+            }
+        }
+
+        void add_tokens(uint32_t place, int count = 1) {
+            tokens.add(place, count);
+        }
 
         std::string repr() const {
             return "PetriNet(places=" + std::to_string(places.size()) +
@@ -139,12 +241,10 @@ class PetriNet {
 
         std::vector<Place> get_postset(const Transition& transition) {
             std::vector<Place> postset;
-            for (const auto& arc : arcs) {
-                if (arc.source == transition.name) {
-                    Place* place = get_place(arc.target);
-                    if (place) {
-                        postset.push_back(*place);
-                    }
+            int32_t id = get_transition_id(transition.name);
+            if (id >= 0) {
+                for (const auto& [place, _] : postsets[id]) {
+                    postset.push_back(Place(place_names[place], tokens[place]));
                 }
             }
             return postset;
@@ -152,23 +252,18 @@ class PetriNet {
 
         std::vector<Place> get_preset(const Transition& transition) {
             std::vector<Place> preset;
-            for (const auto& arc : arcs) {
-                if (arc.target == transition.name) {
-                    Place* place = get_place(arc.source);
-                    if (place) {
-                        preset.push_back(*place);
-                    }
+            int32_t id = get_transition_id(transition.name);
+            if (id >= 0) {
+                for (const auto& [place, _] : presets[id]) {
+                    preset.push_back(Place(place_names[place], tokens[place]));
                 }
             }
-            return std::move(preset);
+            return preset;
         }
         
-        uint32_t number_of_tokens() const {
-            uint32_t tokens = 0;
-            for (const auto& place : places) {
-                tokens += place.tokens;
-            }
-            return tokens;
+        uint32_t number_of_tokens() {
+            freeze();
+            return tokens.number_of_tokens();
         }
     
         std::vector<Transition> get_all_silent_transitions() {
@@ -186,32 +281,32 @@ class PetriNet {
         }
 
         Marking get_current_marking() {
-            // Loop through all places and add them to the marking
+            freeze();
+            return marking_from_tokens(tokens);
+        }
+
+        Marking marking_from_tokens(const DenseMarking& token_vector) const {
             Marking marking;
-            for (const auto& place : places) {
-                if (place.tokens > 0) {
-                    marking.add_place(place.name, place.tokens);
+            for (size_t place = 0; place < token_vector.size(); ++place) {
+                if (token_vector[place] > 0) {
+                    marking.add_place(place_names[place], token_vector[place]);
                 }
             }
-            return std::move(marking);
+            return marking;
         }
 
         std::vector<std::string> fire_transition_sequence(const std::vector<std::string>& transition_names, int* consumed, int* produced) {
             std::vector<std::string> fired_transitions;
             for (const auto& transition_name : transition_names) {
-                Transition* transition = get_transition(transition_name);
-                if (transition) {
-                    if (can_fire(*transition)) {
-                        fire_transition(*transition, consumed, produced);
-                        fired_transitions.push_back(transition_name);
-                    }
-                    else {
-                        throw std::runtime_error("Transition cannot fire: " + transition_name);
-                    }
-                }
-                else {
+                int32_t transition = get_transition_id(transition_name);
+                if (transition < 0) {
                     throw std::runtime_error("Transition not found: " + transition_name);
                 }
+                if (!can_fire(static_cast<uint32_t>(transition))) {
+                    throw std::runtime_error("Transition cannot fire: " + transition_name);
+                }
+                fire_transition(static_cast<uint32_t>(transition), consumed, produced);
+                fired_transitions.push_back(transition_name);
             }
             return fired_transitions;
         }
@@ -220,169 +315,162 @@ class PetriNet {
         std::vector<std::string> partially_fire_transition_sequence(const std::vector<std::string>& transition_names, int* consumed, int* produced) {
             std::vector<std::string> fired_transitions;
             for (const auto& transition_name : transition_names) {
-                Transition* transition = get_transition(transition_name);
-                if (transition) {
-                    if (can_fire(*transition)) {
-                        fire_transition(*transition, consumed, produced);
-                        fired_transitions.push_back(transition_name);
-                    }
-                    else {
-                        return fired_transitions;
-                    }
-                }
-                else {
+                int32_t transition = get_transition_id(transition_name);
+                if (transition < 0 || !can_fire(static_cast<uint32_t>(transition))) {
                     return fired_transitions;
                 }
+                fire_transition(static_cast<uint32_t>(transition), consumed, produced);
+                fired_transitions.push_back(transition_name);
             }
             return fired_transitions;
         }
 
         bool can_fire_transition_sequence(const std::vector<std::string>& transition_names) {
-
-            // Make a copy of self 
-            PetriNet net_copy = *this;
-
-            // Try to fire each transition in the sequence
-            for (const auto& transition_name : transition_names) {
-                Transition* transition = net_copy.get_transition(transition_name);
-                if (transition) {
-                    if (net_copy.can_fire(*transition)) {
-                        net_copy.fire_transition(*transition, nullptr, nullptr);
-                    }
-                    else {
-                        return false;
-                    }
-                }
-                else {
-                    return false;
-                }
-            }
-            
-            return true;
+            freeze();
+            DenseMarking saved_tokens = tokens;
+            bool fireable = partially_fire_transition_sequence(transition_names, nullptr, nullptr).size() == transition_names.size();
+            tokens = std::move(saved_tokens);
+            return fireable;
         }
 
         void set_marking(const Marking& marking) {
-            for (auto& place : places) {
-                place.tokens = marking.get_tokens(place.name);
+            freeze();
+            tokens.clear();
+            for (const auto& [place, count] : marking.places) {
+                auto it = place_ids.find(place);
+                if (it != place_ids.end()) {
+                    tokens.set(it->second, count);
+                }
             }
         }
     
         Marking get_marking_enabling_transition(const Transition& transition) {
             Marking marking;
-            std::vector<Place> preset = get_preset(transition);
-            for (const auto& place : preset) {
-                marking.add_place(place.name, 1);
+            int32_t id = get_transition_id(transition.name);
+            if (id >= 0) {
+                for (const auto& [place, _] : presets[id]) {
+                    marking.add_place(place_names[place], 1);
+                }
             }
             return marking;
         }
+
+        // Return the ids of the transitions enabled by the token vector
+        std::vector<uint32_t> get_enabled_transition_ids(const DenseMarking& token_vector, bool include_silent) const {
+            std::vector<uint32_t> enabled_transitions;
+            for (uint32_t transition = 0; transition < transition_names.size(); ++transition) {
+                if (silent[transition] && !include_silent) {
+                    continue;  // Skip silent transitions
+                }
+                bool enabled = true;
+                for (const auto& [place, weight] : presets[transition]) {
+                    if (token_vector[place] < weight) {
+                        enabled = false;
+                        break;
+                    }
+                }
+                if (enabled) {
+                    enabled_transitions.push_back(transition);
+                }
+            }
+            return enabled_transitions;
+        }
     
         std::vector<std::string> get_enabled_transitions(bool include_silent = false) {
             // Return the names of all enabled transitions (excluding silent transitions)
+            freeze();
             std::vector<std::string> enabled_transitions;
-            for (const auto& transition : transitions) {
-                if (transition.is_silent() && !include_silent) {
-                    continue;  // Skip silent transitions
-                }
-                if (can_fire(transition)) {
-                    enabled_transitions.push_back(transition.name);
-                }
+            for (uint32_t transition : get_enabled_transition_ids(tokens, include_silent)) {
+                enabled_transitions.push_back(transition_names[transition]);
             }
             return enabled_transitions;
         }
         
         Marking fire_transition_without_changing_marking(const Transition& transition, const Marking& marking) {
-            // save the current marking
-            Marking old_marking = get_current_marking();
-            // set the marking to the new one
+            freeze();
+            DenseMarking saved_tokens = tokens;
             set_marking(marking);
-            // fire the transition
             fire_transition(transition, nullptr, nullptr);
-            // get the new marking
             Marking new_marking = get_current_marking();
-            // set the marking back to the original one
-            set_marking(old_marking);
+            tokens = std::move(saved_tokens);
             return new_marking;
         }
 
         bool can_fire_transition_from_marking(Marking marking, const Transition& transition) {
-            // copy the current marking
-            Marking marking_copy = get_current_marking();
-
-            // set the marking to the new one
+            freeze();
+            DenseMarking saved_tokens = tokens;
             set_marking(marking);
             bool is_transition_fireable = can_fire(transition);
-            // set the marking back to the original one
-            set_marking(marking_copy);
+            tokens = std::move(saved_tokens);
             return is_transition_fireable;
         }
 
         std::vector<std::string> get_enabled_transitions_in_marking(const Marking& marking, bool include_silent = false) {
-            // old marking 
-            Marking old_marking = get_current_marking();
-            // set the marking to the new one
+            freeze();
+            DenseMarking saved_tokens = tokens;
             set_marking(marking);
-            // get the enabled transitions
             auto enabled_transitions = get_enabled_transitions(include_silent);
-            // set the marking back to the original one
-            set_marking(old_marking);
-            // return the enabled transitions
+            tokens = std::move(saved_tokens);
             return enabled_transitions;
         }
 
         std::set<std::string> get_visible_transitions_eventually_enabled() {
+            freeze();
             std::set<std::string> visible_transitions;
-            std::set<std::string> visited;
 
             size_t max_iterations = 100;
             
-            // Start with the initially enabled transitions
-            std::vector<std::string> all_enabled_transitions = get_enabled_transitions(true);
-            std::unordered_map<std::string, Marking> transition_markings;
+            // Start with the initially enabled transitions, every transition is explored once
+            // from the token vector in which it was first found enabled
+            std::vector<uint32_t> all_enabled_transitions = get_enabled_transition_ids(tokens, true);
+            std::vector<int32_t> marking_of_transition(transition_names.size(), -1);
+            std::vector<DenseMarking> markings = {tokens};
             
-            for (const auto& t : all_enabled_transitions) {
-                transition_markings[t] = get_current_marking();
+            for (uint32_t t : all_enabled_transitions) {
+                marking_of_transition[t] = 0;
             }
         
-            size_t i = 0;
-            while (i < all_enabled_transitions.size()) {
-
-                if (i >= max_iterations) {
-                    break;
+            for (size_t i = 0; i < all_enabled_transitions.size() && i < max_iterations; ++i) {
+                uint32_t t = all_enabled_transitions[i];
+        
+                if (!silent[t]) {
+                    visible_transitions.insert(transition_names[t]);
+                    continue;
                 }
 
-                std::string t = all_enabled_transitions[i];
-                Marking marking_copy = transition_markings[t];
-        
-                // Check if we've already visited this transition-marking combination
-                std::string key = t + marking_copy.to_string();
-                if (visited.find(key) == visited.end()) {
-                    Transition* transition = get_transition(t);
-                    if (!transition) {
-                        ++i;
-                        continue;
+                DenseMarking new_tokens = markings[marking_of_transition[t]];
+                bool enabled = true;
+                for (const auto& [place, weight] : presets[t]) {
+                    if (new_tokens[place] < weight) {
+                        enabled = false;
+                        break;
                     }
-        
-                    if (!transition->is_silent()) {
-                        visible_transitions.insert(t);
-                    } else {
-                        if (can_fire_transition_from_marking(marking_copy, *transition)) {
-                            // Fire the transition without changing the marking
-                            Marking new_marking = fire_transition_without_changing_marking(*transition, marking_copy);
-                            std::vector<std::string> new_enabled_transitions = get_enabled_transitions_in_marking(new_marking, true);
-                            
-                            for (const auto& t2 : new_enabled_transitions) {
-                                if (transition_markings.find(t2) == transition_markings.end()) {
-                                    all_enabled_transitions.push_back(t2);
-                                    transition_markings[t2] = new_marking;
-                                }
-                            }
+                }
+                if (!enabled) {
+                    continue;
+                }
+
+                // Fire the transition on the copy of the tokens
+                for (const auto& [place, weight] : presets[t]) {
+                    new_tokens.add(place, -weight);
+                }
+                for (const auto& [place, weight] : postsets[t]) {
+                    new_tokens.add(place, weight);
+                }
+
+                int32_t new_marking = -1;
+                for (uint32_t t2 : get_enabled_transition_ids(new_tokens, true)) {
+                    if (marking_of_transition[t2] == -1) {
+                        if (new_marking == -1) {
+                            new_marking = markings.size();
+                            markings.push_back(new_tokens);
                         }
+                        all_enabled_transitions.push_back(t2);
+                        marking_of_transition[t2] = new_marking;
                     }
-                    visited.insert(key);
                 }
-                ++i;
             }
-            return std::move(visible_transitions);
+            return visible_transitions;
         }
         
     };
\ No newline at end of file
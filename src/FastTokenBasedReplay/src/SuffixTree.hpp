@@ -3,7 +3,7 @@
 #include <string>
 
 struct MarkingPostfixKey {
-    Marking marking;
+    DenseMarking marking;
     std::string postfix; // e.g. concatenated activities of the remaining trace
 
     bool operator==(const MarkingPostfixKey& other) const {
@@ -14,10 +14,8 @@ struct MarkingPostfixKey {
 // A hasher for the key
 struct MarkingPostfixKeyHasher {
     size_t operator()(const MarkingPostfixKey& key) const {
-        MarkingHasher mh;
-        size_t h1 = mh(key.marking);
+        size_t h1 = key.marking.hash;
         size_t h2 = std::hash<std::string>()(key.postfix);
-        return h1 ^ (h2 << 1);
+        return mix_hash(h1 ^ (h2 << 1));
     }
 };
-
@@ -4,6 +4,7 @@
 #include "Eventlog.hpp"  // Include your EventLog classes
 #include "token_based_replay.cpp"  // Include your token_based_replay function
 #include "precision.cpp"  // Include your precision function
+#include "evaluate.cpp"  // Include the combined fitness and precision replay
 namespace py = pybind11;
 
 PYBIND11_MODULE(FastTokenBasedReplay, m) {
@@ -42,6 +43,9 @@ PYBIND11_MODULE(FastTokenBasedReplay, m) {
     py::class_<EventLog>(m, "EventLog")
         .def(py::init<>())
         .def("add_trace", &EventLog::add_trace)
+        .def("set_activities", &EventLog::set_activities)
+        .def("add_variant", &EventLog::add_variant, py::arg("variant"), py::arg("frequency") = 1)
+        .def("precompute_prefixes", [](EventLog& log) { precompute_prefixes(log); })
         .def("__repr__", &EventLog::repr);
     
     py::class_<Marking>(m, "Marking")
@@ -50,6 +54,10 @@ PYBIND11_MODULE(FastTokenBasedReplay, m) {
         .def("add_place", &Marking::add_place)
         .def("number_of_tokens", &Marking::number_of_tokens);
 
-    m.def("calculate_fitness", &calculate_fitness);
-    m.def("calculate_precision", &calculate_precision);
+    // The replay does not touch Python objects, so the GIL is released while it runs
+    m.def("calculate_fitness", &calculate_fitness, py::call_guard<py::gil_scoped_release>());
+    m.def("calculate_precision", &calculate_precision, py::call_guard<py::gil_scoped_release>());
+    m.def("evaluate", &evaluate, py::arg("log"), py::arg("net"), py::arg("metrics"), py::call_guard<py::gil_scoped_release>());
+    m.def("evaluate_bounded", &evaluate_bounded, py::arg("log"), py::arg("net"), py::arg("weights"), py::arg("threshold"), py::call_guard<py::gil_scoped_release>());
+    m.def("calculate_batch", &calculate_batch, py::arg("log"), py::arg("nets"), py::arg("metrics"), py::arg("n_threads") = 0, py::call_guard<py::gil_scoped_release>());
 }
@@ -0,0 +1,442 @@
+#pragma once
+#include "PetriNet.hpp"
+#include "Eventlog.hpp"
+#include "unordered_map"
+#include "set"
+#include "string"
+#include "vector"
+#include "silent_transition_handling.cpp"
+#include "ActivityCache.hpp"
+#include "token_based_replay.cpp"
+#include "precision.cpp"
+#include <atomic>
+#include <exception>
+#include <thread>
+#include <algorithm>
+#include <memory>
+
+
+// Token counts of the fitness and escaping edges of the precision of a single trace
+struct ReplayCounts {
+    int32_t missing = 0;
+    int32_t remaining = 0;
+    int32_t produced = 0;
+    int32_t consumed = 0;
+    int32_t escaped_edges = 0;
+    int32_t allowed_tasks = 0;
+};
+
+
+ReplayCounts replay_trace_fitness_and_precision(
+    const Trace& trace,
+    PetriNet& net,
+    const SilentFiringSequences& silent_firing_sequences,
+    ActivityCache& activity_cache,
+    const PrefixMap& prefixes,
+    std::unordered_map<DenseMarking, std::set<std::string>, DenseMarkingHasher>& visible_transitions_eventually_enabled_cache,
+    bool with_fitness,
+    bool with_precision
+    ){
+    ReplayCounts counts;
+    // The precision only considers the events until the first one that cannot be replayed
+    bool precision_active = with_precision;
+    std::string current_prefix;
+    const std::set<std::string> no_next_activities;
+
+    counts.produced += net.initial_marking.number_of_tokens();
+
+    // Initialize the tokens in the Petri net
+    initialize_tokens(net);
+
+    // Iterate over the events in the trace
+    for (const auto& event : trace.events) {
+
+        // Find the transition corresponding to the event
+        int32_t transition_id = net.get_transition_id(event.activity);
+        if (transition_id < 0) {
+            throw std::runtime_error("Transition not found: " + event.activity);
+        }
+        uint32_t transition = static_cast<uint32_t>(transition_id);
+
+        if (precision_active) {
+            // The allowed tasks are the visible transitions eventually enabled in the current marking
+            auto it = visible_transitions_eventually_enabled_cache.find(net.tokens);
+            if (it == visible_transitions_eventually_enabled_cache.end()) {
+                it = visible_transitions_eventually_enabled_cache.emplace(net.tokens, net.get_visible_transitions_eventually_enabled()).first;
+            }
+            const std::set<std::string>& allowed_tasks_set = it->second;
+            counts.allowed_tasks += allowed_tasks_set.size();
+
+            // The escaped edges are the allowed tasks that never follow the prefix in the log
+            auto next = prefixes.find(current_prefix);
+            const std::set<std::string>& next_activity_after_prefix = next != prefixes.end() ? next->second : no_next_activities;
+            std::vector<std::string> difference_result;
+            std::set_difference(
+                allowed_tasks_set.begin(), allowed_tasks_set.end(),
+                next_activity_after_prefix.begin(), next_activity_after_prefix.end(),
+                std::back_inserter(difference_result)
+            );
+            counts.escaped_edges += difference_result.size();
+        }
+
+        if (!net.can_fire(transition)) {
+            // if the net cannot fire try to enable the transition by firing silent transitions
+            DenseMarking current_marking = net.tokens;
+            std::vector<std::string>* cached_sequence = activity_cache.retrieve(current_marking, transition);
+
+            if (cached_sequence) {
+                net.fire_transition_sequence(*cached_sequence, &counts.consumed, &counts.produced);
+            } else {
+                auto [reachable, sequence] = attempt_to_make_transition_enabled_by_firing_silent_transitions(net, transition, silent_firing_sequences);
+                if (reachable) {
+                    net.fire_transition_sequence(sequence, &counts.consumed, &counts.produced);
+                    activity_cache.store(current_marking, transition, sequence);
+                }
+            }
+        }
+
+        if (!net.can_fire(transition)) {
+            // For the precision we stop if the trace cannot be replayed
+            precision_active = false;
+            if (!with_fitness) {
+                break;
+            }
+
+            // if it still cant be fired, add tokens to the input places
+            for (const auto& [place, _] : net.presets[transition]) {
+                if (net.tokens[place] == 0) {
+                    net.add_tokens(place, 1);
+                    counts.missing += 1;
+                }
+            }
+        }
+
+        if (net.can_fire(transition)) {
+            net.fire_transition(transition, &counts.consumed, &counts.produced);
+            if (precision_active) {
+                current_prefix += event.activity + ",";
+            }
+        } else {
+            throw std::runtime_error("Transition cannot be fired: " + event.activity);
+        }
+    }
+
+    if (with_fitness) {
+        counts.consumed += net.final_marking.number_of_tokens();
+
+        // Finalize the tokens in the Petri net
+        finalize_tokens(net, silent_firing_sequences, counts.missing, counts.consumed, counts.produced);
+
+        // Count the remaining tokens in the Petri net
+        counts.remaining += net.number_of_tokens() - net.final_marking.number_of_tokens();
+    }
+
+    return counts;
+}
+
+
+// Returns whether the metrics need the fitness and the precision
+std::tuple<bool, bool> required_replays(const std::vector<std::string>& metrics) {
+    bool with_fitness = false;
+    bool with_precision = false;
+    for (const auto& metric : metrics) {
+        if (metric == "fitness") {
+            with_fitness = true;
+        } else if (metric == "precision") {
+            with_precision = true;
+        } else if (metric == "f1_score") {
+            with_fitness = true;
+            with_precision = true;
+        } else {
+            throw std::invalid_argument("Unknown metric: " + metric);
+        }
+    }
+    return std::make_tuple(with_fitness, with_precision);
+}
+
+
+// Sums of the token counts and escaping edges of the replayed traces, weighted by their frequency
+struct ReplayTotals {
+    int32_t missing = 0;
+    int32_t remaining = 0;
+    int32_t produced = 0;
+    int32_t consumed = 0;
+    int32_t escaping_edges = 0;
+    int32_t allowed_tasks = 0;
+
+    void add(const ReplayCounts& counts, int32_t frequency) {
+        missing += frequency * counts.missing;
+        remaining += frequency * counts.remaining;
+        produced += frequency * counts.produced;
+        consumed += frequency * counts.consumed;
+        escaping_edges += frequency * counts.escaped_edges;
+        allowed_tasks += frequency * counts.allowed_tasks;
+    }
+
+    double fitness() const {
+        return 0.5 * (1 - (static_cast<double>(missing) / consumed)) + 0.5 * (1 - (static_cast<double>(remaining) / produced));
+    }
+
+    // A replay without allowed tasks gets a precision of 0
+    double precision() const {
+        if (allowed_tasks == 0) {
+            return 0.0;
+        }
+        return 1.0 - static_cast<double>(escaping_edges) / static_cast<double>(allowed_tasks);
+    }
+};
+
+
+double f1_score(double fitness, double precision) {
+    return (precision + fitness) == 0.0 ? 0.0 : 2 * (precision * fitness) / (precision + fitness);
+}
+
+
+// The value of one of the metrics accepted by required_replays
+double metric_score(const std::string& metric, double fitness, double precision) {
+    if (metric == "fitness") {
+        return fitness;
+    }
+    if (metric == "precision") {
+        return precision;
+    }
+    return f1_score(fitness, precision);
+}
+
+
+// The state of a replay of a log on a net that is shared between its traces
+struct ReplayContext {
+    PetriNet net;
+    std::shared_ptr<const SilentFiringSequences> silent_firing_sequences;
+    ActivityCache activity_cache;
+    std::unordered_map<DenseMarking, std::set<std::string>, DenseMarkingHasher> visible_transitions_eventually_enabled_cache;
+
+    explicit ReplayContext(const PetriNet& original_net) : net(original_net) {
+        // The firing sequences for every place to every other place using silent transitions
+        silent_firing_sequences = get_silent_firing_sequences(original_net, net);
+    }
+
+    ReplayCounts replay(const Trace& trace, const PrefixMap& prefixes, bool with_fitness, bool with_precision) {
+        return replay_trace_fitness_and_precision(trace, net, *silent_firing_sequences, activity_cache, prefixes, visible_transitions_eventually_enabled_cache, with_fitness, with_precision);
+    }
+};
+
+
+// Computes the metrics with the prefixes of the log computed beforehand (only needed for the precision)
+std::unordered_map<std::string, double> evaluate_with_prefixes(
+    const EventLog& log,
+    const PetriNet& net,
+    const std::vector<std::string>& metrics,
+    const PrefixMap& prefixes
+    ){
+    auto [with_fitness, with_precision] = required_replays(metrics);
+    std::unordered_map<std::string, double> results;
+    if (!with_fitness && !with_precision) {
+        return results;
+    }
+
+    // Caches shared by the fitness and the precision
+    ReplayContext context(net);
+
+    // Map to store computed values for unique traces
+    std::unordered_map<Trace, ReplayCounts> trace_cache;
+
+    // A log built from variants contains every trace once, so it does not have to be deduplicated
+    bool unique_traces = log.is_variant_log();
+
+    ReplayTotals totals;
+
+    // Iterate over the traces in the event log
+    for (size_t i = 0; i < log.traces.size(); ++i) {
+        const Trace& trace = log.traces[i];
+        ReplayCounts counts;
+
+        auto cached = unique_traces ? trace_cache.end() : trace_cache.find(trace);
+        if (cached != trace_cache.end()) {
+            counts = cached->second;
+        } else {
+            counts = context.replay(trace, prefixes, with_fitness, with_precision);
+            if (!unique_traces) {
+                trace_cache[trace] = counts;
+            }
+        }
+
+        totals.add(counts, static_cast<int32_t>(log.get_frequency(i)));
+    }
+
+    double fitness = with_fitness ? totals.fitness() : 0.0;
+    double precision = with_precision ? totals.precision() : 0.0;
+
+    for (const auto& metric : metrics) {
+        results[metric] = metric_score(metric, fitness, precision);
+    }
+    return results;
+}
+
+
+// Replays the traces by descending frequency and stops as soon as the weighted sum of the metrics cannot reach
+// the threshold anymore. The metrics must be in [0, 1] and the weights not negative.
+// The check uses an optimistic estimate of the metrics: the traces not replayed yet are assumed to fit perfectly
+// (no missing and remaining tokens, no escaping edges) and to use as many tokens and allowed tasks per event
+// as the traces replayed so far. Token counts of a trace have no useful upper bound, so a strict bound would never stop.
+// Returns whether the replay was stopped and the metrics, which are the estimates if it was stopped.
+std::tuple<bool, std::unordered_map<std::string, double>> evaluate_bounded(
+    const EventLog& log,
+    const PetriNet& net,
+    const std::unordered_map<std::string, double>& weights,
+    double threshold
+    ){
+    std::vector<std::string> metrics;
+    for (const auto& [metric, weight] : weights) {
+        if (weight < 0.0) {
+            throw std::invalid_argument("The weight of " + metric + " must not be negative");
+        }
+        metrics.push_back(metric);
+    }
+    auto [with_fitness, with_precision] = required_replays(metrics);
+    std::unordered_map<std::string, double> results;
+    if (!with_fitness && !with_precision) {
+        return std::make_tuple(false, results);
+    }
+    std::shared_ptr<const PrefixMap> prefixes = with_precision ? get_prefixes(log) : std::make_shared<const PrefixMap>();
+
+    // Most frequent traces first, they settle the metrics the most
+    std::vector<size_t> order(log.traces.size());
+    for (size_t i = 0; i < order.size(); ++i) {
+        order[i] = i;
+    }
+    std::stable_sort(order.begin(), order.end(), [&log](size_t a, size_t b) { return log.get_frequency(a) > log.get_frequency(b); });
+
+    int64_t remaining_events = 0;
+    for (size_t i = 0; i < log.traces.size(); ++i) {
+        remaining_events += static_cast<int64_t>(log.get_frequency(i)) * log.traces[i].events.size();
+    }
+
+    ReplayContext context(net);
+    std::unordered_map<Trace, ReplayCounts> trace_cache;
+    bool unique_traces = log.is_variant_log();
+    ReplayTotals totals;
+    int64_t replayed_events = 0;
+
+    auto weighted_sum = [&weights](double fitness, double precision) {
+        double sum = 0.0;
+        for (const auto& [metric, weight] : weights) {
+            sum += weight * metric_score(metric, fitness, precision);
+        }
+        return sum;
+    };
+
+    for (size_t position = 0; position < order.size(); ++position) {
+        size_t i = order[position];
+        const Trace& trace = log.traces[i];
+        ReplayCounts counts;
+
+        auto cached = unique_traces ? trace_cache.end() : trace_cache.find(trace);
+        if (cached != trace_cache.end()) {
+            counts = cached->second;
+        } else {
+            counts = context.replay(trace, *prefixes, with_fitness, with_precision);
+            if (!unique_traces) {
+                trace_cache[trace] = counts;
+            }
+        }
+
+        int64_t events = static_cast<int64_t>(log.get_frequency(i)) * trace.events.size();
+        totals.add(counts, static_cast<int32_t>(log.get_frequency(i)));
+        replayed_events += events;
+        remaining_events -= events;
+        if (remaining_events == 0 || replayed_events == 0) {
+            continue;
+        }
+
+        // Optimistic estimate of the metrics after replaying the remaining traces
+        double scale = static_cast<double>(remaining_events) / static_cast<double>(replayed_events);
+        double fitness = 1.0;
+        double precision = 1.0;
+        if (with_fitness) {
+            double consumed = totals.consumed * (1.0 + scale);
+            double produced = totals.produced * (1.0 + scale);
+            fitness = 0.5 * (1 - (consumed > 0.0 ? totals.missing / consumed : 0.0)) + 0.5 * (1 - (produced > 0.0 ? totals.remaining / produced : 0.0));
+        }
+        if (with_precision) {
+            double allowed_tasks = totals.allowed_tasks * (1.0 + scale);
+            precision = 1.0 - (allowed_tasks > 0.0 ? totals.escaping_edges / allowed_tasks : 0.0);
+        }
+        if (weighted_sum(fitness, precision) < threshold) {
+            for (const auto& metric : metrics) {
+                results[metric] = metric_score(metric, fitness, precision);
+            }
+            return std::make_tuple(true, results);
+        }
+    }
+
+    double fitness = with_fitness ? totals.fitness() : 0.0;
+    double precision = with_precision ? totals.precision() : 0.0;
+    for (const auto& metric : metrics) {
+        results[metric] = metric_score(metric, fitness, precision);
+    }
+    return std::make_tuple(false, results);
+}
+
+
+// Computes the requested metrics ("fitness", "precision" and "f1_score") in a single replay of the log,
+// sharing the silent firing sequences, the activity cache and the replay of every trace between the metrics
+std::unordered_map<std::string, double> evaluate(const EventLog& log, const PetriNet& net, const std::vector<std::string>& metrics){
+    auto [with_fitness, with_precision] = required_replays(metrics);
+    if (!with_precision) {
+        return evaluate_with_prefixes(log, net, metrics, PrefixMap());
+    }
+    return evaluate_with_prefixes(log, net, metrics, *get_prefixes(log));
+}
+
+
+// Evaluates the metrics for every net on a pool of n_threads threads (0 uses one thread per hardware thread).
+// The results are in the order of the nets.
+std::vector<std::unordered_map<std::string, double>> calculate_batch(const EventLog& log, const std::vector<PetriNet>& nets, const std::vector<std::string>& metrics, size_t n_threads){
+    std::vector<std::unordered_map<std::string, double>> results(nets.size());
+    if (nets.empty()) {
+        return results;
+    }
+
+    if (n_threads == 0) {
+        n_threads = std::max(1u, std::thread::hardware_concurrency());
+    }
+    n_threads = std::min(n_threads, nets.size());
+
+    // The prefixes of the log are the same for all nets
+    std::shared_ptr<const PrefixMap> prefixes = std::make_shared<const PrefixMap>();
+    if (std::get<1>(required_replays(metrics))) {
+        prefixes = get_prefixes(log);
+    }
+
+    // The threads take the next net to evaluate until all nets are evaluated
+    std::atomic<size_t> next_net(0);
+    std::vector<std::exception_ptr> errors(n_threads);
+    auto worker = [&](size_t thread_index) {
+        try {
+            for (size_t i = next_net++; i < nets.size(); i = next_net++) {
+                results[i] = evaluate_with_prefixes(log, nets[i], metrics, *prefixes);
+            }
+        } catch (...) {
+            errors[thread_index] = std::current_exception();
+            // Let the other threads stop early
+            next_net = nets.size();
+        }
+    };
+
+    std::vector<std::thread> threads;
+    for (size_t t = 1; t < n_threads; ++t) {
+        threads.emplace_back(worker, t);
+    }
+    worker(0);
+    for (auto& thread : threads) {
+        thread.join();
+    }
+
+    for (const auto& error : errors) {
+        if (error) {
+            std::rethrow_exception(error);
+        }
+    }
+    return results;
+}
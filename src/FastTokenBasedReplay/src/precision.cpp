@@ -12,7 +12,7 @@
 #include "chrono"
 
 
-std::unordered_map<std::string, std::set<std::string>> compute_prefixes(const EventLog& log) {
+PrefixMap compute_prefixes(const EventLog& log) {
     std::unordered_map<std::string, std::set<std::string>> prefixes;
 
     for (const auto& trace : log.traces) {
@@ -34,17 +34,34 @@ std::unordered_map<std::string, std::set<std::string>> compute_prefixes(const Ev
 }
 
 
+// Computes the prefixes once and keeps them with the log, so every later replay reuses them.
+// Adding traces or variants to the log discards them again.
+void precompute_prefixes(EventLog& log) {
+    log.prefixes = std::make_shared<const PrefixMap>(compute_prefixes(log));
+}
+
+
+// Returns the precomputed prefixes of the log, or computes them if the log has none
+std::shared_ptr<const PrefixMap> get_prefixes(const EventLog& log) {
+    if (log.prefixes) {
+        return log.prefixes;
+    }
+    return std::make_shared<const PrefixMap>(compute_prefixes(log));
+}
+
+
 std::tuple<int32_t, int32_t> replay_trace_precision(
     const Trace& trace, 
     PetriNet& net, 
-    std::unordered_map<std::string, std::unordered_map<std::string,std::vector<std::string>>>& silent_firing_sequences,
+    const SilentFiringSequences& silent_firing_sequences,
     ActivityCache& activity_cache,
-    std::unordered_map<std::string, std::set<std::string>>& prefixes,
-    std::unordered_map<Marking, std::set<std::string>, MarkingHasher>& visible_transitions_eventually_enabled_cache
+    const PrefixMap& prefixes,
+    std::unordered_map<DenseMarking, std::set<std::string>, DenseMarkingHasher>& visible_transitions_eventually_enabled_cache
     ){
     int32_t escaped_edges = 0;
     int32_t allowed_tasks = 0;
     std::string current_prefix;
+    const std::set<std::string> no_next_activities;
 
     // Initialize the tokens in the Petri net
     initialize_tokens(net);
@@ -53,33 +70,30 @@ std::tuple<int32_t, int32_t> replay_trace_precision(
     for (const auto& event : trace.events) {
         
         // Find the transition corresponding to the event
-        Transition* transition = net.get_transition(event.activity);
-        if (!transition) {
+        int32_t transition_id = net.get_transition_id(event.activity);
+        if (transition_id < 0) {
             throw std::runtime_error("Transition not found: " + event.activity);
         }
+        uint32_t transition = static_cast<uint32_t>(transition_id);
 
         // DO THE BOOKKEEPING
         // Count the number of allowed tasks, which is the number of enabled transitions
         //PetriNet net_copy = net;
         // Get the current marking
-        Marking current_marking = net.get_current_marking();
+        const DenseMarking& current_marking = net.tokens;
         
-        std::set<std::string> allowed_tasks_set;
-
         // Check if the marking is already computed in the cache
         auto it = visible_transitions_eventually_enabled_cache.find(current_marking);
-        if (it != visible_transitions_eventually_enabled_cache.end()) {
-            // If found, use the cached value
-            allowed_tasks_set = it->second;
-        } else {
+        if (it == visible_transitions_eventually_enabled_cache.end()) {
             // If not found, compute the allowed tasks and store in the cache
-            allowed_tasks_set = net.get_visible_transitions_eventually_enabled();
-            visible_transitions_eventually_enabled_cache[current_marking] = allowed_tasks_set;
+            it = visible_transitions_eventually_enabled_cache.emplace(current_marking, net.get_visible_transitions_eventually_enabled()).first;
         }
+        const std::set<std::string>& allowed_tasks_set = it->second;
 
         allowed_tasks += allowed_tasks_set.size();
 
-        std::set next_activity_after_prefix = prefixes[current_prefix];
+        auto next = prefixes.find(current_prefix);
+        const std::set<std::string>& next_activity_after_prefix = next != prefixes.end() ? next->second : no_next_activities;
 
         // // Store result
         std::vector<std::string> difference_result;
@@ -93,9 +107,9 @@ std::tuple<int32_t, int32_t> replay_trace_precision(
         escaped_edges += difference_result.size();
 
         // if the transition is not enabled, we need to fire silent transitions to make it enabled
-        if (!net.can_fire(*transition)) {
-            Marking current_marking = net.get_current_marking();
-            std::vector<std::string>* cached_sequence = activity_cache.retrieve(current_marking, transition->name);
+        if (!net.can_fire(transition)) {
+            DenseMarking current_marking = net.tokens;
+            std::vector<std::string>* cached_sequence = activity_cache.retrieve(current_marking, transition);
             
             if (cached_sequence) {
                 net.fire_transition_sequence(*cached_sequence, nullptr, nullptr);
@@ -103,15 +117,15 @@ std::tuple<int32_t, int32_t> replay_trace_precision(
                 auto [reachable, sequence] = attempt_to_make_transition_enabled_by_firing_silent_transitions(net, transition, silent_firing_sequences);     
                 if (reachable) {
                     net.fire_transition_sequence(sequence, nullptr, nullptr);
-                    activity_cache.store(current_marking, transition->name, sequence);                    
+                    activity_cache.store(current_marking, transition, sequence);                    
                 } 
             }
         }
 
         // Now we can fire the transition (if it is enabled)
-        if (net.can_fire(*transition)) {
+        if (net.can_fire(transition)) {
             // count the number of escaped edges, which is the current prefix in the map differenced from the allowed tasks
-            net.fire_transition(*transition, nullptr, nullptr);
+            net.fire_transition(transition, nullptr, nullptr);
 
             // update the current prefix
             current_prefix += event.activity + ",";
@@ -129,7 +143,7 @@ std::tuple<int32_t, int32_t> replay_trace_precision(
 
 double calculate_precision(const EventLog& log, const PetriNet& net){
 
-    auto prefixes = compute_prefixes(log);
+    auto prefixes = get_prefixes(log);
 
     double precision = 0.0;
     int32_t total_escaping_edges = 0;
@@ -139,28 +153,41 @@ double calculate_precision(const EventLog& log, const PetriNet& net){
     std::unordered_map<Trace, std::tuple<int32_t, int32_t>> trace_cache;
 
     // Map to store visible transitions eventually enabled for the net
-    std::unordered_map<Marking, std::set<std::string>, MarkingHasher> visible_transitions_eventually_enabled_cache;
+    std::unordered_map<DenseMarking, std::set<std::string>, DenseMarkingHasher> visible_transitions_eventually_enabled_cache;
 
     PetriNet net_copy = net;
     // A map to store the firing sequences for every place to every other place using silent transitions
-    std::unordered_map<std::string, std::unordered_map<std::string, std::vector<std::string>>> silent_firing_sequences;
-    silent_firing_sequences = get_places_shortest_path_by_hidden(net_copy, 50);
+    // They are searched once per net and reused by every later replay on it
+    auto shared_silent_firing_sequences = get_silent_firing_sequences(net, net_copy);
+    const SilentFiringSequences& silent_firing_sequences = *shared_silent_firing_sequences;
 
     // Activity cache to store the precomputed values
     ActivityCache activity_cache;
     
+    // A log built from variants contains every trace once, so it does not have to be deduplicated
+    bool unique_traces = log.is_variant_log();
+
     // Iterate over the traces in the event log
-    for (const auto& trace : log.traces) {
-        if (trace_cache.find(trace) == trace_cache.end()) {
+    for (size_t i = 0; i < log.traces.size(); ++i) {
+        const Trace& trace = log.traces[i];
+        std::tuple<int32_t, int32_t> replay_result;
+
+        auto cached = unique_traces ? trace_cache.end() : trace_cache.find(trace);
+        if (cached != trace_cache.end()) {
+            replay_result = cached->second;
+        } else {
             // If this trace has not been processed, do token replay
-            // PetriNet net_copy = net;
-            trace_cache[trace] = replay_trace_precision(trace, net_copy, silent_firing_sequences, activity_cache, prefixes, visible_transitions_eventually_enabled_cache);
+            replay_result = replay_trace_precision(trace, net_copy, silent_firing_sequences, activity_cache, *prefixes, visible_transitions_eventually_enabled_cache);
+            if (!unique_traces) {
+                trace_cache[trace] = replay_result;
+            }
         }
 
         // Get the replay result for the trace
-        auto [ee, at] = trace_cache[trace];
-        total_escaping_edges += ee;
-        total_allowed_tasks += at;
+        auto [ee, at] = replay_result;
+        int32_t frequency = static_cast<int32_t>(log.get_frequency(i));
+        total_escaping_edges += frequency * ee;
+        total_allowed_tasks += frequency * at;
     }
 
     if (total_allowed_tasks == 0) {
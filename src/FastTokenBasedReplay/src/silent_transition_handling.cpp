@@ -7,6 +7,9 @@
 #include "Graph.hpp"
 #include <set>
 #include "Marking.hpp"
+#include <algorithm>
+#include <atomic>
+#include <memory>
 
 
 struct CompareVectorLength {
@@ -64,7 +67,7 @@ std::set<std::string> compute_lambda_set(const Marking& current_marking, const M
 
 std::set<std::vector<std::string>, CompareVectorLength> 
 get_possible_firing_sequences(
-    const std::unordered_map<std::string, std::unordered_map<std::string, std::vector<std::string>>>& firing_sequences, 
+    const SilentFiringSequences& firing_sequences, 
     const std::set<std::string>& delta_set, 
     const std::set<std::string>& lambda_set) 
 {
@@ -85,11 +88,15 @@ get_possible_firing_sequences(
 }
 
 std::tuple<bool, std::vector<std::string>> 
-attempt_to_make_transition_enabled_by_firing_silent_transitions(PetriNet& net, Transition* transition, std::unordered_map<std::string, std::unordered_map<std::string, std::vector<std::string>>>& firing_sequences) {    
-    PetriNet net_copy = net;    
+attempt_to_make_transition_enabled_by_firing_silent_transitions(PetriNet& net, uint32_t transition, const SilentFiringSequences& firing_sequences) {    
+    // The sequences are fired on the token vector of the net, which is restored before returning
+    DenseMarking saved_tokens = net.tokens;
     std::vector<std::string> final_firing_sequence;
     Marking current_marking = net.get_current_marking();
-    Marking target_marking = net.get_marking_enabling_transition(*transition);
+    Marking target_marking;
+    for (const auto& [place, _] : net.presets[transition]) {
+        target_marking.add_place(net.place_names[place], 1);
+    }
     std::set<std::string> delta_set = compute_delta_set(current_marking, target_marking);
     std::set<std::string> lambda_set = compute_lambda_set(current_marking, target_marking);
     std::set<std::vector<std::string>, CompareVectorLength> possible_firing_sequences = get_possible_firing_sequences(firing_sequences, delta_set, lambda_set);
@@ -101,7 +108,7 @@ attempt_to_make_transition_enabled_by_firing_silent_transitions(PetriNet& net, T
     while (!delta_set.empty()){
         for (const auto& sequence : possible_firing_sequences) {
             // Partially fire the sequence 
-            std::vector<std::string> fired_transitions = net_copy.partially_fire_transition_sequence(sequence, nullptr, nullptr);
+            std::vector<std::string> fired_transitions = net.partially_fire_transition_sequence(sequence, nullptr, nullptr);
             
             // if no transitions were fired, continue to the next sequence
             if (fired_transitions.empty()) {
@@ -112,12 +119,13 @@ attempt_to_make_transition_enabled_by_firing_silent_transitions(PetriNet& net, T
             final_firing_sequence.insert(final_firing_sequence.end(), fired_transitions.begin(), fired_transitions.end());
 
             // check the T transition is enabled
-            if (net_copy.can_fire(*transition)) {
+            if (net.can_fire(transition)) {
+                net.tokens = std::move(saved_tokens);
                 return std::make_tuple(true, final_firing_sequence);
             }
             
             // update the current marking
-            current_marking = net_copy.get_current_marking();
+            current_marking = net.get_current_marking();
             delta_set = compute_delta_set(current_marking, target_marking);
             lambda_set = compute_lambda_set(current_marking, target_marking);
             possible_firing_sequences = get_possible_firing_sequences(firing_sequences, delta_set, lambda_set);
@@ -129,14 +137,25 @@ attempt_to_make_transition_enabled_by_firing_silent_transitions(PetriNet& net, T
         }
     }
     // No sequence found to enable the transition
+    net.tokens = std::move(saved_tokens);
     return std::make_tuple(false, std::vector<std::string>());
 
 };
 
+std::tuple<bool, std::vector<std::string>> 
+attempt_to_make_transition_enabled_by_firing_silent_transitions(PetriNet& net, Transition* transition, const SilentFiringSequences& firing_sequences) {    
+    int32_t id = net.get_transition_id(transition->name);
+    if (id < 0) {
+        return std::make_tuple(false, std::vector<std::string>());
+    }
+    return attempt_to_make_transition_enabled_by_firing_silent_transitions(net, static_cast<uint32_t>(id), firing_sequences);
+};
+
 std::tuple<bool, std::vector<std::string>>
-attempt_to_reach_final_marking_by_firing_silent_transitions(PetriNet& net, std::unordered_map<std::string, std::unordered_map<std::string, std::vector<std::string>>>& firing_sequences, Marking final_marking) {
-    PetriNet net_copy = net;
-    bool reachable_by_silent_transitions = false;
+attempt_to_reach_final_marking_by_firing_silent_transitions(PetriNet& net, const SilentFiringSequences& firing_sequences, Marking final_marking) {
+    // The sequences are fired on the token vector of the net, which is restored before returning
+    net.freeze();
+    DenseMarking saved_tokens = net.tokens;
     std::vector<std::string> final_firing_sequence;
 
     Marking current_marking = net.get_current_marking();
@@ -152,7 +171,7 @@ attempt_to_reach_final_marking_by_firing_silent_transitions(PetriNet& net, std::
      while (!delta_set.empty()){
         for (const auto& sequence : possible_firing_sequences) {
             // Partially fire the sequence 
-            std::vector<std::string> fired_transitions = net_copy.partially_fire_transition_sequence(sequence, nullptr, nullptr);
+            std::vector<std::string> fired_transitions = net.partially_fire_transition_sequence(sequence, nullptr, nullptr);
             
             // if no transitions were fired, continue to the next sequence
             if (fired_transitions.empty()) {
@@ -162,12 +181,13 @@ attempt_to_reach_final_marking_by_firing_silent_transitions(PetriNet& net, std::
             final_firing_sequence.insert(final_firing_sequence.end(), fired_transitions.begin(), fired_transitions.end());
 
             // check the we have reached the final marking
-            if (net_copy.get_current_marking().contains(final_marking)) {
+            if (net.get_current_marking().contains(final_marking)) {
+                net.tokens = std::move(saved_tokens);
                 return std::make_tuple(true, final_firing_sequence);
             }
             
             // update the current marking
-            current_marking = net_copy.get_current_marking();
+            current_marking = net.get_current_marking();
             delta_set = compute_delta_set(current_marking, target_marking);
             lambda_set = compute_lambda_set(current_marking, target_marking);
             possible_firing_sequences = get_possible_firing_sequences(firing_sequences, delta_set, lambda_set);
@@ -179,55 +199,86 @@ attempt_to_reach_final_marking_by_firing_silent_transitions(PetriNet& net, std::
         }
     }
     // No sequence found to get to the final marking
+    net.tokens = std::move(saved_tokens);
     return std::make_tuple(false, std::vector<std::string>());
 
 };
 
-void get_places_shortest_path(
-    PetriNet& net,
-    const std::string& place_to_populate,
-    const std::string& current_place,
-    std::unordered_map<std::string, std::unordered_map<std::string, std::vector<std::string>>>& places_shortest_path,
-    std::vector<std::string> actual_list,
-    int rec_depth,
-    int max_rec_depth
-) {
-    if (rec_depth > max_rec_depth) {
-        return;
-    }
-    if (places_shortest_path.find(place_to_populate) == places_shortest_path.end()) {
-        places_shortest_path[place_to_populate] = {};
-    }
-    
-    for (const auto& arc : net.arcs) {
-        if (arc.source == current_place) {
-            Transition* transition = net.get_transition(arc.target);
-            if (transition && transition->is_silent()) {
-                for (const auto& out_arc : net.arcs) {
-                    if (out_arc.source == transition->name) {
-                        std::string next_place = out_arc.target;
-                        if (places_shortest_path[place_to_populate].find(next_place) == places_shortest_path[place_to_populate].end() ||
-                            actual_list.size() + 1 < places_shortest_path[place_to_populate][next_place].size()) {
-                            
-                            std::vector<std::string> new_actual_list = actual_list;
-                            new_actual_list.push_back(transition->name);
-                            places_shortest_path[place_to_populate][next_place] = new_actual_list;
-                            
-                            get_places_shortest_path(net, place_to_populate, next_place, places_shortest_path, new_actual_list, rec_depth + 1, max_rec_depth);
-                        }
+// Breadth-first search over the silent transitions from every place, using the consumers and postsets of the net.
+// The first path that reaches a place is a shortest one, and of the equally short paths it is the first one in
+// the order of the consumers and postsets. A path back to the start place is only found through a silent cycle.
+// Paths have at most max_rec_depth + 1 transitions.
+SilentFiringSequences get_places_shortest_path_by_hidden(PetriNet& net, int max_rec_depth) {
+    net.freeze();
+    SilentFiringSequences places_shortest_path;
+    size_t num_places = net.place_names.size();
+    int max_length = max_rec_depth + 1;
+
+    std::vector<bool> reached(num_places);
+    std::vector<int> length(num_places);
+    std::vector<uint32_t> previous_place(num_places);
+    std::vector<uint32_t> previous_transition(num_places);
+    std::vector<uint32_t> queue;
+    queue.reserve(num_places);
+
+    for (uint32_t start = 0; start < num_places; ++start) {
+        std::fill(reached.begin(), reached.end(), false);
+        queue.clear();
+        queue.push_back(start);
+        length[start] = 0;
+
+        for (size_t head = 0; head < queue.size(); ++head) {
+            uint32_t place = queue[head];
+            if (length[place] >= max_length) {
+                continue;
+            }
+            for (uint32_t transition : net.consumers[place]) {
+                if (!net.silent[transition]) {
+                    continue;
+                }
+                for (const auto& [next_place, _] : net.postsets[transition]) {
+                    if (reached[next_place]) {
+                        continue;
+                    }
+                    reached[next_place] = true;
+                    previous_place[next_place] = place;
+                    previous_transition[next_place] = transition;
+                    // The start place was already searched from
+                    if (next_place != start) {
+                        length[next_place] = length[place] + 1;
+                        queue.push_back(next_place);
                     }
                 }
             }
         }
+
+        // Walk the paths back to the start place and translate them from ids to names
+        auto& paths_from_place = places_shortest_path[net.place_names[start]];
+        for (uint32_t target = 0; target < num_places; ++target) {
+            if (!reached[target]) {
+                continue;
+            }
+            std::vector<std::string> sequence;
+            uint32_t place = target;
+            do {
+                sequence.push_back(net.transition_names[previous_transition[place]]);
+                place = previous_place[place];
+            } while (place != start);
+            std::reverse(sequence.begin(), sequence.end());
+            paths_from_place[net.place_names[target]] = std::move(sequence);
+        }
     }
+    return places_shortest_path;
 }
 
-std::unordered_map<std::string, std::unordered_map<std::string, std::vector<std::string>>>
- get_places_shortest_path_by_hidden(PetriNet& net, int max_rec_depth) {
-    std::unordered_map<std::string, std::unordered_map<std::string, std::vector<std::string>>> places_shortest_path;
-    for (const auto& place : net.places) {
-        get_places_shortest_path(net, place.name, place.name, places_shortest_path, {}, 0, max_rec_depth);
+// Returns the silent firing sequences of the net, searched on its copy used for the replay the first time
+// and kept with the net, so later replays on the same net (or its copies) reuse them
+std::shared_ptr<const SilentFiringSequences> get_silent_firing_sequences(const PetriNet& net, PetriNet& net_copy) {
+    auto cached = std::atomic_load(&net.silent_firing_sequences);
+    if (!cached) {
+        cached = std::make_shared<const SilentFiringSequences>(get_places_shortest_path_by_hidden(net_copy, 50));
+        std::atomic_store(&net.silent_firing_sequences, cached);
     }
-    return std::move(places_shortest_path);
+    net_copy.freeze();
+    return cached;
 }
-
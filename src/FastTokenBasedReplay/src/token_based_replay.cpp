@@ -35,7 +35,7 @@ void initialize_tokens(PetriNet& net) {
     net.set_marking(initial_marking);
 }
 
-void finalize_tokens(PetriNet& net, std::unordered_map<std::string, std::unordered_map<std::string, std::vector<std::string>>>& silent_firing_sequences, int& missing, int& consumed, int& produced) {
+void finalize_tokens(PetriNet& net, const SilentFiringSequences& silent_firing_sequences, int& missing, int& consumed, int& produced) {
     // Check if there are tokens in the final marking
     // If not, try to use silent transitions before adding tokens manually
 
@@ -61,12 +61,12 @@ void finalize_tokens(PetriNet& net, std::unordered_map<std::string, std::unorder
 
     // Else create tokens in the places of the final marking
     for (const auto& [place, tokens] : net.final_marking.places) {
-        Place* p = net.get_place(place);
-        if (!p) continue;
+        int32_t place_id = net.get_place_id(place);
+        if (place_id < 0) continue;
 
-        int32_t tokens_in_place = p->number_of_tokens();
+        int32_t tokens_in_place = net.tokens[place_id];
         if (tokens_in_place < tokens) {
-            p->add_tokens(tokens - tokens_in_place);
+            net.add_tokens(place_id, tokens - tokens_in_place);
             missing += tokens - tokens_in_place;
         }
     }
@@ -89,13 +89,13 @@ std::string computePrefix(const Trace& trace, size_t currentIndex) {
     return std::move(result);
 }
 
-std::optional<std::tuple<size_t, std::tuple<int, int, int, int>, Marking>> 
+std::optional<std::tuple<size_t, std::tuple<int, int, int, int>, DenseMarking>> 
 get_longest_prefix(
-    const std::unordered_map<std::string, std::tuple<std::tuple<int, int, int, int>, Marking>>& new_prefix_cache,
+    const std::unordered_map<std::string, std::tuple<std::tuple<int, int, int, int>, DenseMarking>>& new_prefix_cache,
     const Trace& trace
 ) {
     std::string prefix_key;
-    std::optional<std::tuple<size_t, std::tuple<int, int, int, int>, Marking>> best_match = std::nullopt;
+    std::optional<std::tuple<size_t, std::tuple<int, int, int, int>, DenseMarking>> best_match = std::nullopt;
 
     for (size_t i = 0; i < trace.events.size(); ++i) {
         if (i > 0){
@@ -123,7 +123,7 @@ std::tuple<double, double, double, double>
 replay_trace_without_caching(
     const Trace& trace, 
     PetriNet& net, 
-    std::unordered_map<std::string, std::unordered_map<std::string,std::vector<std::string>>>& silent_firing_sequences,
+    const SilentFiringSequences& silent_firing_sequences,
     ActivityCache& activity_cache) {   
     int missing = 0;   // Count of missing tokens (tokens added to input places to enable transitions)
     int remaining = 0; // Count of remaining tokens in the Petri net at the end
@@ -139,15 +139,16 @@ replay_trace_without_caching(
     for (const auto& event : trace.events) {
         
         // Find the transition corresponding to the event
-        Transition* transition = net.get_transition(event.activity);
-        if (!transition) {
+        int32_t transition_id = net.get_transition_id(event.activity);
+        if (transition_id < 0) {
             throw std::runtime_error("Transition not found: " + event.activity);
         }
+        uint32_t transition = static_cast<uint32_t>(transition_id);
 
-        if (!net.can_fire(*transition)) {
+        if (!net.can_fire(transition)) {
             // if the net cannot fire try to enable the transition by firing silent transitions
-            Marking current_marking = net.get_current_marking();
-            std::vector<std::string>* cached_sequence = activity_cache.retrieve(current_marking, transition->name);
+            DenseMarking current_marking = net.tokens;
+            std::vector<std::string>* cached_sequence = activity_cache.retrieve(current_marking, transition);
             
             if (cached_sequence) {
                 net.fire_transition_sequence(*cached_sequence, &consumed, &produced);
@@ -155,24 +156,23 @@ replay_trace_without_caching(
                 auto [reachable, sequence] = attempt_to_make_transition_enabled_by_firing_silent_transitions(net, transition, silent_firing_sequences);
                 if (reachable) {
                     net.fire_transition_sequence(sequence, &consumed, &produced);
-                    activity_cache.store(current_marking, transition->name, sequence);
+                    activity_cache.store(current_marking, transition, sequence);
                 }
             }
         }
 
-        if (!net.can_fire(*transition)) {
+        if (!net.can_fire(transition)) {
             // if it still cant be fired, add tokens to the input places
-            for (const auto& place : net.get_preset(*transition)) {
-                Place* p = net.get_place(place.name);
-                if (p && p->number_of_tokens() == 0) {
-                    p->add_tokens(1);
+            for (const auto& [place, _] : net.presets[transition]) {
+                if (net.tokens[place] == 0) {
+                    net.add_tokens(place, 1);
                     missing += 1;
                 }
             }
         }
 
-        if (net.can_fire(*transition)) {
-            net.fire_transition(*transition, &consumed, &produced);
+        if (net.can_fire(transition)) {
+            net.fire_transition(transition, &consumed, &produced);
         }else{
             throw std::runtime_error("Transition cannot be fired: " + event.activity);
         }
@@ -199,9 +199,9 @@ std::tuple<double, double, double, double>
 replay_trace_with_prefix(
     const Trace& trace, 
     PetriNet& net, 
-    std::unordered_map<std::string, std::unordered_map<std::string,std::vector<std::string>>>& silent_firing_sequences,
+    const SilentFiringSequences& silent_firing_sequences,
     ActivityCache& activity_cache,
-    std::unordered_map<std::string, std::tuple<std::tuple<int, int, int, int>, Marking>>& new_prefix_cache,
+    std::unordered_map<std::string, std::tuple<std::tuple<int, int, int, int>, DenseMarking>>& new_prefix_cache,
     size_t max_prefix_length_to_be_considered) {
     int missing = 0;   // Count of missing tokens (tokens added to input places to enable transitions)
     int remaining = 0; // Count of remaining tokens in the Petri net at the end
@@ -224,7 +224,7 @@ replay_trace_with_prefix(
         produced  = std::get<2>(replay_data);
         consumed  = std::get<3>(replay_data);
         
-        net.set_marking(marking);
+        net.tokens = marking;
 
         std::ostringstream oss;
         for (size_t i = 0; i < prefix_length; ++i) {
@@ -241,15 +241,16 @@ replay_trace_with_prefix(
         Event event = trace.events[i];
 
         // Find the transition corresponding to the event
-        Transition* transition = net.get_transition(event.activity);
-        if (!transition) {
+        int32_t transition_id = net.get_transition_id(event.activity);
+        if (transition_id < 0) {
             throw std::runtime_error("Transition not found: " + event.activity);
         }
+        uint32_t transition = static_cast<uint32_t>(transition_id);
 
         // if the net cannot fire try to enable the transition by firing silent transitions
-        if (!net.can_fire(*transition)) {
-            Marking current_marking = net.get_current_marking();
-            std::vector<std::string>* cached_sequence = activity_cache.retrieve(current_marking, transition->name);
+        if (!net.can_fire(transition)) {
+            DenseMarking current_marking = net.tokens;
+            std::vector<std::string>* cached_sequence = activity_cache.retrieve(current_marking, transition);
             
             if (cached_sequence) {
                 net.fire_transition_sequence(*cached_sequence, &consumed, &produced);
@@ -257,25 +258,24 @@ replay_trace_with_prefix(
                 auto [reachable, sequence] = attempt_to_make_transition_enabled_by_firing_silent_transitions(net, transition, silent_firing_sequences);
                 if (reachable) {
                     net.fire_transition_sequence(sequence, &consumed, &produced);
-                    activity_cache.store(current_marking, transition->name, sequence);
+                    activity_cache.store(current_marking, transition, sequence);
                 }
             }
         }
 
         // if it still cant be fired, add tokens to the input places
-        if (!net.can_fire(*transition)) {
-            for (const auto& place : net.get_preset(*transition)) {
-                Place* p = net.get_place(place.name);
-                if (p && p->number_of_tokens() == 0) {
-                    p->add_tokens(1);
+        if (!net.can_fire(transition)) {
+            for (const auto& [place, _] : net.presets[transition]) {
+                if (net.tokens[place] == 0) {
+                    net.add_tokens(place, 1);
                     missing += 1;
                 }
             }
         }
 
         // now fire the transitio
-        if (net.can_fire(*transition)) {
-            net.fire_transition(*transition, &consumed, &produced);
+        if (net.can_fire(transition)) {
+            net.fire_transition(transition, &consumed, &produced);
 
             // Add the current event to the prefix
             if (!curr_prefix.empty()) {
@@ -286,7 +286,7 @@ replay_trace_with_prefix(
             if (curr_prefix.length() < max_prefix_length_to_be_considered * 2) {
                 new_prefix_cache[curr_prefix] = std::make_tuple(
                     std::make_tuple(missing, remaining, produced, consumed),
-                    net.get_current_marking()
+                    net.tokens
                 );
             }
 
@@ -317,15 +317,15 @@ std::tuple<double, double, double, double>
 replay_trace_with_suffix(
     const Trace& trace, 
     PetriNet& net, 
-    std::unordered_map<std::string, std::unordered_map<std::string, std::vector<std::string>>>& silent_firing_sequences,
+    const SilentFiringSequences& silent_firing_sequences,
     ActivityCache& activity_cache, 
-    std::unordered_map<MarkingPostfixKey, std::tuple<std::tuple<int, int, int, int>, Marking>, MarkingPostfixKeyHasher>& suffix_cache,
+    std::unordered_map<MarkingPostfixKey, std::tuple<std::tuple<int, int, int, int>, DenseMarking>, MarkingPostfixKeyHasher>& suffix_cache,
     size_t max_suffix_length_to_be_considered
 ) {
     int missing = 0, remaining = 0, consumed = 0, produced = 0;
 
     // The local cache for suffixes (which in the end is appended to the global cache)
-    std::unordered_map<MarkingPostfixKey, std::tuple<std::tuple<int, int, int, int>, Marking>, MarkingPostfixKeyHasher> local_suffix_cache;
+    std::unordered_map<MarkingPostfixKey, std::tuple<std::tuple<int, int, int, int>, DenseMarking>, MarkingPostfixKeyHasher> local_suffix_cache;
     // reserve the local cache for the max size
     local_suffix_cache.reserve(trace.events.size() * max_suffix_length_to_be_considered);
 
@@ -339,14 +339,15 @@ replay_trace_with_suffix(
         int local_missing = 0, local_remaining = 0, local_consumed = 0, local_produced = 0;
 
         // Find the transition corresponding to the event
-        Transition* transition = net.get_transition(event.activity);
-        if (!transition) {
+        int32_t transition_id = net.get_transition_id(event.activity);
+        if (transition_id < 0) {
             throw std::runtime_error("Transition not found: " + event.activity);
         }
+        uint32_t transition = static_cast<uint32_t>(transition_id);
 
         // Compute the postfix and chech if it is already in the cache
         std::string postfix = computePostfix(trace, i);
-        MarkingPostfixKey key = {net.get_current_marking(), postfix};
+        MarkingPostfixKey key = {net.tokens, postfix};
         if (postfix.length() < max_suffix_length_to_be_considered) {
             auto it = suffix_cache.find(key);
             if (it != suffix_cache.end() && postfix.length() < max_suffix_length_to_be_considered) {
@@ -361,7 +362,7 @@ replay_trace_with_suffix(
                 remaining += cached_remaining + local_remaining;
                 produced  += cached_produced + local_produced;
                 consumed  += cached_consumed + local_consumed;
-                net.set_marking(cached_marking);
+                net.tokens = cached_marking;
     
                 
                 // add the local produced and consumed tokens to all keys in the local cache
@@ -380,9 +381,9 @@ replay_trace_with_suffix(
 
 
         // if the net cannot fire try to enable the transition by firing silent transitions
-        if (!net.can_fire(*transition)) {
-            Marking current_marking = net.get_current_marking();
-            const std::vector<std::string>* cached_sequence = activity_cache.retrieve(current_marking, transition->name);
+        if (!net.can_fire(transition)) {
+            DenseMarking current_marking = net.tokens;
+            const std::vector<std::string>* cached_sequence = activity_cache.retrieve(current_marking, transition);
             
             if (cached_sequence) {
                 net.fire_transition_sequence(*cached_sequence, &local_consumed, &local_produced);                
@@ -391,25 +392,24 @@ replay_trace_with_suffix(
                 auto [reachable, sequence] = attempt_to_make_transition_enabled_by_firing_silent_transitions(net, transition, silent_firing_sequences);
                 if (reachable) {
                     net.fire_transition_sequence(sequence, &local_consumed, &local_produced);
-                    activity_cache.store(current_marking, transition->name, sequence);
+                    activity_cache.store(current_marking, transition, sequence);
                 }
             }
         }
 
         // if it still cant be fired, add tokens to the input places
-        if (!net.can_fire(*transition)) {
-            for (const auto& place : net.get_preset(*transition)) {
-                Place* p = net.get_place(place.name);
-                if (p && p->number_of_tokens() == 0) {
-                    p->add_tokens(1);
+        if (!net.can_fire(transition)) {
+            for (const auto& [place, _] : net.presets[transition]) {
+                if (net.tokens[place] == 0) {
+                    net.add_tokens(place, 1);
                     local_missing += 1;
                 }
             }
         }
 
         // now fire the transitio
-        if (net.can_fire(*transition)) {
-            net.fire_transition(*transition, &local_consumed, &local_produced);
+        if (net.can_fire(transition)) {
+            net.fire_transition(transition, &local_consumed, &local_produced);
 
             // add the local produced and consumed tokens to all keys in the local cache
             for (auto& [local_key, local_value] : local_suffix_cache) {
@@ -418,14 +418,14 @@ replay_trace_with_suffix(
                 std::get<1>(local_data) += local_remaining;
                 std::get<2>(local_data) += local_produced;
                 std::get<3>(local_data) += local_consumed;
-                local_marking = net.get_current_marking();
+                local_marking = net.tokens;
             }
 
             // only add if the postfix is shorter than the min length
             if (postfix.length() < max_suffix_length_to_be_considered) {
                 local_suffix_cache[key] = std::make_tuple(
                     std::make_tuple(local_missing, local_remaining, local_produced, local_consumed),
-                    net.get_current_marking()
+                    net.tokens
                 );
             }
 
@@ -652,21 +652,23 @@ double calculate_fitness(const EventLog& log, const PetriNet& net, bool prefix_c
 
     // Map to store computed values for unique traces
     std::unordered_map<Trace, std::tuple<int, int, int, int>> trace_cache; 
-    trace_cache.reserve(log.traces.size());
+    if (!log.is_variant_log()) {
+        trace_cache.reserve(log.traces.size());
+    }
 
     PetriNet net_copy = net;
     // A map to store the firing sequences for every place to every other place using silent transitions
-    std::unordered_map<std::string, std::unordered_map<std::string, std::vector<std::string>>> silent_firing_sequences;
-    // time the calculations 
-    silent_firing_sequences = get_places_shortest_path_by_hidden(net_copy, 50);
+    // They are searched once per net and reused by every later replay on it
+    auto shared_silent_firing_sequences = get_silent_firing_sequences(net, net_copy);
+    const SilentFiringSequences& silent_firing_sequences = *shared_silent_firing_sequences;
     // Activity cache to store the precomputed values
     ActivityCache activity_cache;
 
     size_t max_suffix_length_to_be_considered = 5;
     size_t max_prefix_length_to_be_considered = 5;
 
-    std::unordered_map<std::string, std::tuple<std::tuple<int, int, int, int>, Marking>> prefix_cache;
-    std::unordered_map<MarkingPostfixKey, std::tuple<std::tuple<int, int, int, int>, Marking>, MarkingPostfixKeyHasher> suffix_cache;
+    std::unordered_map<std::string, std::tuple<std::tuple<int, int, int, int>, DenseMarking>> prefix_cache;
+    std::unordered_map<MarkingPostfixKey, std::tuple<std::tuple<int, int, int, int>, DenseMarking>, MarkingPostfixKeyHasher> suffix_cache;
     
     if (prefix_caching) {
         prefix_cache.reserve(log.traces.size() * max_prefix_length_to_be_considered);
@@ -676,30 +678,43 @@ double calculate_fitness(const EventLog& log, const PetriNet& net, bool prefix_c
         suffix_cache.reserve(log.traces.size() * max_suffix_length_to_be_considered);
     }
 
+    // A log built from variants contains every trace once, so it does not have to be deduplicated
+    bool unique_traces = log.is_variant_log();
+
     // Iterate over the traces in the event log
-    for (const auto& trace : log.traces) {
-        if (trace_cache.find(trace) == trace_cache.end()) {
+    for (size_t i = 0; i < log.traces.size(); ++i) {
+        const Trace& trace = log.traces[i];
+        std::tuple<int, int, int, int> replay_result;
+
+        auto cached = unique_traces ? trace_cache.end() : trace_cache.find(trace);
+        if (cached != trace_cache.end()) {
+            // Retrieve precomputed values
+            replay_result = cached->second;
+        } else {
             // If this trace has not been processed, do token replay
-            // PetriNet net_copy = net;
             if (prefix_caching && suffix_caching) {
-                //trace_cache[trace] = replay_trace_with_prefix_and_suffix(trace, net_copy, silent_firing_sequences, activity_cache , prefix_cache, suffix_cache, max_prefix_length_to_be_considered, max_suffix_length_to_be_considered);
+                //replay_result = replay_trace_with_prefix_and_suffix(trace, net_copy, silent_firing_sequences, activity_cache , prefix_cache, suffix_cache, max_prefix_length_to_be_considered, max_suffix_length_to_be_considered);
+                replay_result = std::make_tuple(0, 0, 0, 0);
             } else if (prefix_caching) {
-                trace_cache[trace] = replay_trace_with_prefix(trace, net_copy, silent_firing_sequences, activity_cache,  prefix_cache, max_prefix_length_to_be_considered);
+                replay_result = replay_trace_with_prefix(trace, net_copy, silent_firing_sequences, activity_cache,  prefix_cache, max_prefix_length_to_be_considered);
             } else if (suffix_caching) {
-                trace_cache[trace] = replay_trace_with_suffix(trace, net_copy, silent_firing_sequences, activity_cache, suffix_cache, max_suffix_length_to_be_considered);
+                replay_result = replay_trace_with_suffix(trace, net_copy, silent_firing_sequences, activity_cache, suffix_cache, max_suffix_length_to_be_considered);
             } else {
-                trace_cache[trace] = replay_trace_without_caching(trace, net_copy, silent_firing_sequences, activity_cache);
+                replay_result = replay_trace_without_caching(trace, net_copy, silent_firing_sequences, activity_cache);
+            }
+            if (!unique_traces) {
+                trace_cache[trace] = replay_result;
             }
         }
 
-        // Retrieve precomputed values
-        auto [missing, remaining, produced, consumed] = trace_cache[trace];
+        auto [missing, remaining, produced, consumed] = replay_result;
+        int frequency = static_cast<int>(log.get_frequency(i));
 
         // Update the total counts
-        total_missing += missing;
-        total_remaining += remaining;
-        total_produced += produced;
-        total_consumed += consumed;
+        total_missing += frequency * missing;
+        total_remaining += frequency * remaining;
+        total_produced += frequency * produced;
+        total_consumed += frequency * consumed;
     }
 
     double fitness = 0.5 * (1 - (static_cast<double>(total_missing) / total_consumed)) + 0.5 * (1 - (static_cast<double>(total_remaining) / total_produced));
@@ -19,6 +19,10 @@
 #include "src/test_silent_graph.cpp"
 #include "src/test_silent_transition_handling.cpp"
 #include "src/test_precision.cpp"
+#include "src/test_indexed_petri_net.cpp"
+#include "src/test_dense_marking.cpp"
+#include "src/test_variant_log.cpp"
+#include "src/test_evaluate.cpp"
 
 TEST(FastTokenBasedReplayTest, final_marking_condition) {
     Marking final_marking = Marking({{"p1", 1}});
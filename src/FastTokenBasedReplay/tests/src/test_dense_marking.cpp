@@ -0,0 +1,83 @@
+#include <unordered_set>
+#include "Marking.hpp"
+#include "PetriNet.hpp"
+#include "SuffixTree.hpp"
+
+#include "gtest/gtest.h"
+
+
+TEST(DenseMarking, incremental_hash_matches_fresh_hash){
+    DenseMarking marking(4);
+    marking.set(0, 1);
+    marking.add(2, 3);
+    marking.add(0, -1);
+    marking.add(3, 1);
+
+    DenseMarking fresh = {0, 0, 3, 1};
+
+    EXPECT_EQ(marking.hash, fresh.hash);
+    EXPECT_EQ(marking, fresh);
+}
+
+TEST(DenseMarking, empty_places_do_not_change_the_hash){
+    DenseMarking marking(3);
+    EXPECT_EQ(marking.hash, 0);
+
+    marking.set(1, 2);
+    marking.set(1, 0);
+    EXPECT_EQ(marking.hash, 0);
+}
+
+TEST(DenseMarking, permuted_tokens_hash_differently){
+    // With an XOR of place and token hashes these markings collide
+    DenseMarking m1 = {1, 2};
+    DenseMarking m2 = {2, 1};
+    EXPECT_NE(m1.hash, m2.hash);
+    EXPECT_FALSE(m1 == m2);
+
+    Marking named1({{"p1", 1}, {"p2", 2}});
+    Marking named2({{"p1", 2}, {"p2", 1}});
+    EXPECT_NE(MarkingHasher{}(named1), MarkingHasher{}(named2));
+}
+
+TEST(DenseMarking, few_collisions_on_small_markings){
+    std::unordered_set<uint64_t> hashes;
+    size_t markings = 0;
+    for (int a = 0; a < 8; ++a) {
+        for (int b = 0; b < 8; ++b) {
+            for (int c = 0; c < 8; ++c) {
+                for (int d = 0; d < 8; ++d) {
+                    hashes.insert(DenseMarking({a, b, c, d}).hash);
+                    ++markings;
+                }
+            }
+        }
+    }
+    EXPECT_EQ(hashes.size(), markings);
+}
+
+TEST(DenseMarking, net_keeps_hash_up_to_date_when_firing){
+    PetriNet net;
+    net.add_place(Place("start", 1));
+    net.add_place(Place("p1", 0));
+    net.add_place(Place("end", 0));
+
+    net.add_transition(Transition("A"));
+    net.add_transition(Transition("B"));
+
+    net.add_arc(Arc("start", "A"));
+    net.add_arc(Arc("A", "p1"));
+    net.add_arc(Arc("p1", "B"));
+    net.add_arc(Arc("B", "end"));
+
+    net.fire_transition_sequence({"A"}, nullptr, nullptr);
+    EXPECT_EQ(net.tokens, DenseMarking({0, 1, 0}));
+
+    net.fire_transition_sequence({"B"}, nullptr, nullptr);
+    EXPECT_EQ(net.tokens, DenseMarking({0, 0, 1}));
+
+    MarkingPostfixKey key1 = {net.tokens, "A,B,"};
+    MarkingPostfixKey key2 = {DenseMarking({0, 0, 1}), "A,B,"};
+    EXPECT_EQ(key1, key2);
+    EXPECT_EQ(MarkingPostfixKeyHasher{}(key1), MarkingPostfixKeyHasher{}(key2));
+}
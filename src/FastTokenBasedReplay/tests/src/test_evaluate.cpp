@@ -0,0 +1,150 @@
+#include "PetriNet.hpp"
+#include "Eventlog.hpp"
+#include "token_based_replay.cpp"
+#include "precision.cpp"
+#include "evaluate.cpp"
+#include <chrono>
+#include <iostream>
+
+#include "gtest/gtest.h"
+
+
+TEST(Evaluate, matches_separate_fitness_and_precision){
+    PetriNet net = create_net_with_choice_and_loop();
+    // ACB and BC cannot be replayed completely, so the precision stops early while the fitness continues
+    EventLog log = EventLog::from_trace_list({"ABC", "ACB", "ABC", "BC", "A", "ABBC", "CA"});
+
+    auto results = evaluate(log, net, {"fitness", "precision", "f1_score"});
+    double fitness = calculate_fitness(log, net, false, false);
+    double precision = calculate_precision(log, net);
+
+    EXPECT_DOUBLE_EQ(results["fitness"], fitness);
+    EXPECT_DOUBLE_EQ(results["precision"], precision);
+    EXPECT_DOUBLE_EQ(results["f1_score"], 2 * (precision * fitness) / (precision + fitness));
+}
+
+TEST(Evaluate, single_metrics_and_variant_log){
+    PetriNet net = create_net_with_choice_and_loop();
+    EventLog variant_log = create_variant_log({{0, 1, 2}, {0, 2, 1}, {1, 2}, {0}}, {3, 2, 1, 4});
+    EventLog expanded_log = EventLog::from_trace_list({"ABC", "ACB", "ABC", "BC", "A", "ACB", "A", "ABC", "A", "A"});
+
+    auto fitness = evaluate(variant_log, net, {"fitness"});
+    auto precision = evaluate(variant_log, net, {"precision"});
+    EXPECT_EQ(fitness.size(), 1);
+    EXPECT_EQ(precision.size(), 1);
+    EXPECT_DOUBLE_EQ(fitness["fitness"], calculate_fitness(expanded_log, net, false, false));
+    EXPECT_DOUBLE_EQ(precision["precision"], calculate_precision(expanded_log, net));
+    EXPECT_THROW(evaluate(variant_log, net, {"generalization"}), std::invalid_argument);
+}
+
+TEST(Evaluate, benchmark_fused_replay_on_gtm_net){
+    PetriNet net = create_gtm_net();
+    std::vector<std::string> variants = {
+        "ABDEGHIJ", "ACDEGIHJ", "ACDEGHIJ", "ACEDHIJ", "ABDEHIJ", "ABEDIHJ", "ABEDHIJ", "ACDEIHJ",
+        "ABEFEDHIJ", "ACEDGIHJ", "ACEDIHJ", "ACDEHIJ", "ACDEFEGIHJ", "ACEDFEFEGHIJ", "ACDEGHIJ", "ABDEFEHIJ"
+    };
+    std::vector<std::string> trace_list;
+    for (int i = 0; i < 50; ++i) {
+        trace_list.insert(trace_list.end(), variants.begin(), variants.end());
+    }
+    EventLog eventlog = EventLog::from_trace_list(trace_list);
+    const int repetitions = 50;
+
+    double fitness = 0.0;
+    double precision = 0.0;
+    auto start = std::chrono::high_resolution_clock::now();
+    for (int i = 0; i < repetitions; ++i) {
+        fitness = calculate_fitness(eventlog, net, false, false);
+        precision = calculate_precision(eventlog, net);
+    }
+    auto end = std::chrono::high_resolution_clock::now();
+    double separate_time = std::chrono::duration<double, std::milli>(end - start).count() / repetitions;
+
+    std::unordered_map<std::string, double> results;
+    start = std::chrono::high_resolution_clock::now();
+    for (int i = 0; i < repetitions; ++i) {
+        results = evaluate(eventlog, net, {"fitness", "precision"});
+    }
+    end = std::chrono::high_resolution_clock::now();
+    double fused_time = std::chrono::duration<double, std::milli>(end - start).count() / repetitions;
+
+    EXPECT_DOUBLE_EQ(results["fitness"], fitness);
+    EXPECT_DOUBLE_EQ(results["precision"], precision);
+
+    std::cout << "Fitness and precision on GTM net (" << trace_list.size() << " traces): separate " << separate_time
+              << " ms, fused " << fused_time << " ms" << std::endl;
+}
+
+TEST(Evaluate, batch_matches_single_evaluations){
+    EventLog log = EventLog::from_trace_list({"ABC", "ACB", "ABC", "BC", "A", "ABBC", "CA"});
+    std::vector<PetriNet> nets = {create_net_with_choice_and_loop(), create_net_with_choice_and_loop(), create_net_with_choice_and_loop()};
+    // The second net cannot skip B
+    nets[1].add_transition(Transition("D"));
+
+    for (size_t n_threads : {1, 2, 8}) {
+        auto results = calculate_batch(log, nets, {"fitness", "precision"}, n_threads);
+        ASSERT_EQ(results.size(), nets.size());
+        for (size_t i = 0; i < nets.size(); ++i) {
+            auto expected = evaluate(log, nets[i], {"fitness", "precision"});
+            EXPECT_DOUBLE_EQ(results[i]["fitness"], expected["fitness"]);
+            EXPECT_DOUBLE_EQ(results[i]["precision"], expected["precision"]);
+        }
+    }
+    EXPECT_TRUE(calculate_batch(log, {}, {"fitness"}, 0).empty());
+}
+
+TEST(Evaluate, batch_rethrows_errors_of_the_threads){
+    EventLog log = EventLog::from_trace_list({"ABC", "AX"});
+    std::vector<PetriNet> nets(4, create_net_with_choice_and_loop());
+    EXPECT_THROW(calculate_batch(log, nets, {"fitness"}, 2), std::runtime_error);
+}
+
+TEST(Evaluate, precomputed_prefixes_are_reused_until_the_log_changes){
+    PetriNet net = create_net_with_choice_and_loop();
+    EventLog log = EventLog::from_trace_list({"ABC", "ACB", "ABC", "BC", "A"});
+    double precision = calculate_precision(log, net);
+
+    precompute_prefixes(log);
+    ASSERT_NE(log.prefixes, nullptr);
+    EXPECT_EQ(*log.prefixes, compute_prefixes(log));
+    EXPECT_EQ(get_prefixes(log), log.prefixes);
+    EXPECT_DOUBLE_EQ(calculate_precision(log, net), precision);
+    EXPECT_DOUBLE_EQ(evaluate(log, net, {"precision"})["precision"], precision);
+
+    // Adding a trace discards the prefixes, as they no longer describe the log
+    Trace trace("trace_6", {});
+    trace.add_event(Event("C", "", {}));
+    log.add_trace(trace);
+    EXPECT_EQ(log.prefixes, nullptr);
+    EXPECT_EQ(get_prefixes(log)->count("C,"), 1);
+}
+
+TEST(Evaluate, bounded_evaluation_matches_full_replay_below_the_threshold){
+    PetriNet net = create_net_with_choice_and_loop();
+    EventLog variant_log = create_variant_log({{0, 1, 2}, {0, 2, 1}, {1, 2}, {0}}, {3, 2, 1, 4});
+    auto expected = evaluate(variant_log, net, {"fitness", "precision"});
+
+    // Every trace is replayed if the threshold can always be reached
+    auto [aborted, results] = evaluate_bounded(variant_log, net, {{"fitness", 2.0}, {"precision", 1.0}}, 0.0);
+    EXPECT_FALSE(aborted);
+    EXPECT_DOUBLE_EQ(results["fitness"], expected["fitness"]);
+    EXPECT_DOUBLE_EQ(results["precision"], expected["precision"]);
+
+    EXPECT_THROW(evaluate_bounded(variant_log, net, {{"fitness", -1.0}}, 0.0), std::invalid_argument);
+}
+
+TEST(Evaluate, bounded_evaluation_stops_when_the_threshold_is_out_of_reach){
+    PetriNet net = create_net_with_choice_and_loop();
+    // The most frequent variant does not fit, so the estimate drops after the first variant
+    EventLog variant_log = create_variant_log({{2, 1, 0}, {0, 1, 2}}, {9, 1});
+    auto expected = evaluate(variant_log, net, {"fitness"});
+
+    auto [aborted, results] = evaluate_bounded(variant_log, net, {{"fitness", 1.0}}, expected["fitness"] + 0.2);
+    EXPECT_TRUE(aborted);
+    EXPECT_LT(results["fitness"], expected["fitness"] + 0.2);
+
+    // A threshold above the maximal score stops the replay after the first variant already
+    auto [aborted_unreachable, estimates] = evaluate_bounded(variant_log, net, {{"fitness", 1.0}}, 1.5);
+    EXPECT_TRUE(aborted_unreachable);
+    EXPECT_LE(estimates["fitness"], 1.0);
+}
@@ -0,0 +1,259 @@
+#include "PetriNet.hpp"
+#include "Eventlog.hpp"
+#include "token_based_replay.cpp"
+#include "precision.cpp"
+#include <chrono>
+#include <iostream>
+
+#include "gtest/gtest.h"
+
+
+TEST(IndexedPetriNet, freeze_assigns_dense_ids){
+    PetriNet net;
+    net.add_place(Place("start", 1));
+    net.add_place(Place("p1", 0));
+    net.add_place(Place("end", 0));
+
+    net.add_transition(Transition("A"));
+    net.add_transition(Transition("tau_1"));
+
+    net.add_arc(Arc("start", "A"));
+    net.add_arc(Arc("A", "p1", 2));
+    net.add_arc(Arc("p1", "tau_1", 2));
+    net.add_arc(Arc("tau_1", "end"));
+
+    net.freeze();
+
+    EXPECT_EQ(net.get_place_id("start"), 0);
+    EXPECT_EQ(net.get_place_id("end"), 2);
+    EXPECT_EQ(net.get_place_id("unknown"), -1);
+    EXPECT_EQ(net.get_transition_id("tau_1"), 1);
+    EXPECT_EQ(net.get_transition_id("unknown"), -1);
+
+    std::vector<std::pair<uint32_t, int>> expected_preset = {{1, 2}};
+    std::vector<std::pair<uint32_t, int>> expected_postset = {{2, 1}};
+    EXPECT_EQ(net.presets[1], expected_preset);
+    EXPECT_EQ(net.postsets[1], expected_postset);
+    EXPECT_EQ(net.silent, std::vector<bool>({false, true}));
+
+    // The tokens of the places seed the token vector
+    EXPECT_EQ(net.tokens.tokens, std::vector<int>({1, 0, 0}));
+}
+
+TEST(IndexedPetriNet, fire_by_id){
+    PetriNet net;
+    net.add_place(Place("start", 1));
+    net.add_place(Place("p1", 0));
+    net.add_place(Place("end", 0));
+
+    net.add_transition(Transition("A"));
+    net.add_transition(Transition("B"));
+
+    net.add_arc(Arc("start", "A"));
+    net.add_arc(Arc("A", "p1"));
+    net.add_arc(Arc("p1", "B"));
+    net.add_arc(Arc("B", "end"));
+
+    uint32_t a = net.get_transition_id("A");
+    uint32_t b = net.get_transition_id("B");
+
+    EXPECT_TRUE(net.can_fire(a));
+    EXPECT_FALSE(net.can_fire(b));
+
+    int consumed = 0;
+    int produced = 0;
+    net.fire_transition(a, &consumed, &produced);
+    net.fire_transition(b, &consumed, &produced);
+
+    EXPECT_EQ(consumed, 2);
+    EXPECT_EQ(produced, 2);
+    EXPECT_EQ(net.get_current_marking(), Marking({{"end", 1}}));
+    EXPECT_THROW(net.fire_transition(a, nullptr, nullptr), std::runtime_error);
+}
+
+TEST(IndexedPetriNet, duplicate_transition_names_share_arcs){
+    PetriNet net;
+    net.add_place(Place("start", 0));
+    net.add_place(Place("p1", 0));
+    net.add_place(Place("p2", 0));
+
+    net.add_transition(Transition("A"));
+    net.add_transition(Transition("A"));
+
+    net.add_arc(Arc("start", "A"));
+    net.add_arc(Arc("A", "p1"));
+    net.add_arc(Arc("A", "p2"));
+
+    net.freeze();
+    EXPECT_EQ(net.transition_names.size(), 1);
+    EXPECT_EQ(net.postsets[0].size(), 2);
+}
+
+TEST(IndexedPetriNet, adding_arcs_keeps_the_marking){
+    PetriNet net;
+    net.add_place(Place("start", 0));
+    net.add_place(Place("end", 0));
+    net.add_transition(Transition("A"));
+    net.add_arc(Arc("start", "A"));
+
+    net.set_marking(Marking({{"start", 1}}));
+    EXPECT_TRUE(net.frozen);
+
+    net.add_arc(Arc("A", "end"));
+    EXPECT_FALSE(net.frozen);
+
+    net.fire_transition_sequence({"A"}, nullptr, nullptr);
+    EXPECT_EQ(net.get_current_marking(), Marking({{"end", 1}}));
+}
+
+// Net compiled from the tree SEQ(A,XOR(C,B),D,O(E,F),XOR(tau,G),AND(H,I),O(tau,O(tau,J)))
+// discovered by GTM on a log played out from SEQ(A,XOR(B,C),AND(D,O(E,F)),XOR(G,tau),AND(H,I),J)
+PetriNet create_gtm_net() {
+    PetriNet net;
+    for (const auto& place : {"source", "sink", "p_3", "p_4", "p_6", "p_7", "p_8", "p_10", "p_12", "p_13", "p_14", "p_15", "p_16", "p_17", "p_19", "p_20"}) {
+        net.add_place(Place(place, 0));
+    }
+    for (const auto& transition : {"A", "C", "B", "D", "E", "F", "tau_0", "tau_1", "G", "tau_2", "tau_3", "H", "I", "tau_4", "tau_5", "tau_6", "J", "tau_7", "tau_8"}) {
+        net.add_transition(Transition(transition));
+    }
+    std::vector<std::pair<std::string, std::string>> arcs = {
+        {"source", "A"}, {"A", "p_3"}, {"p_3", "C"}, {"C", "p_4"}, {"p_3", "B"}, {"B", "p_4"}, {"p_4", "D"}, {"D", "p_7"},
+        {"p_7", "E"}, {"E", "p_8"}, {"p_8", "F"}, {"F", "p_7"}, {"p_8", "tau_0"}, {"tau_0", "p_6"}, {"p_6", "tau_1"},
+        {"tau_1", "p_10"}, {"p_6", "G"}, {"G", "p_10"}, {"p_10", "tau_2"}, {"tau_2", "p_12"}, {"tau_2", "p_14"},
+        {"p_13", "tau_3"}, {"p_15", "tau_3"}, {"tau_3", "p_16"}, {"p_12", "H"}, {"H", "p_13"}, {"p_14", "I"}, {"I", "p_15"},
+        {"p_16", "tau_4"}, {"tau_4", "p_17"}, {"p_17", "tau_5"}, {"tau_5", "p_19"}, {"p_19", "tau_6"}, {"tau_6", "p_20"},
+        {"p_20", "J"}, {"J", "p_19"}, {"p_20", "tau_7"}, {"tau_7", "p_16"}, {"p_17", "tau_8"}, {"tau_8", "sink"}
+    };
+    for (const auto& [source, target] : arcs) {
+        net.add_arc(Arc(source, target));
+    }
+    net.set_initial_marking(Marking({{"source", 1}}));
+    net.set_final_marking(Marking({{"sink", 1}}));
+    return net;
+}
+
+// Token game that looks places and arcs up by name, as the net did before it was indexed
+struct NameScanTokenGame {
+    std::vector<Place> places;
+    std::vector<Arc> arcs;
+
+    Place* get_place(const std::string& name) {
+        for (auto& place : places) {
+            if (place.name == name) {
+                return &place;
+            }
+        }
+        return nullptr;
+    }
+
+    bool can_fire(const std::string& transition) {
+        for (const auto& arc : arcs) {
+            if (arc.target == transition) {
+                Place* place = get_place(arc.source);
+                if (place && place->tokens < arc.weight) {
+                    return false;
+                }
+            }
+        }
+        return true;
+    }
+
+    void fire(const std::string& transition) {
+        for (const auto& arc : arcs) {
+            if (arc.target == transition) {
+                get_place(arc.source)->remove_tokens(arc.weight);
+            }
+            if (arc.source == transition) {
+                get_place(arc.target)->add_tokens(arc.weight);
+            }
+        }
+    }
+};
+
+TEST(IndexedPetriNet, benchmark_token_game_on_gtm_net){
+    PetriNet net = create_gtm_net();
+    std::vector<std::string> firing_sequence = {
+        "A", "C", "D", "E", "tau_0", "G", "tau_2", "H", "I", "tau_3", "tau_4", "tau_5", "tau_6",
+        "J", "tau_6", "tau_7", "tau_4", "tau_8"
+    };
+    const int repetitions = 20000;
+
+    NameScanTokenGame reference = {net.places, net.arcs};
+    auto start = std::chrono::high_resolution_clock::now();
+    for (int i = 0; i < repetitions; ++i) {
+        reference.get_place("source")->tokens = 1;
+        for (const auto& transition : firing_sequence) {
+            ASSERT_TRUE(reference.can_fire(transition));
+            reference.fire(transition);
+        }
+        reference.get_place("sink")->tokens = 0;
+    }
+    auto end = std::chrono::high_resolution_clock::now();
+    double name_scan_time = std::chrono::duration<double, std::milli>(end - start).count();
+
+    std::vector<uint32_t> firing_sequence_ids;
+    for (const auto& transition : firing_sequence) {
+        firing_sequence_ids.push_back(net.get_transition_id(transition));
+    }
+    uint32_t source = net.get_place_id("source");
+    uint32_t sink = net.get_place_id("sink");
+    start = std::chrono::high_resolution_clock::now();
+    for (int i = 0; i < repetitions; ++i) {
+        net.tokens.set(source, 1);
+        for (uint32_t transition : firing_sequence_ids) {
+            ASSERT_TRUE(net.can_fire(transition));
+            net.fire_transition(transition, nullptr, nullptr);
+        }
+        net.tokens.set(sink, 0);
+    }
+    end = std::chrono::high_resolution_clock::now();
+    double indexed_time = std::chrono::duration<double, std::milli>(end - start).count();
+
+    // Both token games end in the empty marking
+    EXPECT_EQ(net.number_of_tokens(), 0);
+    for (const auto& place : reference.places) {
+        EXPECT_EQ(place.tokens, 0);
+    }
+
+    std::cout << "Token game on GTM net (" << repetitions << " runs): name scan " << name_scan_time
+              << " ms, indexed " << indexed_time << " ms, speedup " << name_scan_time / indexed_time << "x" << std::endl;
+}
+
+TEST(IndexedPetriNet, benchmark_replay_on_gtm_net){
+    PetriNet net = create_gtm_net();
+    std::vector<std::string> variants = {
+        "ABDEGHIJ", "ACDEGIHJ", "ACDEGHIJ", "ACEDHIJ", "ABDEHIJ", "ABEDIHJ", "ABEDHIJ", "ACDEIHJ",
+        "ABEFEDHIJ", "ACEDGIHJ", "ACEDIHJ", "ACDEHIJ", "ACDEFEGIHJ", "ACEDFEFEGHIJ", "ACDEGHIJ", "ABDEFEHIJ"
+    };
+    std::vector<std::string> trace_list;
+    for (int i = 0; i < 50; ++i) {
+        trace_list.insert(trace_list.end(), variants.begin(), variants.end());
+    }
+    EventLog eventlog = EventLog::from_trace_list(trace_list);
+
+    const int repetitions = 50;
+    double fitness = 0.0;
+    double precision = 0.0;
+
+    auto start = std::chrono::high_resolution_clock::now();
+    for (int i = 0; i < repetitions; ++i) {
+        fitness = calculate_fitness(eventlog, net, false, false);
+    }
+    auto end = std::chrono::high_resolution_clock::now();
+    double fitness_time = std::chrono::duration<double, std::milli>(end - start).count() / repetitions;
+
+    start = std::chrono::high_resolution_clock::now();
+    for (int i = 0; i < repetitions; ++i) {
+        precision = calculate_precision(eventlog, net);
+    }
+    end = std::chrono::high_resolution_clock::now();
+    double precision_time = std::chrono::duration<double, std::milli>(end - start).count() / repetitions;
+
+    EXPECT_GT(fitness, 0.9);
+    EXPECT_LE(fitness, 1.0);
+    EXPECT_GT(precision, 0.0);
+    EXPECT_LE(precision, 1.0);
+
+    std::cout << "Replay on GTM net (" << trace_list.size() << " traces): fitness " << fitness_time
+              << " ms, precision " << precision_time << " ms" << std::endl;
+}
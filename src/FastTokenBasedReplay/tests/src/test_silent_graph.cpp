@@ -105,6 +105,57 @@ TEST(new_silent_transition_finding, test1){
 
 }
 
+TEST(SilentGraph, shortest_paths_prefer_fewer_transitions_and_find_silent_cycles) {
+    PetriNet net;
+    for (const auto& name : {"p1", "p2", "p3", "p4"}) {
+        net.add_place(Place(name, 0));
+    }
+    // p1 -> p2 -> p3 -> p4 and the shortcut p1 -> p3, tau_back leads from p4 back to p1
+    std::vector<std::tuple<std::string, std::string, std::string>> silent_arcs = {
+        {"p1", "tau_1", "p2"}, {"p2", "tau_2", "p3"}, {"p3", "tau_3", "p4"}, {"p1", "tau_short", "p3"}, {"p4", "tau_back", "p1"}
+    };
+    for (const auto& [source, transition, target] : silent_arcs) {
+        net.add_transition(Transition(transition));
+        net.add_arc(Arc(source, transition));
+        net.add_arc(Arc(transition, target));
+    }
+
+    auto shortest_paths = get_places_shortest_path_by_hidden(net, 50);
+    EXPECT_EQ(shortest_paths["p1"]["p2"], std::vector<std::string>({"tau_1"}));
+    EXPECT_EQ(shortest_paths["p1"]["p4"], std::vector<std::string>({"tau_short", "tau_3"}));
+    EXPECT_EQ(shortest_paths["p1"]["p1"], std::vector<std::string>({"tau_short", "tau_3", "tau_back"}));
+    EXPECT_EQ(shortest_paths["p2"]["p1"], std::vector<std::string>({"tau_2", "tau_3", "tau_back"}));
+
+    // The depth limit bounds the number of transitions of a path
+    auto bounded_paths = get_places_shortest_path_by_hidden(net, 0);
+    EXPECT_EQ(bounded_paths["p1"].count("p3"), 1);
+    EXPECT_EQ(bounded_paths["p1"].count("p4"), 0);
+}
+
+TEST(SilentGraph, silent_firing_sequences_are_cached_per_net) {
+    PetriNet net;
+    net.add_place(Place("p1", 0));
+    net.add_place(Place("p2", 0));
+    net.add_transition(Transition("tau_1"));
+    net.add_arc(Arc("p1", "tau_1"));
+    net.add_arc(Arc("tau_1", "p2"));
+
+    PetriNet net_copy = net;
+    auto sequences = get_silent_firing_sequences(net, net_copy);
+    EXPECT_EQ(net.silent_firing_sequences, sequences);
+    EXPECT_TRUE(net_copy.frozen);
+    PetriNet second_copy = net;
+    EXPECT_EQ(get_silent_firing_sequences(net, second_copy), sequences);
+
+    // Changing the net discards the cached sequences
+    net.add_transition(Transition("tau_2"));
+    net.add_arc(Arc("p2", "tau_2"));
+    net.add_arc(Arc("tau_2", "p1"));
+    EXPECT_EQ(net.silent_firing_sequences, nullptr);
+    PetriNet changed_copy = net;
+    EXPECT_EQ(get_silent_firing_sequences(net, changed_copy)->at("p2").at("p1"), std::vector<std::string>({"tau_2"}));
+}
+
 
 class GraphTest : public ::testing::Test {
     protected:
@@ -0,0 +1,71 @@
+#include "PetriNet.hpp"
+#include "Eventlog.hpp"
+#include "token_based_replay.cpp"
+#include "precision.cpp"
+
+#include "gtest/gtest.h"
+
+
+PetriNet create_net_with_choice_and_loop() {
+    PetriNet net;
+    net.add_place(Place("start", 0));
+    net.add_place(Place("p1", 0));
+    net.add_place(Place("end", 0));
+
+    net.add_transition(Transition("A"));
+    net.add_transition(Transition("B"));
+    net.add_transition(Transition("C"));
+    net.add_transition(Transition("tau_1"));
+
+    net.add_arc(Arc("start", "A"));
+    net.add_arc(Arc("A", "p1"));
+    net.add_arc(Arc("p1", "B"));
+    net.add_arc(Arc("B", "p1"));
+    net.add_arc(Arc("p1", "C"));
+    net.add_arc(Arc("C", "end"));
+    net.add_arc(Arc("p1", "tau_1"));
+    net.add_arc(Arc("tau_1", "end"));
+
+    net.set_initial_marking(Marking({{"start", 1}}));
+    net.set_final_marking(Marking({{"end", 1}}));
+    return net;
+}
+
+EventLog create_variant_log(const std::vector<std::vector<uint32_t>>& variants, const std::vector<uint32_t>& frequencies) {
+    EventLog log;
+    log.set_activities({"A", "B", "C"});
+    for (size_t i = 0; i < variants.size(); ++i) {
+        log.add_variant(variants[i], frequencies[i]);
+    }
+    return log;
+}
+
+TEST(VariantLog, add_variant_decodes_activities){
+    EventLog log = create_variant_log({{0, 1, 2}, {0, 2}}, {3, 1});
+
+    EXPECT_TRUE(log.is_variant_log());
+    EXPECT_EQ(log.traces.size(), 2);
+    EXPECT_EQ(log.traces[0].events[1].activity, "B");
+    EXPECT_EQ(log.get_frequency(0), 3);
+    EXPECT_EQ(log.get_frequency(1), 1);
+    EXPECT_THROW(log.add_variant({3}, 1), std::runtime_error);
+}
+
+TEST(VariantLog, fitness_and_precision_match_the_expanded_log){
+    PetriNet net = create_net_with_choice_and_loop();
+    EventLog variant_log = create_variant_log({{0, 1, 2}, {0, 2, 1}, {1, 2}, {0}}, {3, 2, 1, 4});
+    EventLog expanded_log = EventLog::from_trace_list({"ABC", "ACB", "ABC", "BC", "A", "ACB", "A", "ABC", "A", "A"});
+
+    for (bool prefix_caching : {false, true}) {
+        for (bool suffix_caching : {false, true}) {
+            if (prefix_caching && suffix_caching) {
+                continue;
+            }
+            EXPECT_DOUBLE_EQ(
+                calculate_fitness(variant_log, net, prefix_caching, suffix_caching),
+                calculate_fitness(expanded_log, net, prefix_caching, suffix_caching)
+            );
+        }
+    }
+    EXPECT_DOUBLE_EQ(calculate_precision(variant_log, net), calculate_precision(expanded_log, net));
+}
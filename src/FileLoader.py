@@ -1,5 +1,6 @@
 from src.PetriNet import PetriNet
 from src.EventLog import EventLog
+from src.EventLogCache import EventLogCache
 import os
 from multiprocessing import Pool
 
@@ -36,12 +37,25 @@ class FileLoader:
         return name_without_ext, pn
 
     @staticmethod
-    def load_eventlog(file_path: str):
+    def load_eventlog(file_path: str, streaming: bool = True, activity_only: bool = False, timestamps: bool = True, cache: bool = True):
         """
         Helper function to load a single EventLog object from a file.
         Extracts the ID and returns a tuple of (id, EventLog object).
+        By default the XES file is parsed trace by trace (see EventLog.load_xes_streaming);
+        activity_only and timestamps restrict the attributes that are kept.
+        The cache is on by default: the parsed log is kept in a binary sidecar file (see EventLogCache)
+        under ~/.cache/gtm/eventlogs, or EVENTLOG_CACHE_DIR if set, which is used instead of the XES file
+        as long as the file does not change. It is turned off by cache=False or by setting EVENTLOG_CACHE=0.
         """
-        el = EventLog.load_xes(file_path)
+        cache = cache and EventLogCache.enabled()
+        el = EventLogCache.load(file_path, activity_only=activity_only, timestamps=timestamps) if cache else None
+        if el is None:
+            if streaming:
+                el = EventLog.load_xes_streaming(file_path, activity_only=activity_only, timestamps=timestamps)
+            else:
+                el = EventLog.load_xes(file_path)
+            if cache:
+                EventLogCache.store(file_path, el, activity_only=activity_only, timestamps=timestamps)
         filename = os.path.basename(file_path)
         name_without_ext = os.path.splitext(filename)[0]
         el.set_eventlog_name(name_without_ext)
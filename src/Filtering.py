@@ -1,5 +1,5 @@
 from src.EventLog import EventLog, Trace
-from copy import deepcopy
+from typing import List, Optional
 import random
 class Filtering:
     def __init__():
@@ -27,73 +27,45 @@ class Filtering:
         if percentage > 1:
             percentage = percentage / 100.0
 
-        # Dictionary to count frequency of each trace variant
-        trace_freq = {}
-        trace_map = {}
-        for trace in eventlog.traces:
-            trace_str = tuple(event.activity for event in trace.events)
-            trace_freq[trace_str] = trace_freq.get(trace_str, 0) + 1
-            if trace_freq[trace_str] == 1:
-                trace_map[trace_str] = trace
-
-        # Sort the signatures by frequency in descending order.
-        sorted_traces = sorted(trace_freq.keys(), key=lambda k: trace_freq[k], reverse=True)
-        total_unique = len(sorted_traces)
+        total_unique = len(eventlog.get_index().variants_by_frequency)
         num_to_keep = max(1, int(round(percentage * total_unique)))
-        
-        # Build the filtered event log by including traces with a signature in top_signatures.
-        filtered_log = EventLog()
-        top_n_traces = sorted_traces[:num_to_keep]
-        for trace_str in top_n_traces:
-            filtered_log.traces.append(trace_map[trace_str])
-        
-        # If include_all_activities is True, add all activities to the filtered log.
-        if include_all_activities:
-            all_activities = eventlog.unique_activities()
-            filtered_log_activities = filtered_log.unique_activities()
-            missing_activities = all_activities - filtered_log_activities
-            for activity in missing_activities:
-                for trace_str in sorted_traces[num_to_keep:]:
-                    if activity in trace_str:
-                        filtered_log.traces.append(trace_map[trace_str])
-                        break
-        
-        filtered_log.set_unique_activities(filtered_log.unique_activities())
-        filtered_log.set_eventlog_name(eventlog.name)
-        return filtered_log
+        return Filtering._filter_eventlog_by_top_variants(eventlog, num_to_keep, include_all_activities)
     
     @staticmethod
     def filter_eventlog_by_top_n_unique(eventlog: EventLog, top_n: int, include_all_activities: bool) -> EventLog:
-        # Dictionary to count frequency of each trace variant
-        trace_freq = {}
-        trace_map = {}
-        for trace in eventlog.traces:
-            trace_str = tuple(event.activity for event in trace.events)
-            trace_freq[trace_str] = trace_freq.get(trace_str, 0) + 1
-            if trace_freq[trace_str] == 1:
-                trace_map[trace_str] = trace
+        return Filtering._filter_eventlog_by_top_variants(eventlog, top_n, include_all_activities)
+
+    @staticmethod
+    def _filter_eventlog_by_top_variants(eventlog: EventLog, num_to_keep: int, include_all_activities: bool) -> EventLog:
+        """
+        Builds an event log of the first traces of the num_to_keep most frequent variants.
+        With include_all_activities, for every activity that is missing the first trace of the most frequent
+        remaining variant containing it is added.
+        """
+        index = eventlog.get_index()
+        sorted_variants = index.variants_by_frequency
+
+        # Build the filtered event log by including the first trace of the top variants.
+        kept_traces = [index.first_trace(variant_idx) for variant_idx in sorted_variants[:num_to_keep]]
+        filtered_log_activities = index.activities_of_traces(kept_traces)
 
-        # Sort the signatures by frequency in descending order.
-        sorted_traces = sorted(trace_freq.keys(), key=lambda k: trace_freq[k], reverse=True)
-        
-        # Build the filtered event log by including traces with a signature in top_signatures.
-        filtered_log = EventLog()
-        top_n_traces = sorted_traces[:top_n]
-        for trace_str in top_n_traces:
-            filtered_log.traces.append(trace_map[trace_str])
-        
         # If include_all_activities is True, add all activities to the filtered log.
         if include_all_activities:
+            # The position of every variant in the frequency order
+            ranks = [0] * len(sorted_variants)
+            for rank, variant_idx in enumerate(sorted_variants):
+                ranks[variant_idx] = rank
             all_activities = eventlog.unique_activities()
-            filtered_log_activities = filtered_log.unique_activities()
             missing_activities = all_activities - filtered_log_activities
             for activity in missing_activities:
-                for trace_str in sorted_traces[top_n:]:
-                    if activity in trace_str:
-                        filtered_log.traces.append(trace_map[trace_str])
-                        break
-        
-        filtered_log.set_unique_activities(filtered_log.unique_activities())
+                remaining_ranks = [ranks[variant_idx] for variant_idx in index.activity_variants.get(activity, ()) if ranks[variant_idx] >= num_to_keep]
+                if remaining_ranks:
+                    kept_traces.append(index.first_trace(sorted_variants[min(remaining_ranks)]))
+            filtered_log_activities = index.activities_of_traces(kept_traces)
+
+        filtered_log = EventLog()
+        filtered_log.traces = [eventlog.traces[trace_idx] for trace_idx in kept_traces]
+        filtered_log.set_unique_activities(filtered_log_activities)
         filtered_log.set_eventlog_name(eventlog.name)
         return filtered_log
     
@@ -117,34 +89,24 @@ class Filtering:
         if percentage > 1:
             percentage = percentage / 100.0
 
-        # Count frequency of each unique trace signature
-        signature_freq = {}
-        for trace in eventlog.traces:
-            signature = tuple(event.activity for event in trace.events)
-            signature_freq[signature] = signature_freq.get(signature, 0) + 1
-
-        # Sort traces by total frequency (descending)
-        sorted_signatures = sorted(signature_freq.items(), key=lambda x: x[1], reverse=True)
+        index = eventlog.get_index()
 
         # Compute total number of traces in the original event log
         total_traces = len(eventlog.traces)
         num_to_keep = int(round(percentage * total_traces))
 
-        # Select traces until we reach the required total count
+        # Select the traces of the most frequent variants until we reach the required total count
         filtered_log = EventLog()
-        kept_traces = 0
-        for signature, freq in sorted_signatures:
-            for trace in eventlog.traces:
-                if kept_traces >= num_to_keep:
-                    return filtered_log  # Stop early if we reach 50%
-                if tuple(event.activity for event in trace.events) == signature:
-                    filtered_log.traces.append(trace)
-                    kept_traces += 1
+        for variant_idx in index.variants_by_frequency:
+            remaining = num_to_keep - len(filtered_log.traces)
+            if remaining <= 0:
+                break
+            filtered_log.traces.extend(eventlog.traces[trace_idx] for trace_idx in index.variant_traces[variant_idx][:remaining])
 
         return filtered_log
 
     @staticmethod
-    def filter_eventlog_random(eventlog: EventLog, percentage: float, include_all_activities: bool) -> EventLog:
+    def filter_eventlog_random(eventlog: EventLog, percentage: float, include_all_activities: bool, rng: Optional[random.Random] = None) -> EventLog:
         """
         Filters an event log to include a random subset of traces.
         
@@ -155,12 +117,26 @@ class Filtering:
         percentage : float
             The percentage of traces to keep. It can be a fraction (e.g., 0.2 for 20%)
             or a percentage greater than 1 (e.g., 20 for 20%).
+        rng : random.Random, optional
+            The random stream to sample from, the random module by default.
         
         Returns:
         --------
         EventLog
             A new EventLog containing a random subset of traces.
         """
+        selected_traces = Filtering.sample_trace_indices(eventlog, percentage, include_all_activities, rng)
+        
+        # Build the filtered event log.
+        filtered_log = EventLog()
+        filtered_log.traces = [eventlog.traces[trace_idx] for trace_idx in selected_traces]
+        return filtered_log
+
+    @staticmethod
+    def sample_trace_indices(eventlog: EventLog, percentage: float, include_all_activities: bool, rng: Optional[random.Random] = None) -> List[int]:
+        """
+        Returns the indices of the traces filter_eventlog_random keeps, in the same order.
+        """
         # Convert percentage if provided as a value greater than 1.
         if percentage > 1:
             percentage = percentage / 100.0
@@ -169,22 +145,19 @@ class Filtering:
         # Ensure at least one trace is kept.
         num_to_keep = max(1, int(round(percentage * total_traces)))
         
-        # Randomly sample the desired number of traces.
-        selected_traces = random.sample(eventlog.traces, num_to_keep)
+        # Randomly sample the desired number of traces. Sampling the indices draws the same traces as sampling the traces.
+        index = eventlog.get_index()
+        selected_traces = (rng or random).sample(range(total_traces), num_to_keep)
         
-        # Build the filtered event log.
-        filtered_log = EventLog()
-        filtered_log.traces = selected_traces
-        
-        # If include_all_activities is True, add all activities to the filtered log.
+        # If include_all_activities is True, add all activities to the selected traces.
         if include_all_activities:
             all_activities = eventlog.unique_activities()
-            filtered_log_activities = filtered_log.unique_activities()
-            for activity in all_activities:
+            filtered_log_activities = index.activities_of_traces(selected_traces)
+            for activity in sorted(all_activities):
                 if activity not in filtered_log_activities:
-                    for trace in eventlog.traces:
-                        if activity in [event.activity for event in trace.events]:
-                            filtered_log.traces.append(trace)
-                            break
+                    # The variants are numbered in the order of their first trace
+                    variants = index.activity_variants.get(activity)
+                    if variants:
+                        selected_traces.append(index.first_trace(variants[0]))
         
-        return filtered_log
+        return selected_traces
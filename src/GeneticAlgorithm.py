@@ -1,18 +1,29 @@
 from src.Objective import Objective
-from src.RandomTreeGenerator import BottomUpRandomBinaryGenerator, FootprintGuidedSequentialGenerator, InductiveNoiseInjectionGenerator, InductiveMinerGenerator
+from src.RandomTreeGenerator import BottomUpRandomBinaryGenerator, FootprintGuidedSequentialGenerator, InductiveNoiseInjectionGenerator, InductiveMinerGenerator, InductiveCutGenerator
 from src.ProcessTree import ProcessTree
 from src.EventLog import EventLog
 from src.Mutator import Mutator, TournamentMutator
 from src.Population import Population
 from src.Monitor import Monitor
 from src.Filtering import Filtering
+from src.RandomStreams import RandomStreams
+from src.StageTimer import StageTimer
 from src.utils import calculate_percentage_of_log
 import tqdm
 import time
-from typing import Union
+from typing import List, Optional, Tuple, Union
 import os
+import random
 import time
+import traceback
+from multiprocessing import Pipe, Process
 from src.utils import calculate_percentage_of_log
+
+# Migration topologies of the island model
+MIGRATION_TOPOLOGIES = ("ring", "fully_connected", "random")
+# Seconds an island gets to stop at the end of a run before it is terminated
+ISLAND_SHUTDOWN_TIMEOUT = 10
+
 class GeneticAlgorithm:
     def __init__(self, method_name):
         self.method_name = method_name
@@ -20,6 +31,9 @@ class GeneticAlgorithm:
         self.start_time = None
         self.best_tree = None
         self.monitor = Monitor()
+        # The random streams of a seeded run, see `run`
+        self.random_streams = None
+        self.rng = None
         
     def _check_stopping_criteria(self, generation: int, population: Population, stagnation_limit: int, time_limit: int, min_fitness: float) -> bool:
         # Update the best tree
@@ -63,7 +77,7 @@ class GeneticAlgorithm:
             eventlog: EventLog,
             population_size: int,
             mutator: Union[Mutator, TournamentMutator], 
-            generator: Union[BottomUpRandomBinaryGenerator, FootprintGuidedSequentialGenerator, InductiveNoiseInjectionGenerator, InductiveMinerGenerator],
+            generator: Union[BottomUpRandomBinaryGenerator, FootprintGuidedSequentialGenerator, InductiveNoiseInjectionGenerator, InductiveMinerGenerator, InductiveCutGenerator],
             objective: Objective,
             percentage_of_log: float,
             max_generations: int,
@@ -72,29 +86,72 @@ class GeneticAlgorithm:
             time_limit: int, # Time limit in seconds
             export_monitor_path: str,
             export_decomposed_objective_function_path: str,
+            n_workers: int = None,
+            islands: int = None,
+            migration_interval: int = 10,
+            migration_size: int = 1,
+            migration_topology: str = "ring",
+            seed: int = None,
         ) -> ProcessTree:
+        """
+        Runs the genetic algorithm and returns the best tree found.
+        With `islands` > 1, the island model is used (see `_run_islands`).
+        With a `seed`, the mutator, the generator, the island model and every island draw from their own
+        random streams derived from the seed (see `RandomStreams`), so the run can be reproduced.
+        Without a seed, they draw from the random module.
+        With GA_STAGE_TIMING=1 in the environment, the wall time of the stages of the run is recorded per
+        generation in `self.monitor.stage_timer` and saved next to the monitor results.
+        With `export_monitor_path`, the summary of every generation and the population snapshots of the monitor are
+        written to CSV files next to the monitor results while the run goes on (see `Monitor.start_run_log`).
+        """
         # Start the timer
         self.start_time = time.time()
+        stage_timer = self.monitor.stage_timer
+        objective.set_stage_timer(stage_timer)
+        mutator.set_stage_timer(stage_timer)
+        
+        if seed is not None:
+            self.random_streams = RandomStreams(seed)
+            self.rng = self.random_streams.python()
+            mutator.set_rng(self.random_streams.python())
+            generator.set_rng(self.random_streams.python())
         
         # Filter the log
-        if percentage_of_log is None:
-            percentage_of_log = calculate_percentage_of_log(eventlog.get_num_unique_traces())
-        filtered_eventlog = Filtering.filter_eventlog_by_top_percentage_unique(eventlog, percentage_of_log, True)
+        with stage_timer.stage("filtering"):
+            if percentage_of_log is None:
+                percentage_of_log = calculate_percentage_of_log(eventlog.get_num_unique_traces())
+            filtered_eventlog = Filtering.filter_eventlog_by_top_percentage_unique(eventlog, percentage_of_log, True)
         
         objective.set_event_log(filtered_eventlog)
         mutator.set_event_log(filtered_eventlog)
         
-        # Generate initial population
-        if isinstance(generator, BottomUpRandomBinaryGenerator):
-            population = generator.generate_population(filtered_eventlog.unique_activities(), n=population_size)
-        elif isinstance(generator, FootprintGuidedSequentialGenerator):
-            population = generator.generate_population(filtered_eventlog, n=population_size)
-        elif isinstance(generator, InductiveNoiseInjectionGenerator):
-            population = generator.generate_population(filtered_eventlog, n=population_size)
-        elif isinstance(generator, InductiveMinerGenerator):
-            population = generator.generate_population(eventlog, n=population_size)
-        else:
-            raise ValueError("Invalid generator type. Must be one of: BottomUpRandomBinaryGenerator, FootprintGuidedSequentialGenerator, InductiveNoiseInjectionGenerator, InductiveMinerGenerator.")
+        # The summaries and snapshots of the generations are streamed next to the monitor results
+        if export_monitor_path is not None:
+            self.monitor.start_run_log(self.monitor.run_path(export_monitor_path, filtered_eventlog.name, self.method_name))
+        
+        try:
+            if islands is not None and islands > 1:
+                self._run_islands(eventlog, filtered_eventlog, population_size, mutator, generator, objective, max_generations, min_fitness,
+                                  stagnation_limit, time_limit, n_workers, islands, migration_interval, migration_size, migration_topology)
+            else:
+                self._run_single_population(eventlog, filtered_eventlog, population_size, mutator, generator, objective, max_generations, min_fitness,
+                                            stagnation_limit, time_limit, n_workers)
+        finally:
+            self.monitor.close_run_log()
+        
+        if export_monitor_path is not None:
+            self.monitor.save_objective_results(export_monitor_path, filtered_eventlog.name, self.method_name)
+            
+        if export_decomposed_objective_function_path is not None:
+            self.monitor.save_decomposed_objective_fitness(export_decomposed_objective_function_path, filtered_eventlog.name, objective)
+        
+        return self.best_tree
+    
+    def _run_single_population(self, eventlog: EventLog, filtered_eventlog: EventLog, population_size: int, mutator: Union[Mutator, TournamentMutator],
+                               generator, objective: Objective, max_generations: int, min_fitness: float, stagnation_limit: int, time_limit: int, n_workers: int):
+        stage_timer = self.monitor.stage_timer
+        with stage_timer.stage("initial_population"):
+            population = generate_initial_population(generator, eventlog, filtered_eventlog, population_size, n_workers)
         
         if max_generations is not None:
             iterator = tqdm.tqdm(range(max_generations), desc="Discovering process tree", unit="generation")
@@ -107,26 +164,260 @@ class GeneticAlgorithm:
             iterator = while_true_iterator()
         
         
-        for generation in iterator:   
-            # Evaluate the fitness of each tree
-            objective.evaluate_population(population, self.start_time, time_limit)
-            
-            # Observe the population
-            self.monitor.observe(generation, population)
-            
-            # check stopping criteria
-            stop = self._check_stopping_criteria(generation, population, stagnation_limit, time_limit, min_fitness)
-            if stop:
-                break
-               
-            # Generate a new population
-            population = mutator.generate_new_population(population)
+        # Evaluate the population in a persistent pool of worker processes
+        if n_workers is not None and n_workers > 1:
+            objective.start_worker_pool(n_workers)
         
-        if export_monitor_path is not None:
-            self.monitor.save_objective_results(export_monitor_path, filtered_eventlog.name, self.method_name)
-            
-        if export_decomposed_objective_function_path is not None:
-            self.monitor.save_decomposed_objective_fitness(export_decomposed_objective_function_path, filtered_eventlog.name, objective)
+        try:
+            for generation in iterator:   
+                stage_timer.set_generation(generation)
+                
+                # Evaluate the fitness of each tree
+                with stage_timer.stage("evaluation"):
+                    objective.evaluate_population(population, self.start_time, time_limit)
+                
+                # The bounded evaluation of the next generation stops replaying trees that cannot get into this elite
+                if objective.bounded:
+                    objective.elite_threshold = elite_threshold(population, mutator)
+                
+                # Observe the population
+                self.monitor.observe(generation, population, objective.register)
+                
+                # check stopping criteria
+                stop = self._check_stopping_criteria(generation, population, stagnation_limit, time_limit, min_fitness)
+                if stop:
+                    break
+                   
+                # Generate a new population
+                with stage_timer.stage("new_population"):
+                    population = mutator.generate_new_population(population)
+        finally:
+            objective.close_worker_pool()
+    
+    def _run_islands(self, eventlog: EventLog, filtered_eventlog: EventLog, population_size: int, mutator: Union[Mutator, TournamentMutator],
+                     generator, objective: Objective, max_generations: int, min_fitness: float, stagnation_limit: int, time_limit: int, n_workers: int,
+                     islands: int, migration_interval: int, migration_size: int, migration_topology: str):
+        """
+        Island model: every island evolves its own population of `population_size` trees in a separate process.
+        The islands run in epochs of `migration_interval` generations. After every epoch, each island sends its
+        `migration_size` best trees (as strings with their fitness) to its neighbours in the `migration_topology`,
+        where they replace the worst trees. The stopping criteria are checked on the best tree over all islands.
+        """
+        if migration_topology not in MIGRATION_TOPOLOGIES:
+            raise ValueError(f"Invalid migration topology: {migration_topology}. Must be one of: {', '.join(MIGRATION_TOPOLOGIES)}.")
+        if migration_interval < 1:
+            raise ValueError("The migration interval must be at least 1")
         
-        return self.best_tree
-    
\ No newline at end of file
+        # Every island gets its own random streams, derived from the seed or the current state of `random`
+        if self.random_streams is not None:
+            island_streams = self.random_streams.spawn(islands)
+        else:
+            island_streams = [RandomStreams(random.getrandbits(64)) for _ in range(islands)]
+        connections = []
+        processes = []
+        for streams in island_streams:
+            connection, island_connection = Pipe()
+            process = Process(
+                target=_island_process,
+                args=(island_connection, streams, eventlog, filtered_eventlog, population_size, mutator, generator,
+                      objective.metric_weights, objective.register.max_size, objective.n_threads, objective.bounded, objective.batch_size, n_workers, migration_size,
+                      self.start_time, time_limit, self.monitor.stage_timer.enabled),
+            )
+            process.start()
+            # Only the island holds its end, so the master gets an EOF if the island dies
+            island_connection.close()
+            connections.append(connection)
+            processes.append(process)
+        
+        progress = tqdm.tqdm(total=max_generations, desc="Discovering process tree", unit="generation") if max_generations is not None else None
+        immigrants = [[] for _ in range(islands)]
+        generation = 0
+        try:
+            stop = False
+            while not stop and (max_generations is None or generation < max_generations):
+                epoch_length = migration_interval if max_generations is None else min(migration_interval, max_generations - generation)
+                for island, connection in enumerate(connections):
+                    _send_to_island(connection, (epoch_length, immigrants[island]))
+                results = [_receive_from_island(connection) for connection in connections]
+                
+                # The stage timings of the islands add up
+                for _, _, stage_records in results:
+                    self.monitor.stage_timer.merge(stage_records)
+                
+                # Observe the best trees of all islands, generation by generation
+                for epoch_generation in range(epoch_length):
+                    best_trees = []
+                    for history, _, _ in results:
+                        tree_str, fitness = history[epoch_generation]
+                        best_tree = ProcessTree.from_string(tree_str)
+                        best_tree.set_fitness(fitness)
+                        best_trees.append(best_tree)
+                    population = Population(best_trees)
+                    self.monitor.observe(generation, population)
+                    if progress is not None:
+                        progress.update(1)
+                    
+                    stop = self._check_stopping_criteria(generation, population, stagnation_limit, time_limit, min_fitness)
+                    generation += 1
+                    if stop:
+                        break
+                
+                # Send the elite of every island to its neighbours
+                immigrants = [[] for _ in range(islands)]
+                for island, targets in enumerate(migration_targets(migration_topology, islands, self.rng)):
+                    for target in targets:
+                        immigrants[target].extend(results[island][1])
+        finally:
+            if progress is not None:
+                progress.close()
+            # Islands that failed are already gone, the others are stopped and terminated if they do not stop in time
+            for connection, process in zip(connections, processes):
+                if process.is_alive():
+                    try:
+                        connection.send(None)
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass
+            for connection, process in zip(connections, processes):
+                process.join(ISLAND_SHUTDOWN_TIMEOUT)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+                connection.close()
+
+
+def generate_initial_population(generator, eventlog: EventLog, filtered_eventlog: EventLog, population_size: int, n_workers: int = None) -> Population:
+    if isinstance(generator, BottomUpRandomBinaryGenerator):
+        return generator.generate_population(filtered_eventlog.unique_activities(), n=population_size)
+    elif isinstance(generator, FootprintGuidedSequentialGenerator):
+        return generator.generate_population(filtered_eventlog, n=population_size)
+    elif isinstance(generator, InductiveNoiseInjectionGenerator):
+        return generator.generate_population(filtered_eventlog, n=population_size, n_workers=n_workers)
+    elif isinstance(generator, InductiveMinerGenerator):
+        return generator.generate_population(eventlog, n=population_size)
+    elif isinstance(generator, InductiveCutGenerator):
+        return generator.generate_population(filtered_eventlog, n=population_size)
+    else:
+        raise ValueError("Invalid generator type. Must be one of: BottomUpRandomBinaryGenerator, FootprintGuidedSequentialGenerator, InductiveNoiseInjectionGenerator, InductiveMinerGenerator, InductiveCutGenerator.")
+
+def elite_threshold(population: Population, mutator: Union[Mutator, TournamentMutator]) -> float:
+    """
+    Returns the fitness of the worst tree the mutator keeps as elite in the next generation.
+    """
+    elite_count = max(1, int(mutator.elite_rate * len(population)))
+    return population.get_best_trees(elite_count)[-1].get_fitness()
+
+def migration_targets(topology: str, islands: int, rng: Optional[random.Random] = None) -> List[List[int]]:
+    """
+    Returns for every island the islands it sends its elite to.
+    The random topology draws from `rng`, the random module by default.
+    """
+    if topology == "ring":
+        return [[(island + 1) % islands] for island in range(islands)]
+    elif topology == "fully_connected":
+        return [[target for target in range(islands) if target != island] for island in range(islands)]
+    elif topology == "random":
+        return [[(rng or random).choice([target for target in range(islands) if target != island])] for island in range(islands)]
+    raise ValueError(f"Invalid migration topology: {topology}. Must be one of: {', '.join(MIGRATION_TOPOLOGIES)}.")
+
+def _replace_worst_trees(population: Population, immigrants: List[Tuple[str, float]]) -> Population:
+    """
+    Replaces the worst trees of an evaluated population with the immigrants.
+    """
+    immigrants = immigrants[:len(population)]
+    trees = sorted(population.get_population(), key=lambda tree: (tree.get_fitness() is not None, tree.get_fitness()))
+    for i, (tree_str, fitness) in enumerate(immigrants):
+        tree = ProcessTree.from_string(tree_str)
+        tree.set_fitness(fitness)
+        trees[i] = tree
+    return Population(trees)
+
+def _send_to_island(connection, message):
+    """
+    Sends a message to an island, raising the error of the island if it already stopped.
+    """
+    try:
+        connection.send(message)
+    except (BrokenPipeError, ConnectionResetError):
+        _receive_from_island(connection)
+        raise
+
+def _receive_from_island(connection):
+    """
+    Returns the answer of an island, raising a RuntimeError if the island failed or died.
+    """
+    try:
+        status, payload = connection.recv()
+    except EOFError:
+        raise RuntimeError("An island process stopped without answering") from None
+    if status == "error":
+        raise RuntimeError(f"An island process failed:\n{payload}")
+    return payload
+
+def _island_process(connection, streams: RandomStreams, eventlog: EventLog, filtered_eventlog: EventLog, population_size: int, mutator: Union[Mutator, TournamentMutator],
+                    generator, metric_weights: dict, cache_size: int, n_threads: int, bounded: bool, batch_size: int, n_workers: int, migration_size: int,
+                    start_time: float, time_limit: int, stage_timing: bool):
+    """
+    Evolves the population of one island. The island waits for (number of generations, immigrants) messages,
+    runs the generations and answers with the best tree of every generation, its elite and the stage timings
+    of these generations; None stops the island.
+    Every answer is a ("result", answer) pair, an exception is sent back as an ("error", traceback) pair and stops the island.
+    """
+    try:
+        _evolve_island(connection, streams, eventlog, filtered_eventlog, population_size, mutator, generator, metric_weights, cache_size,
+                       n_threads, bounded, batch_size, n_workers, migration_size, start_time, time_limit, stage_timing)
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+    finally:
+        connection.close()
+
+def _evolve_island(connection, streams: RandomStreams, eventlog: EventLog, filtered_eventlog: EventLog, population_size: int, mutator: Union[Mutator, TournamentMutator],
+                   generator, metric_weights: dict, cache_size: int, n_threads: int, bounded: bool, batch_size: int, n_workers: int, migration_size: int,
+                   start_time: float, time_limit: int, stage_timing: bool):
+    mutator.set_rng(streams.python())
+    generator.set_rng(streams.python())
+    stage_timer = StageTimer(stage_timing)
+    objective = Objective(metric_weights, cache_size=cache_size, n_threads=n_threads, bounded=bounded, batch_size=batch_size)
+    objective.set_event_log(filtered_eventlog)
+    objective.set_stage_timer(stage_timer)
+    mutator.set_event_log(filtered_eventlog)
+    mutator.set_stage_timer(stage_timer)
+    with stage_timer.stage("initial_population"):
+        population = generate_initial_population(generator, eventlog, filtered_eventlog, population_size, n_workers)
+    
+    if n_workers is not None and n_workers > 1:
+        objective.start_worker_pool(n_workers)
+    
+    try:
+        evaluated = False
+        generation = 0
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            
+            generations, immigrants = message
+            history = []
+            for _ in range(generations):
+                # Like in a single population run, the new population counts to the generation it is generated from
+                if evaluated:
+                    if immigrants:
+                        population = _replace_worst_trees(population, immigrants)
+                        immigrants = []
+                    with stage_timer.stage("new_population"):
+                        population = mutator.generate_new_population(population)
+                stage_timer.set_generation(generation)
+                
+                with stage_timer.stage("evaluation"):
+                    objective.evaluate_population(population, start_time, time_limit)
+                if objective.bounded:
+                    objective.elite_threshold = elite_threshold(population, mutator)
+                evaluated = True
+                best_tree = population.get_best_tree()
+                history.append((str(best_tree), best_tree.get_fitness()))
+                generation += 1
+            
+            elite = [(str(tree), tree.get_fitness()) for tree in population.get_best_trees(min(migration_size, len(population)))]
+            connection.send(("result", (history, elite, stage_timer.records())))
+            stage_timer.clear()
+    finally:
+        objective.close_worker_pool()
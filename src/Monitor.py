@@ -2,47 +2,158 @@ from src.Population import Population
 from src.Objective import Objective
 from src.Evaluator import SingleEvaluator
 from src.PetriNet import PetriNet
+from src.ProcessTreeRegister import ProcessTreeRegister
+from src.StageTimer import StageTimer
+from typing import List, Optional, Tuple
 import matplotlib.pyplot as plt
+import numpy as np
+import csv
 import pickle
 import os
 import time
 import pandas as pd
 
 class Monitor:
-    def __init__(self):
-        self.generations = []
-        self.populations = []
+    """
+    Observes the populations of a genetic algorithm run with bounded memory.
+
+    Every generation is summarized into a row of a preallocated array (best, mean and percentiles of the fitness,
+    tree sizes, number of distinct trees, fitness cache counters), which grows by doubling. Apart from the best
+    tree of every generation, whole populations are only kept every `snapshot_interval` generations.
+    With a run log started (see `start_run_log`), the rows and the snapshots are also appended to CSV files
+    as they are observed, so a run can be followed and survives an interruption.
+    """
+    def __init__(self, percentiles: Tuple[float, ...] = (10, 25, 50, 75, 90), snapshot_interval: Optional[int] = 10, capacity: int = 256):
+        self.percentiles = tuple(percentiles)
+        self.columns = (
+            "generation", "best_fitness", "mean_fitness",
+            *(f"p{percentile:g}_fitness" for percentile in self.percentiles),
+            "population_size", "mean_tree_size", "max_tree_size", "best_tree_size", "distinct_trees",
+            "cache_hits", "cache_misses",
+        )
+        self._column_ids = {column: idx for idx, column in enumerate(self.columns)}
+        self.summaries = np.full((capacity, len(self.columns)), np.nan)
+        self.num_generations = 0
         
         self.best_trees = []
-        self.best_fitnesses = []
         
-    def observe(self, generation: int, population: Population):
+        # Full populations every `snapshot_interval` generations (none if None): generation -> Population
+        self.snapshot_interval = snapshot_interval
+        self.snapshots = {}
+        
+        # Path stem of the files of the run, see `run_path`
+        self._run_path = None
+        self._run_log = None
+        self._snapshot_log = None
+        
+        # Wall time and calls of the stages of the run per generation, if enabled with GA_STAGE_TIMING=1
+        self.stage_timer = StageTimer.from_environment()
+        
+    def column(self, name: str) -> np.ndarray:
         """
-        Observe the population and the generation
+        Returns the summary column of the observed generations.
         """
-        self.generations.append(generation)
-        self.populations.append(population)
+        return self.summaries[:self.num_generations, self._column_ids[name]]
+    
+    @property
+    def generations(self) -> List[int]:
+        return [int(generation) for generation in self.column("generation")]
+    
+    @property
+    def best_fitnesses(self) -> List[float]:
+        return self.column("best_fitness").tolist()
+    
+    @property
+    def cache_hits(self) -> List[int]:
+        return [int(hits) for hits in self.column("cache_hits") if not np.isnan(hits)]
+    
+    @property
+    def cache_misses(self) -> List[int]:
+        return [int(misses) for misses in self.column("cache_misses") if not np.isnan(misses)]
         
+    def observe(self, generation: int, population: Population, register: ProcessTreeRegister = None):
+        """
+        Observe the population and the generation, and the cumulative hit/miss counters
+        of the fitness register if one is given
+        """
+        trees = population.get_population()
         best_tree = population.get_best_tree()
         self.best_trees.append(best_tree)
-        self.best_fitnesses.append(best_tree.get_fitness())
+        
+        fitnesses = np.array([tree.get_fitness() for tree in trees if tree.get_fitness() is not None], dtype=float)
+        sizes = np.array([tree.get_size() for tree in trees], dtype=float)
+        row = [generation, best_tree.get_fitness()]
+        if len(fitnesses):
+            row.append(fitnesses.mean())
+            row.extend(np.percentile(fitnesses, self.percentiles))
+        else:
+            row.extend([np.nan] * (1 + len(self.percentiles)))
+        row.extend([len(trees), sizes.mean(), sizes.max(), best_tree.get_size(), len({str(tree) for tree in trees})])
+        row.extend([register.hits, register.misses] if register is not None else [np.nan, np.nan])
+        
+        if self.num_generations == len(self.summaries):
+            self.summaries = np.concatenate([self.summaries, np.full_like(self.summaries, np.nan)])
+        self.summaries[self.num_generations] = row
+        self.num_generations += 1
+        
+        is_snapshot = self.snapshot_interval is not None and generation % self.snapshot_interval == 0
+        if is_snapshot:
+            self.snapshots[generation] = Population(list(trees))
+        
+        if self._run_log is not None:
+            self._run_log[1].writerow(row)
+            self._run_log[0].flush()
+            if is_snapshot:
+                self._snapshot_log[1].writerows((generation, tree.get_fitness(), str(tree)) for tree in trees)
+                self._snapshot_log[0].flush()
+    
+    def run_path(self, save_dir: str, dataset_name: str, method_name: str) -> str:
+        """
+        Returns the path stem that the files of the run share, the monitor pickle is saved as `stem`.pkl.
+        It is created on the first call and reused afterwards.
+        """
+        if self._run_path is None:
+            os.makedirs(os.path.join(save_dir, dataset_name, "monitors"), exist_ok=True)
+            self._run_path = os.path.join(save_dir, dataset_name, "monitors", method_name + "_" + str(time.time()))
+        return self._run_path
+    
+    def start_run_log(self, path: str):
+        """
+        Appends the summary of every observed generation to `path`_run.csv and the snapshots of the
+        populations to `path`_populations.csv from now on.
+        """
+        self.close_run_log()
+        run_file = open(f"{path}_run.csv", "w", newline="")
+        self._run_log = (run_file, csv.writer(run_file))
+        self._run_log[1].writerow(self.columns)
+        snapshot_file = open(f"{path}_populations.csv", "w", newline="")
+        self._snapshot_log = (snapshot_file, csv.writer(snapshot_file))
+        self._snapshot_log[1].writerow(("generation", "fitness", "tree"))
+    
+    def close_run_log(self):
+        for log in (self._run_log, self._snapshot_log):
+            if log is not None:
+                log[0].close()
+        self._run_log = None
+        self._snapshot_log = None
     
     def save_objective_results(self, save_dir, dataset_name, method_name) -> None:
         result_dict = {}
         for generation, best_tree_fitness in zip(self.generations, self.best_fitnesses):
             result_dict[generation] = best_tree_fitness
         
-        # if the directory does not exist, create it
-        if not os.path.exists(os.path.join(save_dir, dataset_name)):
-            os.makedirs(os.path.join(save_dir, dataset_name, "monitors"))
-        
-        with open(os.path.join(save_dir, dataset_name, "monitors", method_name + "_" +  str(time.time())) + ".pkl", "wb") as f:
+        path = self.run_path(save_dir, dataset_name, method_name)
+        with open(path + ".pkl", "wb") as f:
             pickle.dump((dataset_name, method_name, result_dict), f)
+        
+        # The stage timings are written next to the monitor pickle
+        if self.stage_timer.enabled:
+            self.stage_timer.save(path + "_stages")
             
     def save_decomposed_objective_fitness(self, save_dir, file_name, objective) -> None:
+        # The objective of the run is reused, so the metrics are computed on its compiled log
         results_list = []
-        for generation in self.generations:
-            our_pt = self.best_trees[generation]
+        for generation, our_pt in zip(self.generations, self.best_trees):
             
             results_list.append(
                 {
@@ -62,9 +173,16 @@ class Monitor:
         plt.title("Fitness over generations")
         plt.show()
     
+    def plot_cache_hit_rate(self) -> None:
+        hit_rates = [hits / (hits + misses) if hits + misses > 0 else 0.0 for hits, misses in zip(self.cache_hits, self.cache_misses)]
+        plt.plot(self.generations[:len(hit_rates)], hit_rates)
+        plt.xlabel("Generation")
+        plt.ylabel("Cache hit rate")
+        plt.title("Fitness cache hit rate over generations")
+        plt.show()
+    
     def plot_population_size(self):
-        population_sizes = [len(population) for population in self.populations]
-        plt.plot(self.generations, population_sizes)
+        plt.plot(self.generations, self.column("population_size"))
         plt.xlabel("Generation")
         plt.ylabel("Population size")
         plt.title("Population size over generations")
@@ -82,17 +200,14 @@ class Monitor:
             print(f"{gen_str}  {tree_str}  {fitness_str}")
 
     def plot_largest_tree_size(self):
-        # tree_sizes = [max([len(str(tree)) for tree in population]) for population in self.populations]
-        tree_sizes = [max([tree.get_size() for tree in population]) for population in self.populations]
-        plt.plot(self.generations, tree_sizes)
+        plt.plot(self.generations, self.column("max_tree_size"))
         plt.xlabel("Generation")
         plt.ylabel("Largest tree size")
         plt.title("Largest tree size over generations")
         plt.show()
         
     def plot_size_of_best_tree(self):
-        tree_sizes = [best_tree.get_size() for best_tree in self.best_trees]
-        plt.plot(self.generations, tree_sizes)
+        plt.plot(self.generations, self.column("best_tree_size"))
         plt.xlabel("Generation")
         plt.ylabel("Size of best tree")
         plt.title("Size of best tree over generations")
@@ -1,34 +1,92 @@
 import random
-from typing import List
-from src.ProcessTree import ProcessTree, Operator
-from src.RandomTreeGenerator import BottomUpRandomBinaryGenerator
+from contextlib import contextmanager
+from typing import List, Optional
+from src.ProcessTree import ProcessTree
+from src.ArrayTree import ArrayTree, LabelTable, SEQUENCE, XOR, PARALLEL, LOOP
+from src.RandomTreeGenerator import BottomUpRandomBinaryGenerator, InductiveCutGenerator
 from src.EventLog import EventLog
 from src.Population import Population
+from src.StageTimer import StageTimer
 
 class MutatorBase:
     def __init__(self):
         pass
 
+    def set_rng(self, rng: Optional[random.Random]):
+        self.rng = rng
+
+    def set_stage_timer(self, stage_timer: StageTimer):
+        self.stage_timer = stage_timer
+
     def generate_new_population(self, old_population: Population, new_population_size: int) -> Population:
         raise NotImplementedError
 
 class Mutator(MutatorBase):
-    def __init__(self, random_creation_rate: float, crossover_rate: float, mutation_rate: float, elite_rate: float):
+    def __init__(self, random_creation_rate: float, crossover_rate: float, mutation_rate: float, elite_rate: float,
+                 random_creation_generator: Optional[InductiveCutGenerator] = None):
         self.event_log = None
         self.random_creation_rate = random_creation_rate
         self.crossover_rate = crossover_rate
         self.mutation_rate = mutation_rate
         self.elite_rate = elite_rate
+        # Mines the trees of the random creation from the event log if set, they are random binary trees otherwise
+        self.set_random_creation_generator(random_creation_generator)
         self.mutation_types_weights = None
+        # The random stream of the mutator, the random module if None
+        self.rng = None
+        # Times the genetic operators, set by the genetic algorithm
+        self.stage_timer = StageTimer()
+        # Activity codes of the array trees the genetic operators work on
+        self.label_table = LabelTable()
+        # Array trees of the old population while a new population is generated
+        self._encoded_trees = None
         
     def set_event_log(self, event_log: EventLog):
         self.event_log = event_log
+    
+    def set_random_creation_generator(self, random_creation_generator: Optional[InductiveCutGenerator]):
+        """
+        Sets the generator that mines the trees of the random creation, None creates random binary trees.
+        The generator needs a log_filtering, as it would mine the same tree from all variants for every new tree otherwise.
+        """
+        if random_creation_generator is not None and random_creation_generator.log_filtering is None:
+            raise ValueError("The random creation generator needs a log_filtering, otherwise every created tree is the same.")
+        self.random_creation_generator = random_creation_generator
         
     def random_creation(self, num_new_trees: int) -> List[ProcessTree]:
-        generator = BottomUpRandomBinaryGenerator()
-        new_trees = generator.generate_population(self.event_log.unique_activities(), num_new_trees)
+        with self.stage_timer.stage("random_creation"):
+            if self.random_creation_generator is not None:
+                self.random_creation_generator.set_rng(self.rng)
+                new_trees = self.random_creation_generator.generate_population(self.event_log, num_new_trees)
+            else:
+                generator = BottomUpRandomBinaryGenerator(self.rng)
+                new_trees = generator.generate_population(self.event_log.unique_activities(), num_new_trees)
         return new_trees.get_population()
         
+    @contextmanager
+    def _encoding_cache(self):
+        """
+        Encodes every tree of the old population only once while the new population is generated.
+        """
+        self._encoded_trees = {}
+        try:
+            yield
+        finally:
+            self._encoded_trees = None
+
+    def _encode(self, tree: ProcessTree) -> ArrayTree:
+        """
+        Returns the array tree of a process tree. The old population is encoded once per generation,
+        so the genetic operators must not modify the array trees they get.
+        """
+        if self._encoded_trees is None:
+            return ArrayTree.from_process_tree(tree, self.label_table)
+        encoded_tree = self._encoded_trees.get(id(tree))
+        if encoded_tree is None:
+            encoded_tree = ArrayTree.from_process_tree(tree, self.label_table)
+            self._encoded_trees[id(tree)] = encoded_tree
+        return encoded_tree
+
     def crossover(self, parent1: ProcessTree, parent2: ProcessTree) -> ProcessTree:
         """
         Performs subtree crossover between two process trees.
@@ -41,34 +99,41 @@ class Mutator(MutatorBase):
             ProcessTree: A new process tree produced by the crossover operation, or a randomly
                      selected parent if no valid crossover was achieved.
         """
-        # Create of copy of the parent trees
-        parent1_copy = deep_copy_tree(parent1)
-        parent2_copy = deep_copy_tree(parent2)
+        return self._crossover(self._encode(parent1), self._encode(parent2)).to_process_tree()
+
+    def _crossover(self, tree1: ArrayTree, tree2: ArrayTree) -> ArrayTree:
+        rng = self.rng or random
         
         # Randomly select crossover points
-        subtree1 = random.choice(parent1_copy.get_all_operator_nodes())
-        subtree2 = random.choice(parent2_copy.get_all_operator_nodes())
+        subtree1 = rng.choice(tree1.get_all_operator_nodes())
+        subtree2 = rng.choice(tree2.get_all_operator_nodes())
         
-        # Try both orders of crossover replacements
-        for candidate, swap_from, swap_to in [(parent1_copy, subtree1, subtree2), (parent2_copy, subtree2, subtree1)]:
-            # Swap the subtree at the crossover point
-            for node in candidate.get_all_operator_nodes():
-                if swap_from in node.children:
-                    idx = node.children.index(swap_from)
-                    node.children[idx] = swap_to
-                    node.children[idx].parent = node
-            try:
-                # Ensure that the tree is strictly valid
-                candidate.remove_duplicate_activities()
-                candidate.if_missing_insert_activities(self.event_log.unique_activities())
-            except ValueError:
-                continue   # remove_duplicate_activities raise an error, i.e. not possible to remove duplicate activities without breaking the tree
-            
-            if candidate.is_valid():
-                return candidate
+        # Replace the subtree of parent1 with the subtree of parent2. A crossover point at the root is not replaced.
+        candidate1 = tree1.copy()
+        if subtree1 != 0:
+            candidate1.replace(subtree1, tree2.subtree(subtree2))
+            candidate1.anchors = [subtree1]
+        if self._repair(candidate1):
+            return candidate1
+        
+        # Replace the subtree of parent2 with the subtree of parent1. A crossover point at the root
+        # was not swapped out above, so it takes part with the repairs made to the first candidate.
+        if subtree2 == 0:
+            candidate2 = candidate1.subtree(candidate1.anchors[0]) if subtree1 != 0 else tree2.copy()
+        else:
+            candidate2 = tree2.copy()
+            candidate2.replace(subtree2, tree1.subtree(subtree1) if subtree1 != 0 else candidate1)
+        if self._repair(candidate2):
+            return candidate2
         
         # If no valid crossover point was found, return a random parent
-        return deep_copy_tree(random.choice([parent1, parent2]))
+        return rng.choice([tree1, tree2]).copy()
+
+    def _repair(self, candidate: ArrayTree) -> bool:
+        """
+        Makes a crossover candidate strictly valid in place. Returns False if that is not possible.
+        """
+        return candidate.repair(self.event_log.unique_activities(), self.rng)
 
     def mutation(self, process_tree: ProcessTree) -> ProcessTree:
         """
@@ -84,116 +149,118 @@ class Mutator(MutatorBase):
         Returns:
             ProcessTree: The mutated process tree.
         """
+        return self._mutation(self._encode(process_tree)).to_process_tree()
+
+    def _mutation(self, process_tree: ArrayTree) -> ArrayTree:
+        rng = self.rng or random
+        
         
-        def operator_swap(tree: ProcessTree) -> ProcessTree:
+        def operator_swap(tree: ArrayTree) -> ArrayTree:
             # Select a random node to perform swap
             nodes = tree.get_all_operator_nodes()
-            swap_node = random.choice(nodes)
+            swap_node = rng.choice(nodes)
             
-            non_tau_children, taus = [], []
-            for child in swap_node.children:
-                (taus if not child.label and not child.operator else non_tau_children).append(child)
+            children = tree.children(swap_node)
+            non_tau_children = [child for child in children if not tree.is_tau(child)]
             
             # Do operator swap according to the operator type
-            curr_operator = swap_node.operator
+            curr_operator = tree.operators[swap_node]
  
             if len(non_tau_children) >= 2:
-                if curr_operator == Operator.LOOP:
-                    swap_node.operator = random.choice([Operator.SEQUENCE, Operator.XOR, Operator.PARALLEL])
-                    for tau in taus:
-                        swap_node.children.remove(tau)
+                if curr_operator == LOOP:
+                    tree.operators[swap_node] = rng.choice([SEQUENCE, XOR, PARALLEL])
+                    children = non_tau_children
                 else:
-                    swap_node.operator = random.choice([Operator.SEQUENCE, Operator.XOR, Operator.PARALLEL, Operator.LOOP])
+                    tree.operators[swap_node] = rng.choice([SEQUENCE, XOR, PARALLEL, LOOP])
                     
             elif len(non_tau_children) == 1:
-                if curr_operator == Operator.LOOP:
-                    swap_node.operator = random.choice([Operator.SEQUENCE, Operator.XOR])
-                    for tau in taus:
-                        swap_node.children.remove(tau)
+                if curr_operator == LOOP:
+                    tree.operators[swap_node] = rng.choice([SEQUENCE, XOR])
+                    children = non_tau_children
                 else:
-                    if curr_operator == Operator.SEQUENCE:
-                        swap_node.operator = Operator.XOR
+                    if curr_operator == SEQUENCE:
+                        tree.operators[swap_node] = XOR
                     else:
-                        swap_node.operator = Operator.SEQUENCE
-                                                        
-            random.shuffle(swap_node.children)        
+                        tree.operators[swap_node] = SEQUENCE
+            
+            subtrees = [tree.subtree(child) for child in children]
+            rng.shuffle(subtrees)
+            tree.set_children(swap_node, subtrees)
             
             return tree
                   
-        def subtree_removal(tree: ProcessTree) -> ProcessTree:
+        def subtree_removal(tree: ArrayTree) -> ArrayTree:
             # Select a random operator node to remove
-            node = random.choice(tree.get_all_operator_nodes())
+            node = rng.choice(tree.get_all_operator_nodes())
             
             # Ensure that is not the root node
-            if not node.parent:
+            if node == 0:
                 return tree
             
             # Attempt to remove subtree and obtain valid tree
-            node.parent.children.remove(node)
-            if not node.parent.is_valid():
-                node.parent.children.append(node)
+            parent = tree.parent(node)
+            subtree = tree.remove(node)
+            if not tree.is_valid(parent):
+                tree.add_child(parent, subtree)
                 return tree
             
             # After succesfully removing subtree, generate random tree containing all missing activities
-            generator = BottomUpRandomBinaryGenerator()
+            generator = BottomUpRandomBinaryGenerator(rng)
             missing_activities = tree.get_missing_activities(self.event_log.unique_activities())
             new_sub_tree = generator.generate_population(missing_activities, n=1)[0]
             
             # Insert the new subtree into the tree
-            insertion_node = random.choice(tree.get_all_operator_nodes())            
-            insertion_node.add_child(new_sub_tree)
+            insertion_node = rng.choice(tree.get_all_operator_nodes())            
+            tree.add_child(insertion_node, ArrayTree.from_process_tree(new_sub_tree, self.label_table))
             
             return tree
         
-        def leaf_addition(tree: ProcessTree) -> ProcessTree:
-            activities = [node for node in tree.get_all_leaf_nodes() if node.label is not None]
-            leaf = random.choice(activities)
+        def leaf_addition(tree: ArrayTree) -> ArrayTree:
+            leaf = rng.choice(tree.get_activity_nodes())
             
             # Attempt to remove leaf without breaking structure
-            leaf.parent.children.remove(leaf)
-            if not leaf.parent.is_valid():
-                leaf.parent.children.append(leaf)
+            parent = tree.parent(leaf)
+            leaf_tree = tree.remove(leaf)
+            if not tree.is_valid(parent):
+                tree.add_child(parent, leaf_tree)
                 return tree
                 
             # Find a random operator node to add the leaf to
-            operator = random.choice(tree.get_all_operator_nodes())
-            operator.add_child(leaf)
+            operator = rng.choice(tree.get_all_operator_nodes())
+            tree.add_child(operator, leaf_tree)
 
             return tree
 
-        def loop_addition(tree: ProcessTree) -> ProcessTree:
+        def loop_addition(tree: ArrayTree) -> ArrayTree:
             # Select a random leaf node
-            leaves = [node for node in tree.get_all_leaf_nodes() if node.label is not None]
-            new_loop = random.choice(leaves)
+            leaf = rng.choice(tree.get_activity_nodes())
             
-            # Replace the leaf node with a loop node
-            activity = new_loop.label
-            new_loop.label = None
-            new_loop.operator = Operator.LOOP
-            
-            # Add tau node to new_loop
-            tau = ProcessTree(parent=new_loop, operator=None, label=None)
-            new_loop.add_child(tau)
-            new_loop.add_child(ProcessTree(parent=new_loop, label=activity))
-            random.shuffle(new_loop.children)
+            # Replace the leaf node with a loop node over a tau node and the activity
+            children = [ArrayTree.leaf(None, self.label_table), tree.subtree(leaf)]
+            rng.shuffle(children)
+            new_loop = ArrayTree.leaf(None, self.label_table)
+            new_loop.operators[0] = LOOP
+            new_loop.set_children(0, children)
+            tree.replace(leaf, new_loop)
             
             return tree
         
-        pt_copy = deep_copy_tree(process_tree)
-        mutation_type = random.choice(['loop_addition', 'operator_swap', 'subtree_removal', 'leaf_addition'])
+        tree = process_tree.copy()
+        mutation_type = rng.choice(['loop_addition', 'operator_swap', 'subtree_removal', 'leaf_addition'])
 
         if mutation_type == 'operator_swap':
-            new_tree = operator_swap(pt_copy)
+            new_tree = operator_swap(tree)
         elif mutation_type == 'subtree_removal':
-            new_tree = subtree_removal(pt_copy)
+            new_tree = subtree_removal(tree)
         elif mutation_type == 'leaf_addition':
-            new_tree = leaf_addition(pt_copy)
+            new_tree = leaf_addition(tree)
         elif mutation_type == 'loop_addition':
-            new_tree = loop_addition(pt_copy)
+            new_tree = loop_addition(tree)
             
         return new_tree
     
     def generate_new_population(self, old_population: Population) -> Population:
+        rng = self.rng or random
         new_population = Population([])
         population_size = len(old_population.get_population())
 
@@ -205,17 +272,20 @@ class Mutator(MutatorBase):
         random_count = int(population_size * self.random_creation_rate)
         new_population.add_trees(self.random_creation(random_count))
         
-        # Add crossover trees
-        crossover_count = int(population_size * self.crossover_rate)
-        for _ in range(crossover_count):
-            parent1, parent2 = random.sample(old_population.get_population(), k=2)
-            new_population.add_tree(self.crossover(parent1, parent2))
-                
-        # Add mutation trees
-        mutation_count = int(population_size * self.mutation_rate)
-        for _ in range(mutation_count):
-            parent = random.choice(old_population.get_population())
-            new_population.add_tree(self.mutation(parent))
+        with self._encoding_cache():
+            # Add crossover trees
+            crossover_count = int(population_size * self.crossover_rate)
+            for _ in range(crossover_count):
+                parent1, parent2 = rng.sample(old_population.get_population(), k=2)
+                with self.stage_timer.stage("crossover"):
+                    new_population.add_tree(self.crossover(parent1, parent2))
+                    
+            # Add mutation trees
+            mutation_count = int(population_size * self.mutation_rate)
+            for _ in range(mutation_count):
+                parent = rng.choice(old_population.get_population())
+                with self.stage_timer.stage("mutation"):
+                    new_population.add_tree(self.mutation(parent))
             
         # Ensure the new population size is the same as the old one
         if len(new_population) < population_size:
@@ -226,21 +296,19 @@ class Mutator(MutatorBase):
         return new_population
 
 class TournamentMutator(Mutator):
-    def __init__(self, random_creation_rate: float, elite_rate: float, tournament_rate: float, tournament_size: float, tournament_mutation_rate: float):
-        super().__init__(random_creation_rate=random_creation_rate, crossover_rate=0.0, mutation_rate=0.0, elite_rate=elite_rate)
+    def __init__(self, random_creation_rate: float, elite_rate: float, tournament_rate: float, tournament_size: float, tournament_mutation_rate: float,
+                 random_creation_generator: Optional[InductiveCutGenerator] = None):
+        super().__init__(random_creation_rate=random_creation_rate, crossover_rate=0.0, mutation_rate=0.0, elite_rate=elite_rate,
+                         random_creation_generator=random_creation_generator)
         self.tournament_rate = tournament_rate
         self.tournament_size = tournament_size
         self.tournament_mutation_rate = tournament_mutation_rate
 
-    def random_creation(self, num_new_trees: int) -> List[ProcessTree]:
-        generator = BottomUpRandomBinaryGenerator()
-        new_trees = generator.generate_population(self.event_log.unique_activities(), num_new_trees)
-        return new_trees.get_population()
-
     def set_event_log(self, event_log: EventLog):
         self.event_log = event_log
         
     def generate_new_population(self, old_population: Population) -> Population:
+        rng = self.rng or random
         new_population = Population([])
         population_size = len(old_population.get_population())
         
@@ -256,15 +324,17 @@ class TournamentMutator(Mutator):
         
         # Tournament selection
         tournament_count = int(self.tournament_rate * population_size)
-        for _ in range(tournament_count):
-            random_sample = random.sample(old_population.get_population(), k=int(self.tournament_size*population_size))
-            tree1, tree2 = sorted(random_sample, key=lambda tree: tree.get_fitness(), reverse=True)[:2]
-            new_tree = self.crossover(tree1, tree2)
-            if random.random() < self.tournament_mutation_rate:
-                new_tree = self.mutation(new_tree)
-                new_population.add_tree(new_tree)
-            else:
-                new_population.add_tree(new_tree)
+        with self._encoding_cache():
+            for _ in range(tournament_count):
+                random_sample = rng.sample(old_population.get_population(), k=int(self.tournament_size*population_size))
+                tree1, tree2 = sorted(random_sample, key=lambda tree: tree.get_fitness(), reverse=True)[:2]
+                # The offspring stays an array tree until it is added to the population
+                with self.stage_timer.stage("crossover"):
+                    new_tree = self._crossover(self._encode(tree1), self._encode(tree2))
+                if rng.random() < self.tournament_mutation_rate:
+                    with self.stage_timer.stage("mutation"):
+                        new_tree = self._mutation(new_tree)
+                new_population.add_tree(new_tree.to_process_tree())
             
         # Ensure the new population size is the same as the old one
         if len(new_population) < population_size:
@@ -3,13 +3,47 @@ from src.EventLog import EventLog
 from src.SupressPrints import SuppressPrints
 from src.Population import Population
 from src.PetriNet import PetriNet
+from src.TreeCompiler import TreeCompiler, CompiledNet, FragmentCache
+from src.ProcessTreeRegister import ProcessTreeRegister
+from src.StageTimer import StageTimer
 import src.FastTokenBasedReplay as FastTokenBasedReplay
 import time
 from typing import Union
+from dataclasses import dataclass
+from multiprocessing import Pool
 from pm4py.algo.evaluation.replay_fitness.variants.token_replay import apply as replay_fitness
 from pm4py.algo.evaluation.precision.variants.etconformance_token import apply as precision
 from pm4py.algo.evaluation.generalization.variants.token_based import apply as generalization
-from pm4py.algo.evaluation.simplicity.variants.arc_degree import apply as simplicity
+
+
+# Representations of a tree the metrics are computed on
+COMPILED_NET = "compiled_net"  # The net compiled by TreeCompiler, also replayed by FastTokenBasedReplay
+PM4PY_NET = "pm4py_net"        # The pm4py Petri net with its markings
+
+
+@dataclass(frozen=True)
+class MetricCost:
+    """
+    The representation a metric is computed on, its relative cost and whether it needs the event log.
+    """
+    representation: str
+    cost: int
+    uses_log: bool
+
+
+# Metrics are computed from the cheapest to the most expensive one, and a representation is only built if a metric needs it
+METRIC_COSTS = {
+    "simplicity": MetricCost(COMPILED_NET, 1, False),
+    "refined_simplicity": MetricCost(COMPILED_NET, 1, False),
+    "ftr_fitness": MetricCost(COMPILED_NET, 10, True),
+    "ftr_precision": MetricCost(COMPILED_NET, 10, True),
+    "ftr_f1_score": MetricCost(COMPILED_NET, 10, True),
+    "generalization": MetricCost(PM4PY_NET, 100, True),
+    "average_trace_fitness": MetricCost(PM4PY_NET, 100, True),
+    "log_fitness": MetricCost(PM4PY_NET, 100, True),
+    "perc_fit_traces": MetricCost(PM4PY_NET, 100, True),
+    "precision": MetricCost(PM4PY_NET, 100, True),
+}
 
 
 class Objective:
@@ -26,12 +60,28 @@ class Objective:
         - 'ftr_fitness'
         - 'ftr_precision'
         - 'ftr_f1_score'
+    cache_size: The maximum number of fitness values kept in the register of already evaluated trees.
+    n_threads: The number of threads FastTokenBasedReplay uses to replay the nets of a population (0 uses all hardware threads).
+    batch_size: The number of nets replayed in one batched call, the time limit is checked between the calls.
+    bounded: If True, the replay of a tree is stopped as soon as it cannot reach the `elite_threshold` set by the
+        genetic algorithm anymore, and the tree gets a lower bound of its fitness (see `bounded_fitness`).
     """
-    def __init__(self, metric_weights: dict):
+    def __init__(self, metric_weights: dict, cache_size: int = 10_000, n_threads: int = 0, bounded: bool = False, batch_size: int = 64):
         self.eventlog = None
-        self.event_log_pm4py = None
+        self.compiled_log = None
         self.ftr_eventlog = None
         self.metric_weights = metric_weights
+        self.register = ProcessTreeRegister(max_size=cache_size)
+        # Petri net fragments of already compiled subtrees, reused when compiling new trees
+        self.fragment_cache = FragmentCache()
+        self.n_threads = n_threads
+        self.batch_size = batch_size
+        self.pool = None
+        self.bounded = bounded
+        # The fitness a tree needs to get into the elite, tracked by the genetic algorithm
+        self.elite_threshold = None
+        # Times the conversions, the replay and the other metrics, set by the genetic algorithm
+        self.stage_timer = StageTimer()
 
         # Dictionary mapping metric names to the actual evaluation functions
         self.metric_functions = {
@@ -49,17 +99,31 @@ class Objective:
         
     def set_event_log(self, event_log: EventLog):
         self.eventlog = event_log
-        self.event_log_pm4py = event_log.to_pm4py()
-        self.ftr_eventlog = self.eventlog.to_fast_token_based_replay()
+        # The compiled log is shared with every other objective and evaluator on the same event log
+        self.compiled_log = event_log.compile()
+        # Replay every unique variant once, weighted by its frequency
+        self.ftr_eventlog = self.compiled_log.to_fast_token_based_replay()
         
-    def simplicity(self, pm4py_pn):
-        with SuppressPrints():
-            simplicity_value = simplicity(pm4py_pn)
-        return simplicity_value
+        # Fitness values are only valid for the event log they were computed on
+        self.register.clear()
+
+    def set_stage_timer(self, stage_timer: StageTimer):
+        self.stage_timer = stage_timer
+
+    @property
+    def event_log_pm4py(self):
+        # Only the PM4Py metrics need the PM4Py log, so it is converted on first use
+        return self.compiled_log.to_pm4py()
+        
+    def simplicity(self, petri_net):
+        # The arc degree simplicity of pm4py, every arc adds to the degree of its source and its target
+        num_nodes = len(petri_net.places) + len(petri_net.transitions)
+        mean_degree = 2 * len(petri_net.arcs) / num_nodes if num_nodes > 0 else 0.0
+        return 1.0 / (1.0 + max(mean_degree - 2, 0))
     
-    def refined_simplicity(self, pm4py_pn):
+    def refined_simplicity(self, petri_net):
         max_places = 100
-        simplicity = len(pm4py_pn.places) / max_places
+        simplicity = len(petri_net.places) / max_places
         simplicity = 1 - simplicity
         simplicity = max(0, simplicity)
         return simplicity 
@@ -106,62 +170,133 @@ class Objective:
         return precision
     
     def ftr_f1_score(self, ftr_petri_net):
-        fitness = FastTokenBasedReplay.calculate_fitness(self.ftr_eventlog, ftr_petri_net, False, False)
-        precision = FastTokenBasedReplay.calculate_precision(self.ftr_eventlog, ftr_petri_net)
-        try:
-            f1_score = 2 * (precision * fitness) / (precision + fitness)
-        except ZeroDivisionError:
-            f1_score = 0.0
-        return f1_score
+        # Fitness and precision are computed in a single replay
+        return FastTokenBasedReplay.evaluate(self.ftr_eventlog, ftr_petri_net, ["f1_score"])["f1_score"]
+    
+    def get_ftr_metric_names(self) -> list:
+        return [metric_name for metric_name in self.metric_weights if metric_name.startswith("ftr_")]
+    
+    def ftr_metrics(self, ftr_petri_net, metric_names: list) -> dict:
+        """
+        Computes the given ftr_* metrics with a single replay of the event log.
+        """
+        results = FastTokenBasedReplay.evaluate(self.ftr_eventlog, ftr_petri_net, [metric_name[len("ftr_"):] for metric_name in metric_names])
+        return {metric_name: results[metric_name[len("ftr_"):]] for metric_name in metric_names}
     
-    def fitness(self, process_tree: ProcessTree) -> float:        
-        pm4py_pn, initial_marking, final_marking = process_tree.to_pm4py_pn()
-        ftr_pn = PetriNet.from_pm4py(pm4py_pn, initial_marking, final_marking).to_fast_token_based_replay()
+    def ftr_metrics_batch(self, ftr_petri_nets: list, metric_names: list) -> list:
+        """
+        Computes the given ftr_* metrics for every net, replaying the nets on `n_threads` threads.
+        """
+        results = FastTokenBasedReplay.calculate_batch(self.ftr_eventlog, ftr_petri_nets, [metric_name[len("ftr_"):] for metric_name in metric_names], self.n_threads)
+        return [{metric_name: result[metric_name[len("ftr_"):]] for metric_name in metric_names} for result in results]
+    
+    def fitness(self, process_tree: ProcessTree) -> float:
+        return sum(self.get_decomposed_objective_fitness(process_tree).values())
+    
+    def cached_fitness(self, process_tree: ProcessTree) -> float:
+        """
+        Returns the fitness of the tree, reusing the value of a previously evaluated tree
+        with the same canonical signature. The fitness is computed on the canonical tree,
+        so it does not depend on which of these trees was evaluated first.
+        """
+        signature = process_tree.get_canonical_signature()
+        fitness = self.register.lookup(signature)
+        if fitness is None:
+            fitness = self.fitness(process_tree.get_canonical_tree())
+            self.register[signature] = fitness
+        return fitness
+    
+    def get_decomposed_objective_fitness(self, process_tree: ProcessTree, compiled_pn: CompiledNet = None, ftr_scores: dict = None, metric_names: list = None) -> dict:
+        """
+        Returns the weighted score of every metric, or only of `metric_names` if given. The compiled net and
+        the ftr_* scores can be passed if they were already computed for the tree (e.g. by a batched replay).
+        """
+        if metric_names is None:
+            metric_names = list(self.metric_weights)
 
-        total_fitness = 0.0
+        # Only the representations the metrics need are built: the net is compiled directly from the tree
+        # and the pm4py net is only built for the pm4py metrics
+        representations = {self.get_metric_cost(metric_name).representation for metric_name in metric_names}
+        if compiled_pn is None and COMPILED_NET in representations:
+            with self.stage_timer.stage("compilation"):
+                compiled_pn = TreeCompiler.compile(process_tree, self.fragment_cache)
+        if PM4PY_NET in representations:
+            with self.stage_timer.stage("pm4py_conversion"):
+                pm4py_pn, initial_marking, final_marking = process_tree.to_pm4py_pn()
 
-        for metric_name, weight in self.metric_weights.items():
-            metric_func = self.metric_functions.get(metric_name)
-            if not metric_func:
-                raise ValueError(f"Unknown metric: {metric_name}")
+        # All ftr_* metrics share one replay of the event log
+        if ftr_scores is None:
+            ftr_metric_names = [metric_name for metric_name in self.get_ftr_metric_names() if metric_name in metric_names]
+            ftr_scores = {}
+            if ftr_metric_names:
+                with self.stage_timer.stage("compilation"):
+                    ftr_pn = compiled_pn.to_fast_token_based_replay()
+                with self.stage_timer.stage("ftr_replay"):
+                    ftr_scores = self.ftr_metrics(ftr_pn, ftr_metric_names)
 
-            # Dynamically decide what to pass based on the metric
+        scores = {}
+        for metric_name in sorted(metric_names, key=lambda metric_name: METRIC_COSTS[metric_name].cost):
+            metric_func = self.metric_functions[metric_name]
             if metric_name.startswith("ftr_"):
-                score = metric_func(ftr_pn)
-            elif metric_name in ["simplicity", "refined_simplicity"]:
-                score = metric_func(pm4py_pn)
-            else:
-                score = metric_func(pm4py_pn, initial_marking, final_marking)
-
-            total_fitness += weight * score
+                scores[metric_name] = ftr_scores[metric_name]
+                continue
+            with self.stage_timer.stage(metric_name):
+                if METRIC_COSTS[metric_name].representation == COMPILED_NET:
+                    scores[metric_name] = metric_func(compiled_pn)
+                else:
+                    scores[metric_name] = metric_func(pm4py_pn, initial_marking, final_marking)
 
-        return total_fitness
+        # The weighted scores keep the order of the metric weights
+        return {metric_name: self.metric_weights[metric_name] * scores[metric_name] for metric_name in metric_names}
+    
+    def get_metric_cost(self, metric_name: str) -> MetricCost:
+        metric_cost = METRIC_COSTS.get(metric_name)
+        if metric_cost is None:
+            raise ValueError(f"Unknown metric: {metric_name}")
+        return metric_cost
     
-    def get_decomposed_objective_fitness(self, process_tree: ProcessTree) -> dict:
-        pm4py_pn, initial_marking, final_marking = process_tree.to_pm4py_pn()
-        ftr_pn = PetriNet.from_pm4py(pm4py_pn, initial_marking, final_marking).to_fast_token_based_replay()
+    def bounded_fitness(self, process_tree: ProcessTree, threshold: float) -> tuple:
+        """
+        Returns the fitness of the tree and whether it is only a lower bound.
 
-        decomposed_fitness = {}
-        for metric_name, weight in self.metric_weights.items():
-            metric_func = self.metric_functions.get(metric_name)
-            if not metric_func:
-                raise ValueError(f"Unknown metric: {metric_name}")
+        The structural metrics (that do not use the event log) are computed first. The variants are then replayed
+        by descending frequency, and the replay is stopped once an optimistic estimate of the weighted score falls
+        below `threshold`: the ftr_* metrics are estimated by FastTokenBasedReplay.evaluate_bounded and the other
+        log-based metrics count with their full weight. A stopped tree gets the score of its structural metrics,
+        a lower bound of its fitness as all metrics are in [0, 1]. All weights must be non-negative.
+        """
+        if any(weight < 0 for weight in self.metric_weights.values()):
+            raise ValueError("The bounded evaluation needs non-negative metric weights")
 
-            # Dynamically decide what to pass based on the metric
-            if metric_name.startswith("ftr_"):
-                score = metric_func(ftr_pn)
-            elif metric_name in ["simplicity", "refined_simplicity"]:
-                score = metric_func(pm4py_pn)
-            else:
-                score = metric_func(pm4py_pn, initial_marking, final_marking)
+        with self.stage_timer.stage("compilation"):
+            compiled_pn = TreeCompiler.compile(process_tree, self.fragment_cache)
+        structural_names = [metric_name for metric_name in self.metric_weights if not self.get_metric_cost(metric_name).uses_log]
+        log_names = [metric_name for metric_name in self.metric_weights if self.get_metric_cost(metric_name).uses_log]
+        structural_fitness = sum(self.get_decomposed_objective_fitness(process_tree, compiled_pn, {}, structural_names).values())
 
-            decomposed_fitness[metric_name] = weight * score
+        ftr_metric_names = self.get_ftr_metric_names()
+        ftr_scores = None
+        if ftr_metric_names:
+            # The log-based metrics that are not replayed here count with their maximal score
+            other_log_weights = sum(self.metric_weights[metric_name] for metric_name in log_names if metric_name not in ftr_metric_names)
+            ftr_weights = {metric_name[len("ftr_"):]: self.metric_weights[metric_name] for metric_name in ftr_metric_names}
+            with self.stage_timer.stage("compilation"):
+                ftr_pn = compiled_pn.to_fast_token_based_replay()
+            with self.stage_timer.stage("ftr_replay"):
+                stopped, results = FastTokenBasedReplay.evaluate_bounded(self.ftr_eventlog, ftr_pn, ftr_weights,
+                                                                         threshold - structural_fitness - other_log_weights)
+            if stopped:
+                return structural_fitness, True
+            ftr_scores = {metric_name: results[metric_name[len("ftr_"):]] for metric_name in ftr_metric_names}
 
-        return decomposed_fitness
+        log_fitness = sum(self.get_decomposed_objective_fitness(process_tree, compiled_pn, ftr_scores, log_names).values())
+        return structural_fitness + log_fitness, False
     
     def fitness_from_pn(self, pm4py_pn, init, final):
         total_fitness = 0.0
         ftr_pn = PetriNet.from_pm4py(pm4py_pn, init, final).to_fast_token_based_replay()
+        ftr_metric_names = self.get_ftr_metric_names()
+        ftr_scores = self.ftr_metrics(ftr_pn, ftr_metric_names) if ftr_metric_names else {}
         for metric_name, weight in self.metric_weights.items():
             metric_func = self.metric_functions.get(metric_name)
             if not metric_func:
@@ -169,8 +304,9 @@ class Objective:
 
             # Dynamically decide what to pass based on the metric
             if metric_name.startswith("ftr_"):
-                score = metric_func(ftr_pn)
-            elif metric_name in ["simplicity", "refined_simplicity"]:
+                score = ftr_scores[metric_name]
+            elif METRIC_COSTS[metric_name].representation == COMPILED_NET:
+                # The structural metrics only count the places, transitions and arcs, which a pm4py net has as well
                 score = metric_func(pm4py_pn)
             else:
                 score = metric_func(pm4py_pn, init, final)
@@ -182,7 +318,39 @@ class Objective:
         
         
     
+    def start_worker_pool(self, n_workers: int):
+        """
+        Starts a persistent pool of `n_workers` processes used by `evaluate_population`.
+        Every worker builds its own copy of the event log representations once at startup.
+        """
+        if self.eventlog is None:
+            raise ValueError("The event log must be set before starting the worker pool")
+        
+        self.close_worker_pool()
+        self.pool = Pool(processes=n_workers, initializer=_init_worker, initargs=(self.metric_weights, self.eventlog))
+    
+    def close_worker_pool(self):
+        """
+        Stops the worker pool if one is running.
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+    
     def evaluate_population(self, population: Population, start_time=None, time_limit=None):
+        if self.pool is not None:
+            self._evaluate_population_parallel(population, start_time, time_limit)
+            return
+        
+        if self.bounded and self.elite_threshold is not None:
+            self._evaluate_population_bounded(population, start_time, time_limit)
+            return
+        
+        if self.get_ftr_metric_names():
+            self._evaluate_population_batched(population, start_time, time_limit)
+            return
+        
         for tree in population.trees:
             
             if time_limit is not None:
@@ -190,6 +358,108 @@ class Objective:
                     break
             
             if tree.fitness is None:
-                tree.fitness = self.fitness(tree)
+                tree.fitness = self.cached_fitness(tree)
             else:
                 continue
+    
+    def _get_pending_trees(self, population: Population) -> dict:
+        """
+        Assigns the fitness of the trees in the register and returns the remaining unevaluated trees grouped by signature,
+        so every distinct tree is only evaluated once. A group is evaluated on the canonical tree of its first tree.
+        """
+        pending = {}
+        for tree in population.trees:
+            if tree.fitness is not None:
+                continue
+            
+            signature = tree.get_canonical_signature()
+            if signature in pending:
+                self.register.hits += 1
+                pending[signature].append(tree)
+                continue
+            
+            fitness = self.register.lookup(signature)
+            if fitness is not None:
+                tree.fitness = fitness
+            else:
+                pending[signature] = [tree]
+        return pending
+    
+    def _evaluate_population_batched(self, population: Population, start_time=None, time_limit=None):
+        # The nets of the unevaluated trees are replayed in chunks of `batch_size` nets, each chunk in one call that
+        # runs on C++ threads, and the time limit is checked before every chunk
+        pending = self._get_pending_trees(population)
+        signatures = list(pending.keys())
+        
+        for first in range(0, len(signatures), self.batch_size):
+            if time_limit is not None:
+                if start_time is not None and time.time() - start_time >= time_limit:
+                    break
+            
+            chunk = signatures[first:first + self.batch_size]
+            canonical_trees = [pending[signature][0].get_canonical_tree() for signature in chunk]
+            with self.stage_timer.stage("compilation"):
+                compiled_pns = [TreeCompiler.compile(canonical_tree, self.fragment_cache) for canonical_tree in canonical_trees]
+                ftr_pns = [compiled_pn.to_fast_token_based_replay() for compiled_pn in compiled_pns]
+            with self.stage_timer.stage("ftr_replay"):
+                ftr_scores = self.ftr_metrics_batch(ftr_pns, self.get_ftr_metric_names())
+            
+            for signature, canonical_tree, compiled_pn, scores in zip(chunk, canonical_trees, compiled_pns, ftr_scores):
+                fitness = sum(self.get_decomposed_objective_fitness(canonical_tree, compiled_pn, scores).values())
+                self.register[signature] = fitness
+                for tree in pending[signature]:
+                    tree.fitness = fitness
+    
+    def _evaluate_population_bounded(self, population: Population, start_time=None, time_limit=None):
+        # Lower bounds are not kept in the register, a tree seen again is evaluated against the current threshold
+        pending = self._get_pending_trees(population)
+        
+        for signature, trees in pending.items():
+            if time_limit is not None:
+                if start_time is not None and time.time() - start_time >= time_limit:
+                    break
+            
+            fitness, is_lower_bound = self.bounded_fitness(trees[0].get_canonical_tree(), self.elite_threshold)
+            if not is_lower_bound:
+                self.register[signature] = fitness
+            for tree in trees:
+                tree.fitness = fitness
+                tree.fitness_is_lower_bound = is_lower_bound
+    
+    def _evaluate_population_parallel(self, population: Population, start_time=None, time_limit=None):
+        # Every distinct tree is only shipped once
+        pending = self._get_pending_trees(population)
+        
+        if time_limit is not None and start_time is not None and time.time() - start_time >= time_limit:
+            return
+        
+        # Results are returned in submission order, so the assignment is deterministic
+        signatures = list(pending.keys())
+        threshold = self.elite_threshold if self.bounded else None
+        tasks = [(str(pending[signature][0].get_canonical_tree()), threshold) for signature in signatures]
+        for signature, (fitness, is_lower_bound) in zip(signatures, self.pool.imap(_evaluate_tree_string, tasks)):
+            if not is_lower_bound:
+                self.register[signature] = fitness
+            for tree in pending[signature]:
+                tree.fitness = fitness
+                tree.fitness_is_lower_bound = is_lower_bound
+            
+            if time_limit is not None:
+                if start_time is not None and time.time() - start_time >= time_limit:
+                    break
+
+
+# The objective of a worker process in the pool started by Objective.start_worker_pool
+_worker_objective = None
+
+def _init_worker(metric_weights: dict, event_log: EventLog):
+    global _worker_objective
+    _worker_objective = Objective(metric_weights)
+    _worker_objective.set_event_log(event_log)
+
+def _evaluate_tree_string(task: tuple) -> tuple:
+    # Returns the fitness and whether it is only a lower bound
+    tree_str, threshold = task
+    if threshold is None:
+        return _worker_objective.fitness(ProcessTree.from_string(tree_str)), False
+    return _worker_objective.bounded_fitness(ProcessTree.from_string(tree_str), threshold)
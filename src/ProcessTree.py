@@ -1,7 +1,6 @@
 from enum import Enum
 from typing import List, Optional, Tuple
 import random
-from collections import Counter
 from pm4py.objects.process_tree.obj import ProcessTree as PM4PyProcessTree, Operator as PM4PyOperator
 from pm4py.objects.process_tree.exporter.variants import ptml as PM4PyExporter
 from pm4py.objects.process_tree.importer.variants import ptml as PM4PyImporter
@@ -24,6 +23,8 @@ class Operator(Enum):
     def __repr__(self):
         return self.value
 
+COMMUTATIVE_OPERATORS = (Operator.XOR, Operator.PARALLEL, Operator.OR)
+
 class ProcessTree:
     def __init__(self, operator: Optional[Operator] = None, label: Optional[str] = None, parent: Optional['ProcessTree'] = None, children: Optional[List['ProcessTree']] = None):
         self.operator = operator
@@ -33,15 +34,17 @@ class ProcessTree:
         
         # Used for Genetic Algorithm
         self.fitness = None
+        # True if the fitness is only a lower bound, as its evaluation was stopped early (see Objective.bounded_fitness)
+        self.fitness_is_lower_bound = False
 
     def add_child(self, child: 'ProcessTree'):
         child.parent = self
         self.children.append(child)
 
-    def add_random_leaf(self, activity: str):
+    def add_random_leaf(self, activity: str, rng: Optional[random.Random] = None):
         leaf = ProcessTree(label=activity)
         operator_nodes = self.get_all_operator_nodes()
-        parent = random.choice(operator_nodes)
+        parent = (rng or random).choice(operator_nodes)
         parent.children.append(leaf)
         leaf.parent = parent
     
@@ -100,6 +103,40 @@ class ProcessTree:
         
         return f"{self.operator}({children_str})"
     
+    def get_canonical_signature(self) -> str:
+        """
+        Returns a string representation of the tree that is identical for trees that only
+        differ in the order of the children of commutative operators (XOR, AND, OR).
+        """
+        if self.operator is None:
+            return self.label if self.label else "tau"
+
+        children_signatures = [child.get_canonical_signature() for child in self.children]
+        if self.operator in COMMUTATIVE_OPERATORS:
+            children_signatures.sort()
+
+        return f"{self.operator}({','.join(children_signatures)})"
+
+    def get_canonical_tree(self) -> 'ProcessTree':
+        """
+        Returns a copy of the tree in which the children of commutative operators are sorted by their
+        canonical signature, so all trees with the same canonical signature have the same canonical tree.
+        The replay depends on the order of the children, so cached fitness values are computed on this tree.
+        """
+        def canonicalize(node: 'ProcessTree') -> tuple:
+            copy = ProcessTree(operator=node.operator, label=node.label)
+            if node.operator is None:
+                return copy, node.label if node.label else "tau"
+
+            children = [canonicalize(child) for child in node.children]
+            if node.operator in COMMUTATIVE_OPERATORS:
+                children.sort(key=lambda child: child[1])
+            for child, _ in children:
+                copy.add_child(child)
+            return copy, f"{node.operator}({','.join(signature for _, signature in children)})"
+
+        return canonicalize(self)[0]
+
     def label_or_op(self) -> str:
         return self.label if self.label is not None else str(self.operator)
      
@@ -137,29 +174,43 @@ class ProcessTree:
         Returns:
             bool: True if the tree is valid, False otherwise.
         """
+        return self._check_validity()[0]
+
+    def _check_validity(self) -> Tuple[bool, int]:
+        """
+        Returns whether the subtree is valid and its size, computed bottom-up so every node is visited once.
+        The size is only meaningful if the subtree is valid.
+        """
         # Check that activity nodes have no children
         if self.operator is None:  # Leaf node
-            return len(self.children) == 0 
+            return len(self.children) == 0, 1
         
         # Check that internal nodes are operators
         if not isinstance(self.operator, Operator):
-            return False
+            return False, 0
+        
+        size = 1
+        for child in self.children:
+            child_valid, child_size = child._check_validity()
+            if not child_valid:
+                return False, 0
+            size += child_size
         
         # Check that the maximum depth is not exceeded
-        if self.get_size() > 20:
-            return False
+        if size > 20:
+            return False, 0
         
         # Avoid subtrees with only tau nodes for seq and xor
         child_count = len([c for c in self.children if c.operator or c.label is not None])
         if self.operator in [Operator.SEQUENCE, Operator.XOR] and child_count < 1:
-            return False
+            return False, 0
         
         # Avoid subtrees with only tau nodes for or, loop and parallel. Require at least non-tau child
         tau_children_count = len([c for c in self.children if c.operator and c.label is None])
         if self.operator in [Operator.OR, Operator.LOOP, Operator.PARALLEL] and (child_count + tau_children_count < 2 or child_count == 0):
-            return False
+            return False, 0
         
-        return all(child.is_valid() for child in self.children)
+        return True, size
 
     def is_strictly_valid(self, activities: List[str]) -> bool:
         """
@@ -174,12 +225,13 @@ class ProcessTree:
             return False
         
         # Check if all activities are present in the tree
-        if not self.contains_all_activities(activities):
+        all_activities = self.get_all_activities()
+        tree_activities = set(all_activities)
+        if not tree_activities.issuperset(activities):
             return False
         
         # Check if all activities are unique
-        all_activities = self.get_all_activities()
-        if len(all_activities) != len(set(all_activities)):
+        if len(all_activities) != len(tree_activities):
             return False
         
         return True
@@ -227,9 +279,13 @@ class ProcessTree:
             raise TypeError(f"Unsupported comparison between ProcessTree and {type(other)}")
 
     def get_all_nodes(self) -> List['ProcessTree']:
-        nodes = [self]
-        for child in self.children:
-            nodes.extend(child.get_all_nodes())
+        # Preorder, without copying the node lists of the subtrees
+        nodes = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(reversed(node.children))
         return nodes
     
     def get_all_leaf_nodes(self) -> List['ProcessTree']:
@@ -247,14 +303,7 @@ class ProcessTree:
         return operator_nodes
     
     def get_all_activities(self) -> List[str]:
-        activities = []
-        
-        if self.label is not None: # ignoring tau nodes
-            activities.append(self.label)
-        
-        for child in self.children:
-            activities.extend(child.get_all_activities())
-        return activities
+        return [node.label for node in self.get_all_nodes() if node.label is not None] # ignoring tau nodes
     
     def contains_all_activities(self, activities: List[str]) -> bool:
         all_activities = set(activities)
@@ -264,25 +313,30 @@ class ProcessTree:
     def get_missing_activities(self, activities: List[str]) -> List[str]:
         all_activities = set(activities)
         tree_activities = set(self.get_all_activities())
-        return list(all_activities - tree_activities)
+        # Sorted, so the order does not depend on the hashes of the activities
+        return sorted(all_activities - tree_activities)
     
-    def if_missing_insert_activities(self, activities: List[str]):
+    def if_missing_insert_activities(self, activities: List[str], rng: Optional[random.Random] = None):
         missing_activities = self.get_missing_activities(activities)
         if len(missing_activities) > 0:
+            # Inserted leaves are no operator nodes, so the candidate parents stay the same
+            operator_nodes = self.get_all_operator_nodes()
             for activity in missing_activities:
-                self.add_random_leaf(activity)
+                (rng or random).choice(operator_nodes).add_child(ProcessTree(label=activity))
                 
     def remove_duplicate_activities(self):
-        all_activities = Counter(self.get_all_activities())
-        duplicated_activities = [activity for activity, count in all_activities.items() if count > 1]
-        # Check if there are any duplicated activities
-        if not duplicated_activities:
-            return
+        # The nodes of every activity in preorder, the activities in order of first occurrence
+        occurrences = {}
+        for node in self.get_all_nodes():
+            if node.label is not None:
+                occurrences.setdefault(node.label, []).append(node)
         
         # Remove the duplicated activities. Assuming that there can be at most one duplicate per activity.
-        for activity in duplicated_activities:
-            nodes = [leaf for leaf in self.get_all_leaf_nodes() if leaf.label == activity]           
-            for node in nodes:
+        for nodes in occurrences.values():
+            if len(nodes) < 2:
+                continue
+            leaves = [node for node in nodes if not node.children]
+            for node in leaves:
                 if node.parent.operator in [Operator.SEQUENCE, Operator.XOR] and len(node.parent.children) > 1:
                     node.parent.children.remove(node)
                     break
@@ -309,6 +363,8 @@ class ProcessTree:
                 for child in children:
                     node.add_child(parse_expression(child))
                 return node
+            elif expression == "tau":
+                return ProcessTree(label=None)
             else:
                 return ProcessTree(label=expression)
         
@@ -1,36 +1,73 @@
-from dataclasses import dataclass
-from typing import Dict
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
 
 @dataclass
 class ProcessTreeRegister:
     """
-    A data class to store process trees and their associated fitness values.
+    A bounded data class to store process trees and their associated fitness values.
+    The register is keyed on the canonical signature of a tree and evicts the least
+    recently used entry once `max_size` is exceeded.
     """
-    fitness_values: Dict[str, float]  # Dictionary to store fitness values (key: tree ID, value: fitness)
-        
+    fitness_values: OrderedDict = field(default_factory=OrderedDict)  # Dictionary to store fitness values (key: tree ID, value: fitness)
+    max_size: int = 10_000  # Maximum number of fitness values kept in the register
+    hits: int = 0  # Number of lookups that found a fitness value
+    misses: int = 0  # Number of lookups that did not find a fitness value
+
     def __getitem__(self, tree_id: str) -> float:
         """
         Retrieve the fitness value of a process tree by its ID.
-        
+
         :param tree_id: The ID of the process tree.
         :return: The fitness value associated with the given ID.
         """
         return self.fitness_values[tree_id]
-    
+
     def __setitem__(self, tree_id: str, fitness: float) -> None:
         """
         Set the fitness value of a process tree by its ID.
-        
+
         :param tree_id: The ID of the process tree.
         :param fitness: The new fitness value to set.
         """
         self.fitness_values[tree_id] = fitness
-        
-        
+        self.fitness_values.move_to_end(tree_id)
+
+        # Evict the least recently used entries
+        while len(self.fitness_values) > self.max_size:
+            self.fitness_values.popitem(last=False)
+
+    def __contains__(self, tree_id: str) -> bool:
+        return tree_id in self.fitness_values
+
     def __len__(self) -> int:
         """
         Get the number of process trees stored in the register.
-        
+
         :return: The number of process trees in the register.
         """
-        return len(self.fitness_values)
\ No newline at end of file
+        return len(self.fitness_values)
+
+    def lookup(self, tree_id: str) -> Optional[float]:
+        """
+        Retrieve the fitness value of a process tree and update the hit/miss counters.
+
+        :param tree_id: The ID of the process tree.
+        :return: The fitness value, or None if the tree is not in the register.
+        """
+        fitness = self.fitness_values.get(tree_id)
+        if fitness is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.fitness_values.move_to_end(tree_id)
+        return fitness
+
+    def clear(self) -> None:
+        """
+        Remove all fitness values and reset the hit/miss counters.
+        """
+        self.fitness_values.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,38 @@
+import random
+from typing import List, Optional, Union
+import numpy as np
+
+
+class RandomStreams:
+    """
+    Independent random number streams derived from one seed.
+
+    Every component of a run that draws random numbers (the mutator, the generator, the genetic algorithm)
+    gets its own stream, and every island process gets its own child RandomStreams. A component therefore
+    draws the same numbers in two runs with the same seed, even if another component changed how many
+    numbers it draws. The streams are derived with a NumPy SeedSequence, in the order they are requested.
+    """
+    def __init__(self, seed: Optional[Union[int, np.random.SeedSequence]] = None):
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_sequence = seed
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+
+    def spawn(self, n: int) -> List['RandomStreams']:
+        """
+        Returns n independent child streams, e.g. for worker processes.
+        """
+        return [RandomStreams(child) for child in self.seed_sequence.spawn(n)]
+
+    def python(self) -> random.Random:
+        """
+        Returns a new random.Random stream.
+        """
+        state = self.seed_sequence.spawn(1)[0].generate_state(4, np.uint32)
+        return random.Random(int.from_bytes(state.tobytes(), "little"))
+
+    def numpy(self) -> np.random.Generator:
+        """
+        Returns a new NumPy Generator stream.
+        """
+        return np.random.default_rng(self.seed_sequence.spawn(1)[0])
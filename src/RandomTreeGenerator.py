@@ -1,24 +1,30 @@
 import random
 from src.EventLog import EventLog
-from typing import List, Dict, Tuple, Set
+from typing import List, Dict, Tuple, Set, Optional, FrozenSet
 from src.ProcessTree import ProcessTree, Operator
 from src.Population import Population
 from src.Filtering import Filtering
 import pm4py
+from pm4py.objects.log.obj import EventLog as PM4PyEventLog
 from copy import deepcopy
+from multiprocessing import Pool
 
 
 class RandomTreeGeneratorBase:
-    def __init__(self):
-        pass
+    def __init__(self, rng: Optional[random.Random] = None):
+        # The random stream of the generator, the random module if None
+        self.rng = rng
+    
+    def set_rng(self, rng: Optional[random.Random]):
+        self.rng = rng
     
     def generate_population(self, unique_activities: List[str], n: int) -> List[ProcessTree]:
         raise NotImplementedError
 
 
 class BottomUpRandomBinaryGenerator(RandomTreeGeneratorBase):
-    def __init__(self):
-        pass
+    def __init__(self, rng: Optional[random.Random] = None):
+        super().__init__(rng)
     
     def _generate_naive_binary_tree(self, unique_activities: List[str]) -> ProcessTree:
         """
@@ -31,15 +37,17 @@ class BottomUpRandomBinaryGenerator(RandomTreeGeneratorBase):
         if not unique_activities:
             raise ValueError("The list of unique activities cannot be empty.")
             
-        # Convert activities into leaf nodes
-        nodes = [ProcessTree(label=activity) for activity in unique_activities]
+        rng = self.rng or random
+        
+        # Convert activities into leaf nodes, sorted so the order does not depend on the hashes of the activities
+        nodes = [ProcessTree(label=activity) for activity in sorted(unique_activities)]
         
         while len(nodes) > 1:
-            random.shuffle(nodes)  # Shuffle to ensure randomness
+            rng.shuffle(nodes)  # Shuffle to ensure randomness
             new_nodes = []
             
             for i in range(0, len(nodes) - 1, 2):
-                operator = random.choice([Operator.SEQUENCE, Operator.XOR, Operator.PARALLEL, Operator.LOOP])
+                operator = rng.choice([Operator.SEQUENCE, Operator.XOR, Operator.PARALLEL, Operator.LOOP])
                 parent = ProcessTree(operator=operator)
                 parent.add_child(nodes[i])
                 parent.add_child(nodes[i + 1])
@@ -65,15 +73,17 @@ class BottomUpRandomBinaryGenerator(RandomTreeGeneratorBase):
         population = Population(trees)
         return population
         
-class FootprintGuidedSequentialGenerator:
-    def __init__(self):
+class FootprintGuidedSequentialGenerator(RandomTreeGeneratorBase):
+    def __init__(self, rng: Optional[random.Random] = None):
+        super().__init__(rng)
         self.footprint_matrix = None
         self.unique_activities = None 
 
     def generate_sequential_model(self) -> ProcessTree:
+        rng = self.rng or random
         root = ProcessTree(operator=Operator.SEQUENCE)
-        available_activities = list(self.unique_activities)
-        random.shuffle(available_activities)
+        available_activities = sorted(self.unique_activities)
+        rng.shuffle(available_activities)
 
         pairs = []
         while len(available_activities) > 1:
@@ -83,7 +93,7 @@ class FootprintGuidedSequentialGenerator:
 
         if available_activities:  # Handle odd number of activities
             leftover_activity = available_activities.pop()
-            random_insertion_point = random.randint(0, len(pairs))
+            random_insertion_point = rng.randint(0, len(pairs))
             pairs.insert(random_insertion_point, (leftover_activity,))
 
         for pair in pairs:
@@ -126,44 +136,79 @@ class FootprintGuidedSequentialGenerator:
         population = Population(trees)
         return population
 
-class InductiveNoiseInjectionGenerator:
-    def __init__(self, log_filtering: float):
+class InductiveNoiseInjectionGenerator(RandomTreeGeneratorBase):
+    def __init__(self, log_filtering: float, rng: Optional[random.Random] = None):
+        super().__init__(rng)
         self.log_filtering = log_filtering
 
-    def generate_injection_model(self, eventlog: EventLog) -> ProcessTree:
-        filtered_log = Filtering.filter_eventlog_random(eventlog, self.log_filtering, include_all_activities=True)
-        pm4py_log = filtered_log.to_pm4py()
-
-        # use pm4py to generate the process tree by inductive miner on the pm4py log
-        process_tree = pm4py.discover_process_tree_inductive(pm4py_log)
-        # convert pm4py process tree to our ProcessTree object
-        process_tree = ProcessTree.from_pm4py(process_tree)
+    def sample_variants(self, eventlog: EventLog) -> Tuple[int, ...]:
+        """
+        Samples traces like Filtering.filter_eventlog_random and returns their variants in ascending order.
+        """
+        trace_variants = eventlog.to_variant_log().trace_variants
+        trace_indices = Filtering.sample_trace_indices(eventlog, self.log_filtering, include_all_activities=True, rng=self.rng)
+        return tuple(sorted({trace_variants[trace_idx] for trace_idx in trace_indices}))
 
-        return process_tree
+    def generate_injection_model(self, eventlog: EventLog) -> ProcessTree:
+        return _discover_variants(_pm4py_variant_traces(eventlog), self.sample_variants(eventlog))
 
-    def generate_population(self, event_log: EventLog, n: int) -> List[ProcessTree]:
+    def generate_population(self, event_log: EventLog, n: int, n_workers: Optional[int] = None) -> List[ProcessTree]:
         """
         Generates a population of process trees by injecting noise into the event log.
+
+        The inductive miner only depends on which variants a sample contains, so every distinct sample
+        is mined once, on one trace per variant taken from the PM4Py log that is converted once.
+        With n_workers > 1 the distinct samples are mined in a pool of n_workers processes.
         """
-        trees = []
-        for _ in range(n):
-            tree = self.generate_injection_model(event_log)
-            trees.append(tree)
-        
-        if len(trees) < n:
-            generator = BottomUpRandomBinaryGenerator()
-            unique_activities = event_log.unique_activities()
+        samples = [self.sample_variants(event_log) for _ in range(n)]
+        distinct_samples = list(dict.fromkeys(samples))
+        variant_traces = _pm4py_variant_traces(event_log)
 
-        while(len(trees) < n):
-            tree = generator._generate_naive_binary_tree(unique_activities)
-            trees.append(tree)
+        if n_workers is not None and n_workers > 1 and len(distinct_samples) > 1:
+            with Pool(processes=min(n_workers, len(distinct_samples)), initializer=_init_worker, initargs=(variant_traces,)) as pool:
+                mined_trees = pool.map(_discover_sample, distinct_samples)
+        else:
+            mined_trees = [_discover_variants(variant_traces, sample) for sample in distinct_samples]
+        models = dict(zip(distinct_samples, mined_trees))
+
+        # A sample drawn more than once gets a copy of its tree, so every tree of the population is its own object
+        trees = []
+        used_samples = set()
+        for sample in samples:
+            trees.append(deepcopy(models[sample]) if sample in used_samples else models[sample])
+            used_samples.add(sample)
 
         population = Population(trees)
         return population
 
-class InductiveMinerGenerator:
+
+def _pm4py_variant_traces(eventlog: EventLog) -> list:
+    # The PM4Py trace of the first trace of every variant, taken from the PM4Py log of the compiled log
+    pm4py_log = eventlog.compile().to_pm4py()
+    return [pm4py_log[trace_idx] for trace_idx in eventlog.to_variant_log().first_trace_indices()]
+
+def _discover_variants(variant_traces: list, variants: Tuple[int, ...]) -> ProcessTree:
+    pm4py_log = PM4PyEventLog([variant_traces[variant_idx] for variant_idx in variants])
+    # use pm4py to generate the process tree by inductive miner on the pm4py log
+    process_tree = pm4py.discover_process_tree_inductive(pm4py_log)
+    # convert pm4py process tree to our ProcessTree object
+    return ProcessTree.from_pm4py(process_tree)
+
+
+# The PM4Py variant traces of a worker process in the pool started by InductiveNoiseInjectionGenerator.generate_population
+_worker_variant_traces = None
+
+def _init_worker(variant_traces: list):
+    global _worker_variant_traces
+    _worker_variant_traces = variant_traces
+
+def _discover_sample(variants: Tuple[int, ...]) -> ProcessTree:
+    return _discover_variants(_worker_variant_traces, variants)
+
+
+class InductiveMinerGenerator(RandomTreeGeneratorBase):
     def __init__(self):
-        pass
+        super().__init__()
 
     def generate_population(self, eventlog: EventLog, n: int) -> List[ProcessTree]:
         """
@@ -179,7 +224,346 @@ class InductiveMinerGenerator:
         return population
 
 
- 
+
+class InductiveCutGenerator(RandomTreeGeneratorBase):
+    """
+    Generates process trees with a lightweight inductive miner that works on the int-encoded variants of the
+    event log instead of a PM4Py log. It detects the xor, (strict) sequence, parallel and loop cuts on the
+    directly-follows graph of a sublog, splits the sublog and recurses, with the fall-throughs of the PM4Py
+    inductive miner (empty traces, activity once per trace, activity concurrent, tau loops, flower model).
+
+    Like InductiveNoiseInjectionGenerator, every tree is mined from a random sample of the traces if
+    log_filtering is given, otherwise from all variants. The mined (sub)logs are cached, so the generator
+    is cheap enough to create the random trees of every generation (see Mutator).
+    """
+    # Number of cached (sub)logs after which the cache is cleared
+    MAX_CACHE_SIZE = 100_000
+
+    def __init__(self, log_filtering: Optional[float] = None, rng: Optional[random.Random] = None):
+        super().__init__(rng)
+        self.log_filtering = log_filtering
+        self._variant_log = None
+        # (sub)log as a frozenset of variants -> tree as nested (operator, activity id, children) tuples
+        self._cut_trees = {}
+
+    def sample_variants(self, eventlog: EventLog) -> Tuple[int, ...]:
+        """
+        Samples traces like Filtering.filter_eventlog_random and returns their variants in ascending order,
+        or all variants if log_filtering is None.
+        """
+        variant_log = eventlog.to_variant_log()
+        if self.log_filtering is None:
+            return tuple(range(len(variant_log)))
+        trace_indices = Filtering.sample_trace_indices(eventlog, self.log_filtering, include_all_activities=True, rng=self.rng)
+        return tuple(sorted({variant_log.trace_variants[trace_idx] for trace_idx in trace_indices}))
+
+    def discover(self, eventlog: EventLog, variants: Tuple[int, ...]) -> ProcessTree:
+        """
+        Mines a process tree from the given variants of the event log.
+        """
+        variant_log = eventlog.to_variant_log()
+        if variant_log is not self._variant_log or len(self._cut_trees) > self.MAX_CACHE_SIZE:
+            self._variant_log = variant_log
+            self._cut_trees = {}
+        sublog = frozenset(variant_log.variants[variant_idx] for variant_idx in variants)
+        return _to_process_tree(_mine_cut_tree(sublog, self._cut_trees), variant_log.activities)
+
+    def generate_population(self, eventlog: EventLog, n: int) -> Population:
+        trees = [self.discover(eventlog, self.sample_variants(eventlog)) for _ in range(n)]
+        population = Population(trees)
+        return population
+
+
+# The nested tuple form of the trees mined by InductiveCutGenerator: (operator, activity id, children)
+_TAU = (None, None, ())
+
+def _leaf(activity: int) -> tuple:
+    return (None, activity, ())
+
+def _node(operator: Operator, children) -> tuple:
+    # Nested sequence, xor and parallel nodes are flattened, like the trees of the PM4Py inductive miner
+    if operator == Operator.LOOP:
+        return (operator, None, tuple(children))
+    flat_children = []
+    for child in children:
+        if child[0] == operator:
+            flat_children.extend(child[2])
+        else:
+            flat_children.append(child)
+    return (operator, None, tuple(flat_children))
+
+def _mine_cut_tree(log: FrozenSet[Tuple[int, ...]], cache: dict) -> tuple:
+    """
+    Mines a (sub)log given as the set of its variants, every sublog is mined once per cache.
+    """
+    tree = cache.get(log)
+    if tree is None:
+        tree = _mine_uncached(log, cache)
+        cache[log] = tree
+    return tree
+
+def _mine_uncached(log: FrozenSet[Tuple[int, ...]], cache: dict) -> tuple:
+    traces = frozenset(trace for trace in log if trace)
+    if not traces:
+        return _TAU
+    if len(traces) < len(log):
+        # Empty traces make the rest of the log optional
+        return _node(Operator.XOR, (_TAU, _mine_cut_tree(traces, cache)))
+
+    activities = sorted({activity for trace in traces for activity in trace})
+    if len(activities) == 1:
+        activity = activities[0]
+        if traces == {(activity,)}:
+            return _leaf(activity)
+        return _node(Operator.LOOP, (_leaf(activity), _TAU))
+
+    cut = _find_cut(traces, activities)
+    if cut is not None:
+        return _apply_cut(traces, cut, cache)
+
+    # Fall-through: an activity that occurs exactly once in every trace is parallel to the rest
+    for activity in activities:
+        if all(trace.count(activity) == 1 for trace in traces):
+            rest = frozenset(tuple(a for a in trace if a != activity) for trace in traces)
+            return _node(Operator.PARALLEL, (_leaf(activity), _mine_cut_tree(rest, cache)))
+
+    # Fall-through: an activity is parallel to the rest if the rest has a cut
+    for activity in activities:
+        rest = frozenset(tuple(a for a in trace if a != activity) for trace in traces)
+        rest_traces = frozenset(trace for trace in rest if trace)
+        if rest_traces and _find_cut(rest_traces, [a for a in activities if a != activity]) is not None:
+            own = frozenset(tuple(a for a in trace if a == activity) for trace in traces)
+            return _node(Operator.PARALLEL, (_mine_cut_tree(own, cache), _mine_cut_tree(rest, cache)))
+
+    # Fall-through: the traces are repetitions of traces that go from a start to an end activity,
+    # or at least repetitions of traces that begin with a start activity
+    start_activities = {trace[0] for trace in traces}
+    end_activities = {trace[-1] for trace in traces}
+    for split_ends in (end_activities, None):
+        split_traces = _split_tau_loop(traces, start_activities, split_ends)
+        if split_traces is not None:
+            return _node(Operator.LOOP, (_mine_cut_tree(split_traces, cache), _TAU))
+
+    # Fall-through: the flower model
+    return _node(Operator.LOOP, (_node(Operator.XOR, [_leaf(activity) for activity in activities]), _TAU))
+
+def _find_cut(traces: FrozenSet[Tuple[int, ...]], activities: List[int]) -> Optional[Tuple[Operator, List[Set[int]]]]:
+    """
+    Returns the operator and the activity groups of the first cut found on the directly-follows graph
+    of the non-empty traces, trying the xor, sequence, parallel and loop cut in this order.
+    """
+    successors = {activity: set() for activity in activities}
+    predecessors = {activity: set() for activity in activities}
+    for trace in traces:
+        for a, b in zip(trace, trace[1:]):
+            successors[a].add(b)
+            predecessors[b].add(a)
+    start_activities = {trace[0] for trace in traces}
+    end_activities = {trace[-1] for trace in traces}
+
+    groups = _xor_cut(activities, successors)
+    if groups:
+        return Operator.XOR, groups
+    groups = _sequence_cut(activities, successors, start_activities, end_activities)
+    if groups:
+        return Operator.SEQUENCE, groups
+    groups = _parallel_cut(activities, successors, start_activities, end_activities)
+    if groups:
+        return Operator.PARALLEL, groups
+    groups = _loop_cut(activities, successors, predecessors, start_activities, end_activities)
+    if groups:
+        return Operator.LOOP, groups
+    return None
+
+def _apply_cut(traces: FrozenSet[Tuple[int, ...]], cut: Tuple[Operator, List[Set[int]]], cache: dict) -> tuple:
+    operator, groups = cut
+    if operator == Operator.XOR:
+        sublogs = _split_by_group(traces, groups)
+    elif operator == Operator.LOOP:
+        sublogs = _split_loop(traces, groups)
+    else:
+        sublogs = _project(traces, groups)
+    return _node(operator, [_mine_cut_tree(sublog, cache) for sublog in sublogs])
+
+def _components(activities: List[int], connected) -> List[Set[int]]:
+    # The connected components of the activities, where connected(a, b) tells if a and b are adjacent
+    parent = {activity: activity for activity in activities}
+
+    def find(activity: int) -> int:
+        while parent[activity] != activity:
+            parent[activity] = parent[parent[activity]]
+            activity = parent[activity]
+        return activity
+
+    for i, a in enumerate(activities):
+        for b in activities[i + 1:]:
+            if connected(a, b):
+                root_a, root_b = find(a), find(b)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    components = {}
+    for activity in activities:
+        components.setdefault(find(activity), set()).add(activity)
+    # Ordered by their smallest activity
+    return [components[root] for root in sorted(components)]
+
+def _xor_cut(activities: List[int], successors: Dict[int, Set[int]]) -> Optional[List[Set[int]]]:
+    groups = _components(activities, lambda a, b: b in successors[a] or a in successors[b])
+    return groups if len(groups) > 1 else None
+
+def _sequence_cut(activities: List[int], successors: Dict[int, Set[int]], start_activities: Set[int], end_activities: Set[int]) -> Optional[List[Set[int]]]:
+    # Activities that reach each other or do not reach each other in any direction are in the same group
+    reachable = {}
+    for activity in activities:
+        seen, stack = set(), [activity]
+        while stack:
+            for successor in successors[stack.pop()]:
+                if successor not in seen:
+                    seen.add(successor)
+                    stack.append(successor)
+        reachable[activity] = seen
+
+    groups = _components(activities, lambda a, b: (b in reachable[a]) == (a in reachable[b]))
+    if len(groups) < 2:
+        return None
+
+    # The earlier a group, the more activities of the other groups it reaches
+    groups.sort(key=lambda group: -len(reachable[next(iter(group))] - group))
+    for i, group in enumerate(groups):
+        for later_group in groups[i + 1:]:
+            for a in group:
+                if not later_group <= reachable[a]:
+                    return None
+                if any(a in reachable[b] for b in later_group):
+                    return None
+    return _merge_skippable_groups(groups, successors, start_activities, end_activities)
+
+def _merge_skippable_groups(groups: List[Set[int]], successors: Dict[int, Set[int]], start_activities: Set[int], end_activities: Set[int]) -> Optional[List[Set[int]]]:
+    # The strict sequence cut: a group that can be skipped is merged with the groups next to it
+    # that are only connected to it, so the skip ends up inside of a child
+    group_of = {activity: idx for idx, group in enumerate(groups) for activity in group}
+    infinity = len(groups) + 1
+    # The first group that directly precedes and the last group that directly follows every group
+    first_predecessor = [-infinity if group & start_activities else infinity for group in groups]
+    last_successor = [infinity if group & end_activities else -infinity for group in groups]
+    for a, successors_of_a in successors.items():
+        for b in successors_of_a:
+            first_predecessor[group_of[b]] = min(first_predecessor[group_of[b]], group_of[a])
+            last_successor[group_of[a]] = max(last_successor[group_of[a]], group_of[b])
+
+    def skippable(p: int) -> bool:
+        if any(group_of[b] > p for i in range(p) for a in groups[i] for b in successors[a]):
+            return True
+        return any(groups[i] & start_activities for i in range(p + 1, len(groups))) or any(groups[i] & end_activities for i in range(p))
+
+    for p in range(len(groups)):
+        if skippable(p):
+            merged = []
+            q = p - 1
+            while q >= 0 and last_successor[q] <= p:
+                merged.append(q)
+                q -= 1
+            q = p + 1
+            while q < len(groups) and first_predecessor[q] >= p:
+                merged.append(q)
+                q += 1
+            for q in merged:
+                for activity in groups[q]:
+                    group_of[activity] = p
+                groups[p] |= groups[q]
+                groups[q] = set()
+    groups = [group for group in groups if group]
+    return groups if len(groups) > 1 else None
+
+def _parallel_cut(activities: List[int], successors: Dict[int, Set[int]], start_activities: Set[int], end_activities: Set[int]) -> Optional[List[Set[int]]]:
+    # Activities that do not directly follow each other in both directions are in the same group
+    groups = _components(activities, lambda a, b: not (b in successors[a] and a in successors[b]))
+
+    # Every group needs a start and an end activity. Going from the smallest group, a group without is merged
+    # into the group before it (the next one for the first group), like in the PM4Py inductive miner.
+    groups.sort(key=len)
+    i = 0
+    while i < len(groups) and len(groups) > 1:
+        if groups[i] & start_activities and groups[i] & end_activities:
+            i += 1
+            continue
+        group = groups.pop(i)
+        groups[i - 1 if i > 0 else 0] |= group
+    return groups if len(groups) > 1 else None
+
+def _loop_cut(activities: List[int], successors: Dict[int, Set[int]], predecessors: Dict[int, Set[int]],
+              start_activities: Set[int], end_activities: Set[int]) -> Optional[List[Set[int]]]:
+    body = start_activities | end_activities
+    inner = [activity for activity in activities if activity not in body]
+    candidates = _components(inner, lambda a, b: b in successors[a] or a in successors[b])
+
+    # A redo group is only entered from end activities and only left to start activities. An activity of it that
+    # is entered from an end activity is entered from all of them, one that leaves to a start activity leaves to all of them.
+    redo = set()
+    for group in candidates:
+        is_redo = True
+        for activity in group:
+            entered_from = predecessors[activity] & body
+            left_to = successors[activity] & body
+            if (entered_from and entered_from != end_activities) or (left_to and left_to != start_activities):
+                is_redo = False
+                break
+        if is_redo:
+            redo |= group
+        else:
+            body |= group
+    if not redo:
+        return None
+    return [body, redo]
+
+def _split_by_group(traces: FrozenSet[Tuple[int, ...]], groups: List[Set[int]]) -> List[FrozenSet[Tuple[int, ...]]]:
+    sublogs = [set() for _ in groups]
+    for trace in traces:
+        for sublog, group in zip(sublogs, groups):
+            if trace[0] in group:
+                sublog.add(trace)
+                break
+    return [frozenset(sublog) for sublog in sublogs]
+
+def _project(traces: FrozenSet[Tuple[int, ...]], groups: List[Set[int]]) -> List[FrozenSet[Tuple[int, ...]]]:
+    return [frozenset(tuple(a for a in trace if a in group) for trace in traces) for group in groups]
+
+def _split_loop(traces: FrozenSet[Tuple[int, ...]], groups: List[Set[int]]) -> List[FrozenSet[Tuple[int, ...]]]:
+    # Every maximal run of activities of one group is a trace of the sublog of the group
+    group_of = {activity: idx for idx, group in enumerate(groups) for activity in group}
+    sublogs = [set() for _ in groups]
+    for trace in traces:
+        start = 0
+        for i in range(1, len(trace) + 1):
+            if i == len(trace) or group_of[trace[i]] != group_of[trace[start]]:
+                sublogs[group_of[trace[start]]].add(trace[start:i])
+                start = i
+    return [frozenset(sublog) for sublog in sublogs]
+
+def _split_tau_loop(traces: FrozenSet[Tuple[int, ...]], start_activities: Set[int], end_activities: Optional[Set[int]]) -> Optional[FrozenSet[Tuple[int, ...]]]:
+    # Splits the traces before every start activity that follows an end activity (any activity if end_activities is None),
+    # returns None if no trace is split
+    split_traces = set()
+    is_split = False
+    for trace in traces:
+        start = 0
+        for i in range(1, len(trace)):
+            if trace[i] in start_activities and (end_activities is None or trace[i - 1] in end_activities):
+                split_traces.add(trace[start:i])
+                start = i
+                is_split = True
+        split_traces.add(trace[start:])
+    return frozenset(split_traces) if is_split else None
+
+def _to_process_tree(cut_tree: tuple, activities: List[str]) -> ProcessTree:
+    operator, activity, children = cut_tree
+    node = ProcessTree(operator=operator, label=activities[activity] if activity is not None else None)
+    for child in children:
+        node.add_child(_to_process_tree(child, activities))
+    return node
+
+
 if __name__ == "__main__":
     eventlog = EventLog.from_trace_list('ABC', 'ABD')
 
@@ -187,4 +571,3 @@ if __name__ == "__main__":
     population = generator.generate_population(eventlog, 10)
 
     print(population)
-    
\ No newline at end of file
@@ -0,0 +1,109 @@
+import csv
+import json
+import os
+import time
+from typing import List, Optional
+
+# Setting this environment variable to 1 enables the stage timings of the genetic algorithm
+STAGE_TIMING_ENV = "GA_STAGE_TIMING"
+
+
+class _NoStage:
+    # The context handed out by a disabled timer
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+# Marks the generation the timer is in
+_CURRENT_GENERATION = object()
+
+
+class _Stage:
+    def __init__(self, timer: 'StageTimer', name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StageTimer:
+    """
+    Records the wall time and the number of calls of the stages of a genetic algorithm run, per generation.
+
+    A stage is timed with `with timer.stage(name):`. A disabled timer hands out a no-op context, so the
+    hooks cost next to nothing and can stay in the hot loop. The time of a stage includes the stages nested
+    in it, e.g. the evaluation of a generation includes the compilation and the replay of its trees.
+    Stages timed before the first generation (e.g. the filtering of the log) have no generation.
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.generation = None
+        # (generation, stage) -> [seconds, calls], in the order the stages were first timed
+        self.timings = {}
+
+    @staticmethod
+    def from_environment() -> 'StageTimer':
+        """
+        Returns a timer that is enabled if the GA_STAGE_TIMING environment variable is set to 1.
+        """
+        return StageTimer(os.environ.get(STAGE_TIMING_ENV, "0") == "1")
+
+    def set_generation(self, generation: Optional[int]):
+        self.generation = generation
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NO_STAGE
+        return _Stage(self, name)
+
+    def add(self, name: str, seconds: float, calls: int = 1, generation=_CURRENT_GENERATION):
+        """
+        Adds time to a stage of the current generation, or of the given generation.
+        """
+        key = (self.generation if generation is _CURRENT_GENERATION else generation, name)
+        timing = self.timings.get(key)
+        if timing is None:
+            self.timings[key] = [seconds, calls]
+        else:
+            timing[0] += seconds
+            timing[1] += calls
+
+    def records(self) -> List[dict]:
+        return [{"generation": generation, "stage": stage, "seconds": seconds, "calls": calls}
+                for (generation, stage), (seconds, calls) in self.timings.items()]
+
+    def merge(self, records: List[dict]):
+        """
+        Adds the records of another timer, e.g. of an island process.
+        """
+        for record in records:
+            self.add(record["stage"], record["seconds"], record["calls"], record["generation"])
+
+    def clear(self):
+        """
+        Removes the records, the timer stays in its generation.
+        """
+        self.timings.clear()
+
+    def save(self, path: str):
+        """
+        Writes the records to `path`.csv and `path`.json.
+        """
+        records = self.records()
+        with open(f"{path}.csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["generation", "stage", "seconds", "calls"])
+            writer.writeheader()
+            writer.writerows(records)
+        with open(f"{path}.json", "w") as f:
+            json.dump(records, f, indent=2)
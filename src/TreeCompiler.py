@@ -0,0 +1,566 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from src.ProcessTree import ProcessTree, Operator
+import src.FastTokenBasedReplay as FastTokenBasedReplay
+
+PLACE = "place"
+TRANSITION = "transition"
+
+# References to the entities a fragment is connected to
+INITIAL_ENTITY = -1
+FINAL_ENTITY = -2
+
+
+class CompiledNet:
+    """
+    Class representing a Petri net compiled directly from a process tree.
+
+    Attributes:
+    -----------
+    places : list[str]
+        The names of the places in the Petri net.
+    transitions : list[str]
+        The names of the transitions in the Petri net. Silent transitions are named tau_<index>.
+    arcs : list[tuple[str, str]]
+        The arcs of the Petri net as (source, target) pairs.
+    initial_marking : dict
+        Dictionary mapping place names to the number of tokens in the initial marking.
+    final_marking : dict
+        Dictionary mapping place names to the number of tokens in the final marking.
+    """
+    def __init__(self, places: List[str], transitions: List[str], arcs: List[Tuple[str, str]], initial_marking: dict, final_marking: dict):
+        self.places = places
+        self.transitions = transitions
+        self.arcs = arcs
+        self.initial_marking = initial_marking
+        self.final_marking = final_marking
+
+    def __repr__(self):
+        return f"CompiledNet(Places: {len(self.places)}, Transitions: {len(self.transitions)}, Arcs: {len(self.arcs)})"
+
+    def to_fast_token_based_replay(self):
+        """
+        Converts the compiled net to a FastTokenBasedReplay.PetriNet object.
+        """
+        petri_net_c = FastTokenBasedReplay.PetriNet()
+        for place in self.places:
+            petri_net_c.add_place(FastTokenBasedReplay.Place(place, 0))
+        for transition in self.transitions:
+            petri_net_c.add_transition(FastTokenBasedReplay.Transition(transition))
+        for source, target in self.arcs:
+            petri_net_c.add_arc(FastTokenBasedReplay.Arc(source, target, 1))
+
+        initial_marking = FastTokenBasedReplay.Marking()
+        for place, tokens in self.initial_marking.items():
+            initial_marking.add_place(place, tokens)
+        final_marking = FastTokenBasedReplay.Marking()
+        for place, tokens in self.final_marking.items():
+            final_marking.add_place(place, tokens)
+
+        petri_net_c.set_initial_marking(initial_marking)
+        petri_net_c.set_final_marking(final_marking)
+        return petri_net_c
+
+
+@dataclass
+class FragmentCache:
+    """
+    A bounded cache of the Petri net fragments compiled for subtrees.
+
+    A fragment is stored per subtree and per kind of the entities it is connected to, so a
+    tree that shares subtrees with previously compiled trees (e.g. a mutated candidate) only
+    builds the changed part of the net. The subtrees are keyed by their string representation
+    and not by their canonical signature, since the replay depends on the order of the transitions.
+    The least recently used fragments are evicted once `max_size` is exceeded.
+    """
+    fragments: OrderedDict = field(default_factory=OrderedDict)  # Dictionary to store fragments (key: (subtree, initial kind, final kind))
+    max_size: int = 50_000  # Maximum number of fragments kept in the cache
+    hits: int = 0  # Number of lookups that found a fragment
+    misses: int = 0  # Number of lookups that did not find a fragment
+
+    def lookup(self, key: tuple) -> Optional[tuple]:
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.fragments.move_to_end(key)
+        return fragment
+
+    def store(self, key: tuple, fragment: tuple) -> None:
+        self.fragments[key] = fragment
+        self.fragments.move_to_end(key)
+
+        # Evict the least recently used entries
+        while len(self.fragments) > self.max_size:
+            self.fragments.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.fragments)
+
+    def clear(self) -> None:
+        self.fragments.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class TreeCompiler:
+    """
+    Compiles a ProcessTree into a Petri net without going through pm4py.
+
+    The construction mirrors pm4py's process tree to Petri net conversion (including the
+    simple reduction of silent transitions and the removal of dangling places), so the
+    compiled net has the same structure and place names as the one obtained through
+    `ProcessTree.to_pm4py_pn()` and `PetriNet.from_pm4py()` and is replayed the same way.
+    Only trees with OR or interleaving nodes can differ, for which the pm4py net itself
+    depends on the iteration order of its transition set.
+
+    With a FragmentCache, the fragments of subtrees compiled before are stitched into the net
+    instead of being rebuilt. The stitched net is identical to the one built from scratch.
+    """
+    def __init__(self, fragment_cache: Optional[FragmentCache] = None):
+        self.place_in = []       # For every place, the transitions with an arc to the place
+        self.place_out = []      # For every place, the transitions with an arc from the place
+        self.transition_in = []  # For every transition, the places with an arc to the transition
+        self.transition_out = [] # For every transition, the places with an arc from the transition
+        self.labels = []         # For every transition, its label (None for silent transitions)
+        self.removed_places = set()
+        self.removed_transitions = set()
+        self.fragment_cache = fragment_cache
+        self.arc_log = []        # The added arcs as (place, transition, place is the source) in order
+        self.signatures = {}     # The string representation of every subtree, by id of the subtree
+
+    @staticmethod
+    def compile(tree: ProcessTree, fragment_cache: Optional[FragmentCache] = None) -> CompiledNet:
+        """
+        Compiles the process tree into a CompiledNet, reusing the fragments in the cache if given.
+        """
+        compiler = TreeCompiler(fragment_cache)
+        if fragment_cache is not None:
+            compiler._compute_signatures(tree)
+        source = compiler._new_place()
+        sink = compiler._new_place()
+
+        if TreeCompiler._tau_mandatory_at_initial_marking(tree):
+            initial_place = compiler._new_place()
+            tau_initial = compiler._new_transition(None)
+            compiler._add_arc_place_to_transition(source, tau_initial)
+            compiler._add_arc_transition_to_place(tau_initial, initial_place)
+        else:
+            initial_place = source
+
+        if TreeCompiler._tau_mandatory_at_final_marking(tree):
+            final_place = compiler._new_place()
+            tau_final = compiler._new_transition(None)
+            compiler._add_arc_place_to_transition(final_place, tau_final)
+            compiler._add_arc_transition_to_place(tau_final, sink)
+        else:
+            final_place = sink
+
+        compiler._add_subtree(tree, (PLACE, initial_place), (PLACE, final_place))
+        compiler._apply_simple_reduction()
+        compiler._remove_dangling_places(source, sink)
+
+        return compiler._to_compiled_net(source, sink)
+
+    def _new_place(self) -> int:
+        self.place_in.append([])
+        self.place_out.append([])
+        return len(self.place_in) - 1
+
+    def _new_transition(self, label: Optional[str]) -> int:
+        self.transition_in.append([])
+        self.transition_out.append([])
+        self.labels.append(label)
+        return len(self.labels) - 1
+
+    def _add_arc_place_to_transition(self, place: int, transition: int):
+        self.place_out[place].append(transition)
+        self.transition_in[transition].append(place)
+        self.arc_log.append((place, transition, True))
+
+    def _add_arc_transition_to_place(self, transition: int, place: int):
+        self.transition_out[transition].append(place)
+        self.place_in[place].append(transition)
+        self.arc_log.append((place, transition, False))
+
+    def _compute_signatures(self, tree: ProcessTree) -> str:
+        """
+        Computes the string representation of every subtree bottom-up and returns the one of the tree.
+        """
+        if tree.operator is None:
+            signature = tree.label if tree.label else "tau"
+        else:
+            signature = f"{tree.operator}({','.join(self._compute_signatures(child) for child in tree.children)})"
+        self.signatures[id(tree)] = signature
+        return signature
+
+    def _remove_transition(self, transition: int):
+        for place in self.transition_in[transition]:
+            self.place_out[place].remove(transition)
+        for place in self.transition_out[transition]:
+            self.place_in[place].remove(transition)
+        self.transition_in[transition] = []
+        self.transition_out[transition] = []
+        self.removed_transitions.add(transition)
+
+    def _remove_place(self, place: int):
+        for transition in self.place_in[place]:
+            self.transition_out[transition].remove(place)
+        for transition in self.place_out[place]:
+            self.transition_in[transition].remove(place)
+        self.place_in[place] = []
+        self.place_out[place] = []
+        self.removed_places.add(place)
+
+    def _add_subtree(self, tree: ProcessTree, initial_entity: Tuple[str, int], final_entity: Optional[Tuple[str, int]]) -> int:
+        """
+        Adds the subtree between the initial and final entity and returns the final place.
+        An entity is either a (PLACE, id) or a (TRANSITION, id) pair, the final entity can be None.
+        """
+        # Leaves are cheaper to build than to look up
+        if self.fragment_cache is None or tree.operator is None:
+            return self._build_subtree(tree, initial_entity, final_entity)
+
+        signature = self.signatures.get(id(tree))
+        if signature is None:
+            signature = self._compute_signatures(tree)
+        key = (signature, initial_entity[0], final_entity[0] if final_entity is not None else None)
+        fragment = self.fragment_cache.lookup(key)
+        if fragment is not None:
+            return self._stitch_fragment(fragment, initial_entity, final_entity)
+
+        first_place, first_transition, first_arc = len(self.place_in), len(self.labels), len(self.arc_log)
+        final_place = self._build_subtree(tree, initial_entity, final_entity)
+        self.fragment_cache.store(key, self._extract_fragment(first_place, first_transition, first_arc, final_place, initial_entity, final_entity))
+        return final_place
+
+    def _extract_fragment(self, first_place: int, first_transition: int, first_arc: int, final_place: int, initial_entity: Tuple[str, int], final_entity: Optional[Tuple[str, int]]) -> tuple:
+        """
+        Returns the entities and arcs added since the given positions as a fragment, in which the
+        entities are numbered relative to the first new place and transition and the connected
+        entities are replaced by INITIAL_ENTITY and FINAL_ENTITY.
+        """
+        place_refs = {}
+        transition_refs = {}
+        for ref, entity in [(INITIAL_ENTITY, initial_entity), (FINAL_ENTITY, final_entity)]:
+            if entity is not None:
+                refs = place_refs if entity[0] == PLACE else transition_refs
+                refs.setdefault(entity[1], ref)
+
+        arcs = []
+        for place, transition, place_is_source in self.arc_log[first_arc:]:
+            place_ref = place - first_place if place >= first_place else place_refs[place]
+            transition_ref = transition - first_transition if transition >= first_transition else transition_refs[transition]
+            arcs.append((place_ref, transition_ref, place_is_source))
+        final_ref = final_place - first_place if final_place >= first_place else place_refs[final_place]
+        return len(self.place_in) - first_place, tuple(self.labels[first_transition:]), tuple(arcs), final_ref
+
+    def _stitch_fragment(self, fragment: tuple, initial_entity: Tuple[str, int], final_entity: Optional[Tuple[str, int]]) -> int:
+        """
+        Adds a cached fragment between the initial and final entity and returns the final place.
+        """
+        num_places, labels, arcs, final_ref = fragment
+        first_place, first_transition = len(self.place_in), len(self.labels)
+        place_in, place_out = self.place_in, self.place_out
+        transition_in, transition_out = self.transition_in, self.transition_out
+        for _ in range(num_places):
+            place_in.append([])
+            place_out.append([])
+        for label in labels:
+            transition_in.append([])
+            transition_out.append([])
+        self.labels.extend(labels)
+
+        # The entities the fragment is connected to, indexed by INITIAL_ENTITY and FINAL_ENTITY
+        connected = [None, final_entity[1] if final_entity is not None else None, initial_entity[1]]
+        arc_log = self.arc_log
+        for place_ref, transition_ref, place_is_source in arcs:
+            place = first_place + place_ref if place_ref >= 0 else connected[place_ref]
+            transition = first_transition + transition_ref if transition_ref >= 0 else connected[transition_ref]
+            if place_is_source:
+                place_out[place].append(transition)
+                transition_in[transition].append(place)
+            else:
+                transition_out[transition].append(place)
+                place_in[place].append(transition)
+            arc_log.append((place, transition, place_is_source))
+        return first_place + final_ref if final_ref >= 0 else connected[final_ref]
+
+    def _build_subtree(self, tree: ProcessTree, initial_entity: Tuple[str, int], final_entity: Optional[Tuple[str, int]]) -> int:
+        kind, entity = initial_entity
+        if kind == TRANSITION:
+            initial_place = self._new_place()
+            self._add_arc_transition_to_place(entity, initial_place)
+        else:
+            initial_place = entity
+
+        if final_entity is not None and final_entity[0] == PLACE:
+            final_place = final_entity[1]
+        else:
+            final_place = self._new_place()
+            if final_entity is not None:
+                self._add_arc_place_to_transition(final_place, final_entity[1])
+
+        if tree.operator is None:
+            transition = self._new_transition(tree.label)
+            self._add_arc_place_to_transition(initial_place, transition)
+            self._add_arc_transition_to_place(transition, final_place)
+
+        elif tree.operator == Operator.XOR:
+            for child in tree.children:
+                self._add_subtree(child, (PLACE, initial_place), (PLACE, final_place))
+
+        elif tree.operator == Operator.OR:
+            split = self._new_transition(None)
+            self._add_arc_place_to_transition(initial_place, split)
+            join = self._new_transition(None)
+            self._add_arc_transition_to_place(join, final_place)
+            terminal_place = self._new_place()
+            self._add_arc_place_to_transition(terminal_place, join)
+            first_place = self._new_place()
+            self._add_arc_transition_to_place(split, first_place)
+
+            for child in tree.children:
+                child_init_place = self._new_place()
+                self._add_arc_transition_to_place(split, child_init_place)
+                child_start_place = self._new_place()
+                child_end_place = self._new_place()
+                start = self._new_transition(None)
+                later = self._new_transition(None)
+                skip = self._new_transition(None)
+
+                self._add_arc_place_to_transition(first_place, start)
+                self._add_arc_place_to_transition(child_init_place, start)
+                self._add_arc_transition_to_place(start, child_start_place)
+                self._add_arc_transition_to_place(start, terminal_place)
+
+                self._add_arc_place_to_transition(terminal_place, later)
+                self._add_arc_place_to_transition(child_init_place, later)
+                self._add_arc_transition_to_place(later, child_start_place)
+                self._add_arc_transition_to_place(later, terminal_place)
+
+                self._add_arc_place_to_transition(terminal_place, skip)
+                self._add_arc_place_to_transition(child_init_place, skip)
+                self._add_arc_transition_to_place(skip, terminal_place)
+                self._add_arc_transition_to_place(skip, child_end_place)
+
+                self._add_arc_place_to_transition(child_end_place, join)
+                self._add_subtree(child, (PLACE, child_start_place), (PLACE, child_end_place))
+
+        elif tree.operator == Operator.PARALLEL:
+            split = self._new_transition(None)
+            self._add_arc_place_to_transition(initial_place, split)
+            join = self._new_transition(None)
+            self._add_arc_transition_to_place(join, final_place)
+            for child in tree.children:
+                self._add_subtree(child, (TRANSITION, split), (TRANSITION, join))
+
+        elif tree.operator == Operator.INTERLEAVING:
+            split = self._new_transition(None)
+            self._add_arc_place_to_transition(initial_place, split)
+            join = self._new_transition(None)
+            self._add_arc_transition_to_place(join, final_place)
+            control_place = self._new_place()
+            self._add_arc_transition_to_place(split, control_place)
+            self._add_arc_place_to_transition(control_place, join)
+
+            for child in tree.children:
+                place_i = self._new_place()
+                transition_i = self._new_transition(None)
+                place_f = self._new_place()
+                transition_f = self._new_transition(None)
+
+                self._add_arc_transition_to_place(split, place_i)
+                self._add_arc_place_to_transition(place_i, transition_i)
+                self._add_arc_transition_to_place(transition_f, place_f)
+                self._add_arc_place_to_transition(place_f, join)
+                self._add_arc_place_to_transition(control_place, transition_i)
+                self._add_arc_transition_to_place(transition_f, control_place)
+
+                self._add_subtree(child, (TRANSITION, transition_i), (TRANSITION, transition_f))
+
+        elif tree.operator == Operator.SEQUENCE:
+            intermediate_place = initial_place
+            for i, child in enumerate(tree.children):
+                final_connection = (PLACE, final_place) if i == len(tree.children) - 1 else None
+                intermediate_place = self._add_subtree(child, (PLACE, intermediate_place), final_connection)
+
+        elif tree.operator == Operator.LOOP:
+            loop_initial_place = self._new_place()
+            init_loop = self._new_transition(None)
+            self._add_arc_place_to_transition(initial_place, init_loop)
+            self._add_arc_transition_to_place(init_loop, loop_initial_place)
+            loop = self._new_transition(None)
+
+            if len(tree.children) == 1:
+                self._add_subtree(tree.children[0], (PLACE, loop_initial_place), (PLACE, final_place))
+                self._add_arc_place_to_transition(final_place, loop)
+                self._add_arc_transition_to_place(loop, loop_initial_place)
+            else:
+                do_place = self._add_subtree(tree.children[0], (PLACE, loop_initial_place), None)
+                redo_place = None
+                for child in tree.children[1:]:
+                    redo_place = self._add_subtree(child, (PLACE, do_place), (PLACE, redo_place) if redo_place is not None else None)
+                self._add_subtree(ProcessTree(), (PLACE, do_place), (PLACE, final_place))
+                self._add_arc_place_to_transition(redo_place, loop)
+                self._add_arc_transition_to_place(loop, loop_initial_place)
+
+        return final_place
+
+    def _apply_simple_reduction(self):
+        """
+        Merges single-entry and single-exit silent transitions with their neighbouring place
+        until the net does not change anymore.
+        """
+        changed = True
+        while changed:
+            changed = self._reduce_single_entry_transitions() | self._reduce_single_exit_transitions()
+
+    def _reduce_single_entry_transitions(self) -> bool:
+        reduced = False
+        for transition in range(len(self.labels)):
+            if transition in self.removed_transitions or self.labels[transition] is not None:
+                continue
+            if len(self.transition_in[transition]) != 1:
+                continue
+
+            source_place = self.transition_in[transition][0]
+            if len(self.place_in[source_place]) != 1 or set(self.place_out[source_place]) != {transition}:
+                continue
+            source_transition = self.place_in[source_place][0]
+            if source_transition == transition:
+                continue
+
+            target_places = list(self.transition_out[transition])
+            self._remove_transition(transition)
+            self._remove_place(source_place)
+            for place in target_places:
+                self._add_arc_transition_to_place(source_transition, place)
+            reduced = True
+        return reduced
+
+    def _reduce_single_exit_transitions(self) -> bool:
+        reduced = False
+        for transition in range(len(self.labels)):
+            if transition in self.removed_transitions or self.labels[transition] is not None:
+                continue
+            if len(self.transition_out[transition]) != 1:
+                continue
+
+            target_place = self.transition_out[transition][0]
+            if len(self.place_out[target_place]) != 1 or set(self.place_in[target_place]) != {transition}:
+                continue
+            target_transition = self.place_out[target_place][0]
+            if target_transition == transition:
+                continue
+
+            source_places = list(self.transition_in[transition])
+            self._remove_transition(transition)
+            self._remove_place(target_place)
+            for place in source_places:
+                self._add_arc_place_to_transition(place, target_transition)
+            reduced = True
+        return reduced
+
+    def _remove_dangling_places(self, source: int, sink: int):
+        for place in range(len(self.place_in)):
+            if place in self.removed_places:
+                continue
+            if (len(self.place_out[place]) == 0 and place != sink) or (len(self.place_in[place]) == 0 and place != source):
+                self._remove_place(place)
+
+    def _to_compiled_net(self, source: int, sink: int) -> CompiledNet:
+        # The places are named like pm4py names them (p_1 and p_2 are source and sink), since the
+        # replay depends on the place names
+        place_names = {}
+        for place in range(len(self.place_in)):
+            if place in self.removed_places:
+                continue
+            if place == source:
+                place_names[place] = "source"
+            elif place == sink:
+                place_names[place] = "sink"
+            else:
+                place_names[place] = f"p_{place + 1}"
+
+        transition_names = {}
+        tau_index = 0
+        for transition, label in enumerate(self.labels):
+            if transition in self.removed_transitions:
+                continue
+            if label is None:
+                transition_names[transition] = f"tau_{tau_index}"
+                tau_index += 1
+            else:
+                transition_names[transition] = label
+
+        arcs = []
+        for transition, name in transition_names.items():
+            for place in self.transition_in[transition]:
+                arcs.append((place_names[place], name))
+            for place in self.transition_out[transition]:
+                arcs.append((name, place_names[place]))
+
+        return CompiledNet(
+            places=list(place_names.values()),
+            transitions=list(transition_names.values()),
+            arcs=arcs,
+            initial_marking={"source": 1},
+            final_marking={"sink": 1},
+        )
+
+    @staticmethod
+    def _tau_mandatory_at_initial_marking(tree: ProcessTree) -> bool:
+        return (
+            TreeCompiler._starts_with_loop(tree)
+            or TreeCompiler._loop_on_first_path(tree)
+            or tree.operator in [Operator.XOR, Operator.PARALLEL]
+        )
+
+    @staticmethod
+    def _tau_mandatory_at_final_marking(tree: ProcessTree) -> bool:
+        return (
+            TreeCompiler._ends_with_loop(tree)
+            or TreeCompiler._loop_on_last_path(tree)
+            or tree.operator in [Operator.XOR, Operator.PARALLEL]
+        )
+
+    @staticmethod
+    def _starts_with_loop(tree: ProcessTree) -> bool:
+        # Mirrors pm4py, which continues on the right-hand side below the first child
+        if tree.children and tree.children[0].operator:
+            if tree.children[0].operator == Operator.LOOP:
+                return True
+            return TreeCompiler._ends_with_loop(tree.children[0])
+        return False
+
+    @staticmethod
+    def _ends_with_loop(tree: ProcessTree) -> bool:
+        if tree.children and tree.children[-1].operator:
+            if tree.children[-1].operator == Operator.LOOP:
+                return True
+            return TreeCompiler._ends_with_loop(tree.children[-1])
+        return False
+
+    @staticmethod
+    def _loop_on_first_path(tree: ProcessTree) -> bool:
+        node = tree
+        while True:
+            if node.operator == Operator.LOOP:
+                return True
+            if not node.children:
+                return False
+            node = node.children[0]
+
+    @staticmethod
+    def _loop_on_last_path(tree: ProcessTree) -> bool:
+        node = tree
+        while True:
+            if node.operator == Operator.LOOP:
+                return True
+            if not node.children:
+                return False
+            node = node.children[-1]
+
@@ -1,4 +1,4 @@
-from src.RandomTreeGenerator import BottomUpRandomBinaryGenerator, FootprintGuidedSequentialGenerator, InductiveNoiseInjectionGenerator, InductiveMinerGenerator
+from src.RandomTreeGenerator import BottomUpRandomBinaryGenerator, FootprintGuidedSequentialGenerator, InductiveNoiseInjectionGenerator, InductiveMinerGenerator, InductiveCutGenerator
 from src.Mutator import TournamentMutator
 from src.Objective import Objective
 from src.FileLoader import FileLoader
@@ -20,15 +20,27 @@ def convert_json_to_hyperparamters(hyper_parameters: dict):
         hyper_parameters['generator'] = InductiveNoiseInjectionGenerator(hyper_parameters['log_filtering'])
     elif hyper_parameters['generator'] == 'InductiveMinerGenerator':
         hyper_parameters['generator'] = InductiveMinerGenerator()
+    elif hyper_parameters['generator'] == 'InductiveCutGenerator':
+        hyper_parameters['generator'] = InductiveCutGenerator(hyper_parameters.get('log_filtering'))
     else:
         raise ValueError("Invalid generator type")
     
+    # The generator of the random trees of every generation, random binary trees if not given
+    random_creation_generator = hyper_parameters.get('random_creation_generator')
+    if random_creation_generator in (None, '', 'BottomUpRandomBinaryGenerator'):
+        hyper_parameters['random_creation_generator'] = None
+    elif random_creation_generator == 'InductiveCutGenerator':
+        hyper_parameters['random_creation_generator'] = InductiveCutGenerator(hyper_parameters['log_filtering'])
+    else:
+        raise ValueError("Invalid random creation generator type")
+    
     hyper_parameters['mutator'] = TournamentMutator(
         random_creation_rate = hyper_parameters['random_creation_rate'],
         elite_rate = hyper_parameters['elite_rate'],
         tournament_rate = hyper_parameters['tournament_rate'],
         tournament_size = hyper_parameters['tournament_size'],
-        tournament_mutation_rate = hyper_parameters['tournament_mutation_rate']
+        tournament_mutation_rate = hyper_parameters['tournament_mutation_rate'],
+        random_creation_generator = hyper_parameters['random_creation_generator']
     )
     
     return hyper_parameters
@@ -47,7 +59,10 @@ def load_hyperparameters_from_csv(path: str):
             hyper_parameters['tournament_rate'] = float(row['tournament_rate'])
             hyper_parameters['tournament_mutation_rate'] = float(row['tournament_mutation_rate'])
             
-            if hyper_parameters['generator'] == 'InductiveNoiseInjectionGenerator':
+            # The column is optional, older parameter files do not have it
+            hyper_parameters['random_creation_generator'] = row.get('random_creation_generator') or None
+            
+            if hyper_parameters['generator'] in ('InductiveNoiseInjectionGenerator', 'InductiveCutGenerator') or hyper_parameters['random_creation_generator'] == 'InductiveCutGenerator':
                 hyper_parameters['log_filtering'] = float(row['log_filtering'])
             
             hyper_parameters['objective'] = Objective({
@@ -0,0 +1,71 @@
+import random
+import pytest
+from src.EventLog import EventLog
+from src.FileLoader import FileLoader
+from src.PetriNet import PetriNet
+from src.ProcessTree import ProcessTree
+from src.RandomTreeGenerator import BottomUpRandomBinaryGenerator
+from src.TreeCompiler import TreeCompiler, FragmentCache
+import src.FastTokenBasedReplay as FastTokenBasedReplay
+
+# OR and interleaving are left out, the pm4py nets of these nodes depend on the iteration order of a set of transitions
+OPERATORS = ["SEQ", "XOR", "AND", "O"]
+TREES = [
+    "SEQ(A,XOR(tau,AND(B,C)),E,D)",
+    "SEQ(A,O(B,C),XOR(E,tau),D)",
+    "O(SEQ(A,B),C,XOR(D,E))",
+    "O(XOR(AND(C,D),O(B,E)),A)",
+    "AND(A,O(tau,B),XOR(C,SEQ(D,E)))",
+]
+
+
+def random_tree(activities: list, rng: random.Random) -> str:
+    """
+    Returns a random tree in which every activity occurs once, with up to two tau leaves.
+    """
+    leaves = list(activities) + ["tau"] * rng.randint(0, 2)
+    rng.shuffle(leaves)
+    
+    def build(leaves: list) -> str:
+        if len(leaves) == 1:
+            return leaves[0]
+        operator = rng.choice(OPERATORS)
+        num_children = min(len(leaves), 2 if operator == "O" else rng.randint(2, 3))
+        cuts = sorted(rng.sample(range(1, len(leaves)), num_children - 1))
+        children = [leaves[start:end] for start, end in zip([0] + cuts, cuts + [len(leaves)])]
+        return f"{operator}({','.join(build(child) for child in children)})"
+    
+    return build(leaves)
+
+def replay(ftr_eventlog, ftr_petri_net) -> tuple:
+    return (
+        FastTokenBasedReplay.calculate_fitness(ftr_eventlog, ftr_petri_net, False, False),
+        FastTokenBasedReplay.calculate_precision(ftr_eventlog, ftr_petri_net),
+    )
+
+def assert_replayed_like_pm4py(eventlog: EventLog, trees: list):
+    ftr_eventlog = eventlog.to_fast_token_based_replay()
+    fragment_cache = FragmentCache()
+    for tree in trees:
+        pm4py_pn, initial_marking, final_marking = tree.to_pm4py_pn()
+        reference = PetriNet.from_pm4py(pm4py_pn, initial_marking, final_marking)
+        compiled = TreeCompiler.compile(tree)
+        stitched = TreeCompiler.compile(tree, fragment_cache)
+        
+        assert (stitched.places, stitched.transitions, stitched.arcs) == (compiled.places, compiled.transitions, compiled.arcs), str(tree)
+        assert replay(ftr_eventlog, compiled.to_fast_token_based_replay()) == replay(ftr_eventlog, reference.to_fast_token_based_replay()), str(tree)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_compiled_nets_replay_like_pm4py(seed):
+    eventlog = EventLog.from_trace_list(["ABCD", "ACBD", "AED", "ABCBCD", "AD", "BAD", "ECCA", "ABDE"])
+    rng = random.Random(seed)
+    trees = [ProcessTree.from_string(tree) for tree in TREES]
+    trees += [ProcessTree.from_string(random_tree("ABCDE", rng)) for _ in range(300)]
+    assert_replayed_like_pm4py(eventlog, trees)
+
+def test_generated_trees_replay_like_pm4py():
+    eventlog = FileLoader.load_eventlog("logs/2013-op.xes")
+    generator = BottomUpRandomBinaryGenerator(random.Random(0))
+    trees = generator.generate_population(sorted(eventlog.unique_activities()), n=200).get_population()
+    assert_replayed_like_pm4py(eventlog, trees)